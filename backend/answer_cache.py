@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from lru import LRUCache
+from sqlite_file import SQLiteFile
+
+# Persistent cache of assistant answers. Questions are normalized (case,
+# Unicode form, punctuation, whitespace and token order) so "Nose is bleeding
+# after a hit!" and "after a hit, nose is bleeding" share one entry. Entries
+# are keyed by prompt version as well: changing the prompt changes the
+# version, which makes every older answer unreachable, and
+# invalidate_version() deletes them.
+#
+# Lookups go to an in-memory LRU first, then to a SQLite file shared by all
+# workers on the host, so answers survive restarts. Both layers honour the TTL.
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    prompt_version TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_answers_prompt_version ON answers (prompt_version);
+"""
+
+
+def normalize_question(question):
+    text = unicodedata.normalize('NFKC', question).casefold()
+    tokens = _PUNCTUATION.sub(' ', text).split()
+    return ' '.join(sorted(tokens))
+
+
+def cache_key(prompt_version, question):
+    normalized = normalize_question(question)
+    return hashlib.sha256(f'{prompt_version}\0{normalized}'.encode()).hexdigest(), normalized
+
+
+class AnswerCache:
+    def __init__(self, path, maxsize=5000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.db = SQLiteFile(path, SCHEMA)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+        self._purged_pid = None
+
+    def _connection(self):
+        # See sqlite_file.py; each process purges expired answers once
+        conn = self.db.connection()
+        if self._purged_pid != os.getpid():
+            self._purged_pid = os.getpid()
+            self.purge_expired()
+        return conn
+
+    def get(self, prompt_version, question):
+        key, _ = cache_key(prompt_version, question)
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._record_hit('memory', entry[1])
+            return entry[0]
+        row = self._connection().execute(
+            'SELECT answer, latency_ms, created_at FROM answers WHERE key = ?', (key,)
+        ).fetchone()
+        if row is not None and (not self.ttl or row[2] + self.ttl > time.time()):
+            self.memory.set(key, (row[0], row[1]))
+            self._record_hit('disk', row[1])
+            return row[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _record_hit(self, layer, latency_ms):
+        with self._lock:
+            if layer == 'memory':
+                self.memory_hits += 1
+            else:
+                self.disk_hits += 1
+            self.latency_saved_ms += latency_ms
+
+    def put(self, prompt_version, question, answer, latency_ms):
+        key, normalized = cache_key(prompt_version, question)
+        self.memory.set(key, (answer, latency_ms))
+        self._connection().execute(
+            'INSERT OR REPLACE INTO answers (key, prompt_version, question, answer, latency_ms, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, prompt_version, normalized, answer, latency_ms, time.time())
+        )
+
+    def invalidate_version(self, prompt_version):
+        # Memory keys are hashes, so the LRU is dropped wholesale
+        self.memory.clear()
+        return self._connection().execute(
+            'DELETE FROM answers WHERE prompt_version = ?', (prompt_version,)
+        ).rowcount
+
+    def purge_expired(self):
+        if not self.ttl:
+            return 0
+        return self._connection().execute(
+            'DELETE FROM answers WHERE created_at < ?', (time.time() - self.ttl,)
+        ).rowcount
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'latency_saved_ms': round(self.latency_saved_ms, 1),
+                'memory': self.memory.stats()
+            }
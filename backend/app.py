@@ -1,23 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
-from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required, get_jwt
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required
 import os
-import mysql.connector
-from sqlalchemy import text
+import json
+import random
+from collections import Counter
+from sqlalchemy import select
+from config import database_url, engine_options, replica_binds, env_int, env_float, env_bool
+from models import db, User, Doctor, Patient, Appointment, PatientFlow, DiseaseDistribution, LabResult, PatientVitals
+from dashboard import doctor_counters, patient_counters
+from pagination import encode_cursor, after_cursor, page_size, parse_date
+from counters import add_patient_flow_counts, add_disease_counts, chart_event_error
+from chart_buffer import chart_buffer
+from response_cache import response_cache, charts_key, doctor_profile_key
+from identity import current_identity, profile_id, invalidate_profile, init_app as init_identity
+from identity import profile_cache as identity_profile_cache
+from pool_stats import pool_snapshot
+from metrics import request_metrics
+from routing import replica_reads, note_write, init_app as init_routing
+from assistant import gateway, AssistantError, AssistantTimeout, PROMPT_VERSION
+from lab_reports import report_pool
+from vitals import METRICS, reading_from_json, record_vitals, latest_vitals, vitals_range
+from vitals import format_blood_pressure, parse_timestamp, parse_ndjson, parse_csv, ingest_readings, IngestError
+from export import export_chunks, EXPORT_TABLES, FORMATS, DEFAULT_CHUNK_ROWS
+from query_budget import query_budget
+from serializers import Serializer, Field, minutes, isoformat, literal_list, dumps, json_response
 
-app = Flask(__name__)
-CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "http://localhost:3000"}})
+# The app is built by create_app(), which only reads configuration and wires
+# up the extensions: nothing connects to the database or a model API until a
+# request needs it, and the schema is created by an explicit command
+# (python -m migrations upgrade, or python create_tables.py), never on
+# import. In production serve it with
+# gunicorn -c gunicorn.conf.py 'app:create_app()' (see gunicorn.conf.py);
+# python app.py runs the development server.
+#
+# create_app(config) takes overrides for any of the settings below, which
+# otherwise come from the environment; engine options follow the database
+# URL unless given too.
 
-# JWT Configuration
-app.config['JWT_SECRET_KEY'] = 'your-secret-key'  # Change this to a secure key in production
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-app.config['JWT_TOKEN_LOCATION'] = ['headers']
-app.config['JWT_HEADER_NAME'] = 'Authorization'
-app.config['JWT_HEADER_TYPE'] = 'Bearer'
-app.config['JWT_ERROR_MESSAGE_KEY'] = 'error'
-jwt = JWTManager(app)
+jwt = JWTManager()
+api = Blueprint('api', __name__)
 
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
@@ -43,109 +66,90 @@ def unauthorized_callback(error):
         'error': str(error)
     }), 401
 
-# MySQL Database Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://root:@localhost/healthcare'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-
-# Database Models
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
-    role = db.Column(db.String(20), nullable=False, default='patient')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class Doctor(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
-    specialization = db.Column(db.String(100))
-    qualification = db.Column(db.String(200))
-    experience_years = db.Column(db.Integer)
-    consultation_fee = db.Column(db.Float)
-    available_days = db.Column(db.String(200))  # Stored as JSON string
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Relationships
-    user = db.relationship('User', backref=db.backref('doctor_profile', uselist=False))
-    appointments = db.relationship('Appointment', backref='doctor', foreign_keys='Appointment.doctor_id')
-
-class Patient(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
-    age = db.Column(db.Integer)
-    gender = db.Column(db.String(20))
-    blood_group = db.Column(db.String(10))
-    weight = db.Column(db.Float)
-    height = db.Column(db.Float)
-    medical_history = db.Column(db.Text)
-    allergies = db.Column(db.Text)
-    emergency_contact = db.Column(db.String(100))
-    address = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Relationships
-    user = db.relationship('User', backref=db.backref('patient_profile', uselist=False))
-    appointments = db.relationship('Appointment', backref='patient', foreign_keys='Appointment.patient_id')
-    prescriptions = db.relationship('Prescription', backref='patient')
-
-class Appointment(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
-    appointment_date = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String(20), default='pending')
-    symptoms = db.Column(db.Text)
-    diagnosis = db.Column(db.Text)
-    notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-class Prescription(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'))
-    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
-    medications = db.Column(db.Text)  # Stored as JSON string
-    dosage_instructions = db.Column(db.Text)
-    duration = db.Column(db.String(100))
-    additional_notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Relationships
-    appointment = db.relationship('Appointment', backref='prescriptions')
-    doctor = db.relationship('Doctor', backref='prescriptions')
-
-# Add these models after other models
-class PatientFlow(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
-    time_slot = db.Column(db.String(10), nullable=False)
-    patient_count = db.Column(db.Integer, default=0)
-    date = db.Column(db.Date, nullable=False)
-    
-    doctor = db.relationship('Doctor', backref='patient_flows')
-
-class DiseaseDistribution(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
-    disease_name = db.Column(db.String(100), nullable=False)
-    patient_count = db.Column(db.Integer, default=0)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    doctor = db.relationship('Doctor', backref='disease_distributions')
+def configure(app):
+    # JWT Configuration
+    app.config['JWT_SECRET_KEY'] = 'your-secret-key'  # Change this to a secure key in production
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    app.config['JWT_TOKEN_LOCATION'] = ['headers']
+    app.config['JWT_HEADER_NAME'] = 'Authorization'
+    app.config['JWT_HEADER_TYPE'] = 'Bearer'
+    app.config['JWT_ERROR_MESSAGE_KEY'] = 'error'
+
+    # Database Configuration (pool settings come from the environment, see config.py)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_BINDS'] = replica_binds()
+    app.config['DB_REPLICA_STICKY_SECONDS'] = env_float('DB_REPLICA_STICKY_SECONDS', 5)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Per-request latency and SQL metrics on /metrics (see metrics.py)
+    app.config['METRICS_ENABLED'] = env_bool('METRICS_ENABLED', True)
+    app.config['SLOW_QUERY_MS'] = env_float('SLOW_QUERY_MS', 200)
+    app.config['SLOW_QUERY_SAMPLE_RATE'] = env_float('SLOW_QUERY_SAMPLE_RATE', 0.1)
+    app.config['SLOW_QUERY_LOG_SIZE'] = env_int('SLOW_QUERY_LOG_SIZE', 200)
+
+    # SQL statement budgets per view, against N+1 regressions (see query_budget.py)
+    app.config['QUERY_BUDGET_MODE'] = os.environ.get('QUERY_BUDGET_MODE', 'log')
+
+    # Chart click ingestion: with write-behind enabled, clicks are buffered in the
+    # worker and flushed in batches (see chart_buffer.py for the staleness window)
+    app.config['CHART_WRITE_BEHIND'] = env_bool('CHART_WRITE_BEHIND', False)
+    app.config['CHART_FLUSH_MAX_EVENTS'] = env_int('CHART_FLUSH_MAX_EVENTS', 500)
+    app.config['CHART_FLUSH_INTERVAL'] = env_float('CHART_FLUSH_INTERVAL', 2.0)
+
+    # Response cache for chart and doctor profile reads (see response_cache.py)
+    app.config['RESPONSE_CACHE_URL'] = os.environ.get('RESPONSE_CACHE_URL', '')
+    app.config['RESPONSE_CACHE_SIZE'] = env_int('RESPONSE_CACHE_SIZE', 2048)
+    app.config['RESPONSE_CACHE_TTL'] = env_int('RESPONSE_CACHE_TTL', 60)
 
-# Create tables
-with app.app_context():
-    db.create_all()
+    # Medical assistant gateway (see assistant.py)
+    app.config['ASSISTANT_BACKEND'] = os.environ.get('ASSISTANT_BACKEND', 'gemini')
+    app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY', '')
+    app.config['GEMINI_MODEL'] = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
+    app.config['ASSISTANT_CONCURRENCY'] = env_int('ASSISTANT_CONCURRENCY', 8)
+    app.config['ASSISTANT_TIMEOUT'] = env_float('ASSISTANT_TIMEOUT', 30)
+    app.config['ASSISTANT_RETRIES'] = env_int('ASSISTANT_RETRIES', 2)
+    app.config['ASSISTANT_PROMPT_VERSION'] = os.environ.get('ASSISTANT_PROMPT_VERSION', PROMPT_VERSION)
+    app.config['ASSISTANT_CACHE_PATH'] = os.environ.get(
+        'ASSISTANT_CACHE_PATH', os.path.join(app.instance_path, 'assistant_answers.db'))
+    app.config['ASSISTANT_CACHE_SIZE'] = env_int('ASSISTANT_CACHE_SIZE', 5000)
+    app.config['ASSISTANT_CACHE_TTL'] = env_int('ASSISTANT_CACHE_TTL', 7 * 24 * 3600)
+    app.config['ASSISTANT_STREAM_BUFFER'] = env_int('ASSISTANT_STREAM_BUFFER', 16)
+    app.config['ASSISTANT_READER_TIMEOUT'] = env_float('ASSISTANT_READER_TIMEOUT', 10)
+
+    # OCR process pool for lab report uploads (see lab_reports.py)
+    app.config['LAB_OCR_WORKERS'] = env_int('LAB_OCR_WORKERS', 0) or None
+    app.config['TESSERACT_CMD'] = os.environ.get('TESSERACT_CMD', '')
+    app.config['LAB_REPORT_CACHE_PATH'] = os.environ.get(
+        'LAB_REPORT_CACHE_PATH', os.path.join(app.instance_path, 'lab_reports.db'))
+    app.config['LAB_REPORT_CACHE_MAX_MB'] = env_int('LAB_REPORT_CACHE_MAX_MB', 256)
+
+    # Caller identity comes from the signed JWT claims (see identity.py)
+    app.config['IDENTITY_CACHE_SIZE'] = env_int('IDENTITY_CACHE_SIZE', 10000)
+    app.config['IDENTITY_CACHE_TTL'] = env_float('IDENTITY_CACHE_TTL', 300)
+
+def create_app(config=None):
+    app = Flask(__name__)
+    CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "http://localhost:3000"}})
+    configure(app)
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    # Engines are created here but open no connection until the first query
+    jwt.init_app(app)
+    db.init_app(app)
+    init_routing(app, db)
+    request_metrics.init_app(app, db)
+    chart_buffer.init_app(app)
+    response_cache.init_app(app)
+    gateway.init_app(app)
+    report_pool.init_app(app)
+    init_identity(app)
+    app.register_blueprint(api)
+    return app
 
 # Routes
-@app.route('/api/signup', methods=['POST'])
+@api.route('/api/signup', methods=['POST'])
+@query_budget(4)
 def signup():
     try:
         data = request.json
@@ -156,6 +160,9 @@ def signup():
         for field in required_fields:
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
+        # Admin accounts are granted in the database, never self-assigned
+        if data['role'] not in ('patient', 'doctor'):
+            return jsonify({'error': 'role must be patient or doctor'}), 400
         existing_user = User.query.filter_by(email=data['email']).first()
         if existing_user:
             return jsonify({'error': 'Email already registered'}), 400
@@ -192,6 +199,8 @@ def signup():
             )
             db.session.add(patient_profile)
         db.session.commit()
+        invalidate_profile(new_user.id)
+        note_write(new_user.id)
         return jsonify({
             'message': 'User created successfully',
             'user': {
@@ -206,7 +215,8 @@ def signup():
         db.session.rollback()
         return jsonify({'error': f'Signup failed: {str(e)}'}), 400
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
+@query_budget(1)
 def login():
     try:
         data = request.json
@@ -236,23 +246,24 @@ def login():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/dashboard', methods=['GET'])
+@api.route('/api/dashboard', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@replica_reads
 def get_dashboard_data():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
+        identity = current_identity()
         
-        if not user:
+        if not identity:
             return jsonify({"error": "User not found"}), 404
 
         # Default response data
         response_data = {
             "user": {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "role": user.role
+                "id": identity.user_id,
+                "username": identity.username,
+                "email": identity.email,
+                "role": identity.role
             },
             "appointments": 0,
             "total_appointments": 0,
@@ -266,60 +277,16 @@ def get_dashboard_data():
         }
 
         # Add role-specific data
-        if user.role == 'doctor':
-            # Get doctor's profile
-            doctor = Doctor.query.filter_by(user_id=user.id).first()
-            if doctor:
-                # Count appointments
-                response_data["appointments"] = Appointment.query.filter_by(
-                    doctor_id=doctor.id,
-                    appointment_date=datetime.utcnow().date()
-                ).count()
-                response_data["total_appointments"] = Appointment.query.filter_by(
-                    doctor_id=doctor.id
-                ).count()
-                # Count prescriptions
-                response_data["prescriptions"] = Prescription.query.filter_by(
-                    doctor_id=doctor.id
-                ).count()
-                # Count total patients
-                response_data["totalPatients"] = Patient.query.join(Appointment).filter(
-                    Appointment.doctor_id == doctor.id
-                ).distinct().count()
-                # Count visits
-                today = datetime.utcnow().date()
-                this_month = today.replace(day=1)
-                this_year = today.replace(month=1, day=1)
-                response_data["visits"] = {
-                    "daily": Appointment.query.filter_by(
-                        doctor_id=doctor.id,
-                        appointment_date=today
-                    ).count(),
-                    "monthly": Appointment.query.filter(
-                        Appointment.doctor_id == doctor.id,
-                        Appointment.appointment_date >= this_month
-                    ).count(),
-                    "yearly": Appointment.query.filter(
-                        Appointment.doctor_id == doctor.id,
-                        Appointment.appointment_date >= this_year
-                    ).count()
-                }
+        if identity.role == 'doctor':
+            doctor_id = profile_id(identity)
+            if doctor_id:
+                # All counters come from a single aggregate query
+                response_data.update(doctor_counters(doctor_id))
         else:
             # Get patient's profile
-            patient = Patient.query.filter_by(user_id=user.id).first()
+            patient = Patient.query.filter_by(user_id=identity.user_id).first()
             if patient:
-                # Count upcoming appointments
-                response_data["appointments"] = Appointment.query.filter(
-                    Appointment.patient_id == patient.id,
-                    Appointment.appointment_date >= datetime.utcnow()
-                ).count()
-                response_data["total_appointments"] = Appointment.query.filter_by(
-                    patient_id=patient.id
-                ).count()
-                # Count prescriptions
-                response_data["prescriptions"] = Prescription.query.filter_by(
-                    patient_id=patient.id
-                ).count()
+                response_data.update(patient_counters(patient.id))
                 # Add patient info
                 response_data["patient_info"] = {
                     "age": patient.age,
@@ -334,7 +301,8 @@ def get_dashboard_data():
         print("Error in dashboard:", str(e))
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/patient-info', methods=['POST'])
+@api.route('/api/patient-info', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def save_patient_info():
     current_user_id = get_jwt_identity()
@@ -362,6 +330,7 @@ def save_patient_info():
             db.session.add(patient_info)
             
         db.session.commit()
+        invalidate_profile(current_user_id)
         return jsonify({
             'message': 'Patient information saved successfully',
             'data': {
@@ -376,7 +345,8 @@ def save_patient_info():
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/appointments', methods=['POST'])
+@api.route('/api/appointments', methods=['POST'])
+@query_budget(1)
 def create_appointment():
     data = request.json
     try:
@@ -394,62 +364,113 @@ def create_appointment():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
-@app.route('/api/appointments/<int:user_id>', methods=['GET'])
+APPOINTMENT = Serializer(Appointment, [
+    Field('id'),
+    Field('appointment_date', convert=minutes),
+    Field('status'),
+    Field('symptoms'),
+    Field('diagnosis'),
+    Field('notes')
+])
+
+@api.route('/api/appointments/<int:user_id>', methods=['GET'])
+@query_budget(3)
+@replica_reads
 def get_appointments(user_id):
     user = User.query.get(user_id)
     if not user:
         return jsonify({'error': 'User not found'}), 404
-    
+
+    # Appointments reference the doctor/patient profile, not the user row
     if user.role == 'doctor':
-        appointments = Appointment.query.filter_by(doctor_id=user_id).all()
+        owner = Doctor
+        owner_column = Appointment.doctor_id
     else:
-        appointments = Appointment.query.filter_by(patient_id=user_id).all()
-    
-    return jsonify({
-        'appointments': [{
-            'id': apt.id,
-            'appointment_date': apt.appointment_date.strftime('%Y-%m-%d %H:%M'),
-            'status': apt.status,
-            'symptoms': apt.symptoms,
-            'diagnosis': apt.diagnosis,
-            'notes': apt.notes
-        } for apt in appointments]
-    }), 200
+        owner = Patient
+        owner_column = Appointment.patient_id
+    owner_id = db.session.scalar(select(owner.id).where(owner.user_id == user.id))
+    if not owner_id:
+        return json_response({'appointments': [], 'next_cursor': None})
+
+    # Plain column tuples, serialized by position: no ORM objects are built
+    stmt = select(*APPOINTMENT.columns).where(owner_column == owner_id)
+
+    try:
+        if request.args.get('from'):
+            stmt = stmt.where(Appointment.appointment_date >= parse_date(request.args['from'], 'from'))
+        if request.args.get('to'):
+            end = parse_date(request.args['to'], 'to')
+            if len(request.args['to']) == 10:
+                # A bare date includes the whole day
+                end += timedelta(days=1)
+            stmt = stmt.where(Appointment.appointment_date < end)
+        if request.args.get('status'):
+            stmt = stmt.where(Appointment.status.in_(request.args['status'].split(',')))
+        if request.args.get('cursor'):
+            stmt = stmt.where(after_cursor(Appointment.appointment_date, Appointment.id, request.args['cursor']))
+        limit = page_size(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    stmt = stmt.order_by(Appointment.appointment_date, Appointment.id)
+
+    # NDJSON streaming: rows are fetched through a server-side cursor and
+    # written out one line at a time, so memory stays flat for any history size
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            result = db.session.execute(stmt.execution_options(yield_per=1000))
+            try:
+                for apt in result:
+                    yield dumps(APPOINTMENT.from_tuple(apt)) + b'\n'
+            finally:
+                result.close()
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].appointment_date, rows[-1].id)
+
+    return json_response({
+        'appointments': APPOINTMENT.from_tuples(rows),
+        'next_cursor': next_cursor
+    })
 
-@app.route('/api/doctor/profile', methods=['GET', 'PUT'])
+DOCTOR_PROFILE = Serializer(Doctor, [
+    Field('specialization', default=""),
+    Field('qualification', default=""),
+    Field('experience_years', default=0),
+    Field('consultation_fee', default=0),
+    Field('available_days', convert=literal_list)
+])
+
+@api.route('/api/doctor/profile', methods=['GET', 'PUT'])
+@query_budget(3)
 @jwt_required()
+@replica_reads
 def doctor_profile():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
+        identity = current_identity()
         
-        if not user or user.role != 'doctor':
+        if not identity or identity.role != 'doctor':
             return jsonify({"error": "Unauthorized access"}), 401
 
-        doctor = Doctor.query.filter_by(user_id=user.id).first()
+        cache_key = doctor_profile_key(identity.user_id)
+        if request.method == 'GET':
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return json_response(cached)
+
+        doctor = Doctor.query.filter_by(user_id=identity.user_id).first()
         
         if request.method == 'GET':
             if not doctor:
-                return jsonify({
-                    "specialization": "",
-                    "qualification": "",
-                    "experience_years": 0,
-                    "consultation_fee": 0,
-                    "available_days": []
-                }), 200
-                
-            try:
-                available_days = eval(doctor.available_days) if doctor.available_days else []
-            except:
-                available_days = []
+                return json_response(DOCTOR_PROFILE.defaults())
                 
-            return jsonify({
-                "specialization": doctor.specialization or "",
-                "qualification": doctor.qualification or "",
-                "experience_years": doctor.experience_years or 0,
-                "consultation_fee": doctor.consultation_fee or 0,
-                "available_days": available_days
-            }), 200
+            payload = DOCTOR_PROFILE(doctor)
+            response_cache.set(cache_key, payload)
+            return json_response(payload)
             
         elif request.method == 'PUT':
             try:
@@ -458,7 +479,7 @@ def doctor_profile():
                 
                 if not doctor:
                     doctor = Doctor(
-                        user_id=user.id,
+                        user_id=identity.user_id,
                         specialization="",
                         qualification="",
                         experience_years=0,
@@ -483,18 +504,14 @@ def doctor_profile():
                 doctor.updated_at = datetime.utcnow()
                 
                 db.session.commit()
+                invalidate_profile(identity.user_id)
+                response_cache.invalidate(cache_key)
                 print("Profile updated successfully")
                 
-                return jsonify({
+                return json_response({
                     "message": "Profile updated successfully",
-                    "data": {
-                        "specialization": doctor.specialization,
-                        "qualification": doctor.qualification,
-                        "experience_years": doctor.experience_years,
-                        "consultation_fee": doctor.consultation_fee,
-                        "available_days": eval(doctor.available_days) if doctor.available_days else []
-                    }
-                }), 200
+                    "data": DOCTOR_PROFILE(doctor)
+                })
                 
             except Exception as e:
                 db.session.rollback()
@@ -505,74 +522,70 @@ def doctor_profile():
         print("Error in doctor profile:", str(e))
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/doctor/charts', methods=['GET'])
+@api.route('/api/doctor/charts', methods=['GET'])
+@query_budget(7)
 @jwt_required()
+@replica_reads
 def get_chart_data():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
+        identity = current_identity()
         
-        if not user or user.role != 'doctor':
+        if not identity or identity.role != 'doctor':
             return jsonify({'error': 'Unauthorized access'}), 401
             
-        doctor = Doctor.query.filter_by(user_id=user.id).first()
-        if not doctor:
+        doctor_id = profile_id(identity)
+        if not doctor_id:
             return jsonify({'error': 'Doctor not found'}), 404
             
         # Get today's date
         today = datetime.now().date()
         
-        # Get patient flow data
+        cache_key = charts_key(doctor_id, today)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+        
+        # Get patient flow data, in the order the slots were created
         patient_flows = PatientFlow.query.filter_by(
-            doctor_id=doctor.id,
+            doctor_id=doctor_id,
             date=today
-        ).all()
+        ).order_by(PatientFlow.id).all()
         
         # If no data exists for today, create default entries
         if not patient_flows:
+            # Zero increments insert the default rows without racing a
+            # concurrent request doing the same
             time_slots = ['9 AM', '10 AM', '11 AM', '12 PM', '2 PM', '3 PM', '4 PM', '5 PM']
-            for slot in time_slots:
-                flow = PatientFlow(
-                    doctor_id=doctor.id,
-                    time_slot=slot,
-                    date=today,
-                    patient_count=0
-                )
-                db.session.add(flow)
+            add_patient_flow_counts({(doctor_id, today, slot): 0 for slot in time_slots})
             db.session.commit()
             patient_flows = PatientFlow.query.filter_by(
-                doctor_id=doctor.id,
+                doctor_id=doctor_id,
                 date=today
-            ).all()
+            ).order_by(PatientFlow.id).all()
+        
+        # Formatted before the disease defaults are committed: the commit
+        # expires the flow rows and would reload them one by one
+        flow_data = [
+            {
+                'time': flow.time_slot,
+                'patients': flow.patient_count
+            } for flow in patient_flows
+        ]
         
         # Get disease distribution data
         disease_dist = DiseaseDistribution.query.filter_by(
-            doctor_id=doctor.id
+            doctor_id=doctor_id
         ).order_by(DiseaseDistribution.patient_count.desc()).limit(5).all()
         
         # If no disease data exists, create default entries
         if not disease_dist:
             diseases = ['Fever', 'Cold & Flu', 'Diabetes', 'Blood Pressure', 'Others']
-            for disease in diseases:
-                dist = DiseaseDistribution(
-                    doctor_id=doctor.id,
-                    disease_name=disease,
-                    patient_count=0
-                )
-                db.session.add(dist)
+            add_disease_counts({(doctor_id, disease): 0 for disease in diseases})
             db.session.commit()
             disease_dist = DiseaseDistribution.query.filter_by(
-                doctor_id=doctor.id
+                doctor_id=doctor_id
             ).order_by(DiseaseDistribution.patient_count.desc()).limit(5).all()
         
-        # Format data for frontend
-        flow_data = [
-            {
-                'time': flow.time_slot,
-                'patients': flow.patient_count
-            } for flow in patient_flows
-        ]
-        
         disease_data = [
             {
                 'name': dist.disease_name,
@@ -580,139 +593,157 @@ def get_chart_data():
             } for dist in disease_dist
         ]
         
-        return jsonify({
+        payload = {
             'patient_flow': flow_data,
             'disease_distribution': disease_data
-        })
+        }
+        response_cache.set(cache_key, payload)
+        return jsonify(payload)
         
     except Exception as e:
         print(f"Error fetching chart data: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/doctor/charts/update', methods=['POST'])
+@api.route('/api/doctor/charts/update', methods=['POST'])
+@query_budget(3)
 @jwt_required()
 def update_chart_data():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
+        identity = current_identity()
         
-        if not user or user.role != 'doctor':
+        if not identity or identity.role != 'doctor':
             return jsonify({'error': 'Unauthorized access'}), 401
             
-        doctor = Doctor.query.filter_by(user_id=user.id).first()
-        if not doctor:
+        doctor_id = profile_id(identity)
+        if not doctor_id:
             return jsonify({'error': 'Doctor not found'}), 404
             
         data = request.get_json()
         time_slot = data.get('time_slot')
         disease_name = data.get('disease_name')
         
-        if not time_slot or not disease_name:
-            return jsonify({'error': 'Missing required data'}), 400
+        error = chart_event_error(time_slot, disease_name)
+        if error:
+            return jsonify({'error': error}), 400
             
         today = datetime.now().date()
         
-        # Update patient flow
-        flow = PatientFlow.query.filter_by(
-            doctor_id=doctor.id,
-            date=today,
-            time_slot=time_slot
-        ).first()
-        
-        if flow:
-            flow.patient_count += 1
+        if current_app.config['CHART_WRITE_BEHIND']:
+            chart_buffer.add(doctor_id, time_slot, disease_name, today)
         else:
-            flow = PatientFlow(
-                doctor_id=doctor.id,
-                time_slot=time_slot,
-                date=today,
-                patient_count=1
-            )
-            db.session.add(flow)
+            # Atomic increments; no read-modify-write, so concurrent clicks all count
+            add_patient_flow_counts({(doctor_id, today, time_slot): 1})
+            add_disease_counts({(doctor_id, disease_name): 1})
+            db.session.commit()
+            response_cache.invalidate(charts_key(doctor_id, today))
+        
+        return jsonify({'message': 'Chart data updated successfully'})
+        
+    except Exception as e:
+        print(f"Error updating chart data: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+
+MAX_CHART_EVENTS = 1000
+
+@api.route('/api/doctor/charts/events', methods=['POST'])
+@query_budget(3)
+@jwt_required()
+def ingest_chart_events():
+    try:
+        identity = current_identity()
+        
+        if not identity or identity.role != 'doctor':
+            return jsonify({'error': 'Unauthorized access'}), 401
             
-        # Update disease distribution
-        dist = DiseaseDistribution.query.filter_by(
-            doctor_id=doctor.id,
-            disease_name=disease_name
-        ).first()
+        doctor_id = profile_id(identity)
+        if not doctor_id:
+            return jsonify({'error': 'Doctor not found'}), 404
+            
+        data = request.get_json()
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events:
+            return jsonify({'error': 'Expected a non-empty list of events'}), 400
+        if len(events) > MAX_CHART_EVENTS:
+            return jsonify({'error': f'At most {MAX_CHART_EVENTS} events per request'}), 413
+            
+        today = datetime.now().date()
+        flows, diseases = Counter(), Counter()
+        rejected = []
+        for index, event in enumerate(events):
+            time_slot = event.get('time_slot') if isinstance(event, dict) else None
+            disease_name = event.get('disease_name') if isinstance(event, dict) else None
+            if chart_event_error(time_slot, disease_name):
+                rejected.append(index)
+                continue
+            flows[(doctor_id, today, time_slot)] += 1
+            diseases[(doctor_id, disease_name)] += 1
         
-        if dist:
-            dist.patient_count += 1
+        accepted = len(events) - len(rejected)
+        if current_app.config['CHART_WRITE_BEHIND']:
+            chart_buffer.merge(flows, diseases, accepted)
         else:
-            dist = DiseaseDistribution(
-                doctor_id=doctor.id,
-                disease_name=disease_name,
-                patient_count=1
-            )
-            db.session.add(dist)
-            
-        db.session.commit()
+            # Increments are merged first, so the whole batch is two statements
+            add_patient_flow_counts(flows)
+            add_disease_counts(diseases)
+            db.session.commit()
+            response_cache.invalidate(charts_key(doctor_id, today))
         
-        return jsonify({'message': 'Chart data updated successfully'})
+        return jsonify({
+            'message': 'Chart events recorded',
+            'accepted': accepted,
+            'rejected': rejected
+        }), 202 if current_app.config['CHART_WRITE_BEHIND'] else 200
         
     except Exception as e:
-        print(f"Error updating chart data: {str(e)}")
+        print(f"Error ingesting chart events: {str(e)}")
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/patient/profile', methods=['GET', 'PUT'])
+PATIENT_PROFILE = Serializer(Patient, [
+    Field('age', default=0),
+    Field('gender', default=""),
+    Field('blood_group', default=""),
+    Field('weight', default=0),
+    Field('height', default=0),
+    Field('medical_history', default=""),
+    Field('allergies', default=""),
+    Field('chronic_diseases', default=""),
+    Field('current_medications', default=""),
+    Field('family_history', default=""),
+    Field('lifestyle_habits', default=""),
+    Field('emergency_contact', default=""),
+    Field('emergency_contact_relation', default=""),
+    Field('address', default=""),
+    Field('occupation', default=""),
+    Field('marital_status', default="")
+])
+
+@api.route('/api/patient/profile', methods=['GET', 'PUT'])
+@query_budget(3)
 @jwt_required()
+@replica_reads
 def patient_profile():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
+        identity = current_identity()
         
-        if not user or user.role != 'patient':
+        if not identity or identity.role != 'patient':
             return jsonify({"error": "Unauthorized access"}), 401
 
-        patient = Patient.query.filter_by(user_id=user.id).first()
+        patient = Patient.query.filter_by(user_id=identity.user_id).first()
         
         if request.method == 'GET':
             if not patient:
-                return jsonify({
-                    "age": 0,
-                    "gender": "",
-                    "blood_group": "",
-                    "weight": 0,
-                    "height": 0,
-                    "medical_history": "",
-                    "allergies": "",
-                    "chronic_diseases": "",
-                    "current_medications": "",
-                    "family_history": "",
-                    "lifestyle_habits": "",
-                    "emergency_contact": "",
-                    "emergency_contact_relation": "",
-                    "address": "",
-                    "occupation": "",
-                    "marital_status": ""
-                }), 200
+                return json_response(PATIENT_PROFILE.defaults())
                 
-            return jsonify({
-                "age": patient.age or 0,
-                "gender": patient.gender or "",
-                "blood_group": patient.blood_group or "",
-                "weight": patient.weight or 0,
-                "height": patient.height or 0,
-                "medical_history": patient.medical_history or "",
-                "allergies": patient.allergies or "",
-                "chronic_diseases": patient.chronic_diseases or "",
-                "current_medications": patient.current_medications or "",
-                "family_history": patient.family_history or "",
-                "lifestyle_habits": patient.lifestyle_habits or "",
-                "emergency_contact": patient.emergency_contact or "",
-                "emergency_contact_relation": patient.emergency_contact_relation or "",
-                "address": patient.address or "",
-                "occupation": patient.occupation or "",
-                "marital_status": patient.marital_status or ""
-            }), 200
+            return json_response(PATIENT_PROFILE(patient))
             
         elif request.method == 'PUT':
             try:
                 data = request.get_json()
                 
                 if not patient:
-                    patient = Patient(user_id=user.id)
+                    patient = Patient(user_id=identity.user_id)
                     db.session.add(patient)
                 
                 # Update patient profile
@@ -736,28 +767,12 @@ def patient_profile():
                 patient.updated_at = datetime.utcnow()
                 
                 db.session.commit()
+                invalidate_profile(identity.user_id)
                 
-                return jsonify({
+                return json_response({
                     "message": "Profile updated successfully",
-                    "data": {
-                        "age": patient.age,
-                        "gender": patient.gender,
-                        "blood_group": patient.blood_group,
-                        "weight": patient.weight,
-                        "height": patient.height,
-                        "medical_history": patient.medical_history,
-                        "allergies": patient.allergies,
-                        "chronic_diseases": patient.chronic_diseases,
-                        "current_medications": patient.current_medications,
-                        "family_history": patient.family_history,
-                        "lifestyle_habits": patient.lifestyle_habits,
-                        "emergency_contact": patient.emergency_contact,
-                        "emergency_contact_relation": patient.emergency_contact_relation,
-                        "address": patient.address,
-                        "occupation": patient.occupation,
-                        "marital_status": patient.marital_status
-                    }
-                }), 200
+                    "data": PATIENT_PROFILE(patient)
+                })
                 
             except Exception as e:
                 db.session.rollback()
@@ -768,72 +783,57 @@ def patient_profile():
         print("Error in patient profile:", str(e))
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/patient/vitals', methods=['GET', 'POST'])
+VITALS = Serializer(PatientVitals, [
+    Field('blood_pressure', convert=format_blood_pressure, source=('systolic', 'diastolic')),
+    Field('systolic'),
+    Field('diastolic'),
+    Field('heart_rate', default=0),
+    Field('temperature', default=0),
+    Field('respiratory_rate', default=0),
+    Field('blood_sugar', default=0),
+    Field('recorded_at', convert=isoformat)
+])
+
+@api.route('/api/patient/vitals', methods=['GET', 'POST'])
+@query_budget(4)
 @jwt_required()
+@replica_reads
 def patient_vitals():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(int(current_user_id))
+        identity = current_identity()
         
-        if not user or user.role != 'patient':
+        if not identity or identity.role != 'patient':
             return jsonify({"error": "Unauthorized access"}), 401
 
-        patient = Patient.query.filter_by(user_id=user.id).first()
-        if not patient:
+        patient_id = profile_id(identity)
+        if not patient_id:
             return jsonify({"error": "Patient not found"}), 404
             
         if request.method == 'GET':
             # Get latest vitals
-            vitals = PatientVitals.query.filter_by(
-                patient_id=patient.id
-            ).order_by(PatientVitals.recorded_at.desc()).first()
+            vitals = latest_vitals(patient_id)
             
             if not vitals:
-                return jsonify({
-                    "blood_pressure": "",
-                    "heart_rate": 0,
-                    "temperature": 0,
-                    "respiratory_rate": 0,
-                    "blood_sugar": 0,
-                    "recorded_at": None
-                }), 200
+                return json_response(VITALS.defaults())
                 
-            return jsonify({
-                "blood_pressure": vitals.blood_pressure,
-                "heart_rate": vitals.heart_rate,
-                "temperature": vitals.temperature,
-                "respiratory_rate": vitals.respiratory_rate,
-                "blood_sugar": vitals.blood_sugar,
-                "recorded_at": vitals.recorded_at.isoformat()
-            }), 200
+            return json_response(VITALS(vitals))
             
         elif request.method == 'POST':
             try:
                 data = request.get_json()
+                reading = reading_from_json(data)
+                reading['patient_id'] = patient_id
+                reading['recorded_at'] = parse_timestamp(data['recorded_at']) \
+                    if data.get('recorded_at') else datetime.utcnow()
                 
-                vitals = PatientVitals(
-                    patient_id=patient.id,
-                    blood_pressure=data.get('blood_pressure', ''),
-                    heart_rate=data.get('heart_rate', 0),
-                    temperature=data.get('temperature', 0),
-                    respiratory_rate=data.get('respiratory_rate', 0),
-                    blood_sugar=data.get('blood_sugar', 0)
-                )
-                
-                db.session.add(vitals)
+                record_vitals([reading])
                 db.session.commit()
+                note_write(identity.user_id)
                 
-                return jsonify({
+                return json_response({
                     "message": "Vitals recorded successfully",
-                    "data": {
-                        "blood_pressure": vitals.blood_pressure,
-                        "heart_rate": vitals.heart_rate,
-                        "temperature": vitals.temperature,
-                        "respiratory_rate": vitals.respiratory_rate,
-                        "blood_sugar": vitals.blood_sugar,
-                        "recorded_at": vitals.recorded_at.isoformat()
-                    }
-                }), 201
+                    "data": VITALS.from_mapping(reading)
+                }, 201)
                 
             except Exception as e:
                 db.session.rollback()
@@ -844,8 +844,340 @@ def patient_vitals():
         print("Error in patient vitals:", str(e))
         return jsonify({"error": str(e)}), 500
 
-if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+VITALS_INGEST_CHUNK = 1000
+
+@api.route('/api/patient/vitals/bulk', methods=['POST'])
+@query_budget(1)
+@jwt_required()
+def bulk_patient_vitals():
+    # Body is NDJSON (application/x-ndjson) or CSV (text/csv) with one reading
+    # per line: recorded_at (ISO 8601) plus any of the vitals. The body is
+    # read as a stream; valid rows are committed every VITALS_INGEST_CHUNK
+    # rows and invalid ones are reported by line number.
+    identity = current_identity()
+    if not identity or identity.role != 'patient':
+        return jsonify({"error": "Unauthorized access"}), 401
+    patient_id = profile_id(identity)
+    if not patient_id:
+        return jsonify({"error": "Patient not found"}), 404
+
+    content_type = request.mimetype
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/json'):
+        records = parse_ndjson(request.stream)
+    elif content_type in ('text/csv', 'application/csv'):
+        records = parse_csv(request.stream)
+    else:
+        return jsonify({'error': 'Send application/x-ndjson or text/csv'}), 415
+
+    try:
+        summary = ingest_readings(patient_id, records, chunk_size=VITALS_INGEST_CHUNK)
+    except IngestError as e:
+        print("Error ingesting vitals:", str(e))
+        note_write(identity.user_id)
+        return jsonify({**e.summary, 'error': 'Database error; rows after the last committed chunk were not saved'}), 500
+    if summary['accepted']:
+        note_write(identity.user_id)
+    return jsonify(summary), 200 if not summary['rejected'] else 207
+
+MAX_VITALS_POINTS = 2000
 
-print("Flask server is running on http://localhost:5000")
+@api.route('/api/patient/vitals/range', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+@replica_reads
+def patient_vitals_range():
+    # ?metric=heart_rate&from=YYYY-MM-DD[ HH:MM]&to=...&points=500
+    # Returns at most `points` {t, n, avg, min, max} entries; long ranges are
+    # served from the hourly or daily rollups.
+    try:
+        identity = current_identity()
+        if not identity or identity.role != 'patient':
+            return jsonify({"error": "Unauthorized access"}), 401
+        patient_id = profile_id(identity)
+        if not patient_id:
+            return jsonify({"error": "Patient not found"}), 404
+
+        metric = request.args.get('metric', '')
+        if metric not in METRICS:
+            return jsonify({'error': f"metric must be one of {', '.join(METRICS)}"}), 400
+        try:
+            end = parse_date(request.args['to'], 'to') if request.args.get('to') else datetime.utcnow()
+            start = parse_date(request.args['from'], 'from') if request.args.get('from') else end - timedelta(days=7)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if start >= end:
+            return jsonify({'error': 'from must be before to'}), 400
+        points = max(10, min(request.args.get('points', 500, type=int), MAX_VITALS_POINTS))
+
+        resolution, series = vitals_range(patient_id, metric, start, end, points)
+        return jsonify({
+            'metric': metric,
+            'resolution': resolution,
+            'points': [
+                {'t': p['t'].isoformat(), 'n': p['n'], 'avg': round(p['avg'], 2), 'min': p['min'], 'max': p['max']}
+                for p in series
+            ]
+        }), 200
+    except Exception as e:
+        print("Error in vitals range:", str(e))
+        return jsonify({"error": str(e)}), 500
+
+MAX_QUESTION_LENGTH = 2000
+
+@api.route('/api/assistant', methods=['POST'])
+@query_budget(0)
+@jwt_required()
+def ask_assistant():
+    data = request.get_json(silent=True) or {}
+    question = str(data.get('question', '')).strip()
+    if not question:
+        return jsonify({'error': 'Missing question'}), 400
+    if len(question) > MAX_QUESTION_LENGTH:
+        return jsonify({'error': f'Question is limited to {MAX_QUESTION_LENGTH} characters'}), 400
+    try:
+        answer = gateway.ask(question)
+        return jsonify({'answer': answer}), 200
+    except AssistantTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except AssistantError as e:
+        print("Assistant error:", str(e))
+        return jsonify({'error': 'Assistant is unavailable'}), 502
+    except Exception as e:
+        print("Assistant error:", str(e))
+        return jsonify({'error': 'Assistant is unavailable'}), 502
+
+def _sse(data, event=None):
+    prefix = f'event: {event}\n' if event else ''
+    return f'{prefix}data: {json.dumps(data)}\n\n'
+
+@api.route('/api/assistant/stream', methods=['POST'])
+@query_budget(0)
+@jwt_required()
+def stream_assistant():
+    # Server-sent events: one "data" event per chunk, then "done". The first
+    # chunk is awaited here so upstream failures still get a real status code;
+    # later failures arrive as an "error" event.
+    data = request.get_json(silent=True) or {}
+    question = str(data.get('question', '')).strip()
+    if not question:
+        return jsonify({'error': 'Missing question'}), 400
+    if len(question) > MAX_QUESTION_LENGTH:
+        return jsonify({'error': f'Question is limited to {MAX_QUESTION_LENGTH} characters'}), 400
+    chunks = gateway.stream(question)
+    try:
+        first = next(chunks, None)
+    except AssistantTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        print("Assistant error:", str(e))
+        return jsonify({'error': 'Assistant is unavailable'}), 502
+
+    def generate():
+        # Closing this generator on disconnect closes `chunks`, which cancels
+        # the upstream call
+        try:
+            if first is not None:
+                yield _sse({'text': first})
+            for chunk in chunks:
+                yield _sse({'text': chunk})
+            yield _sse({}, event='done')
+        except AssistantError as e:
+            print("Assistant error:", str(e))
+            yield _sse({'error': 'Assistant is unavailable'}, event='error')
+        finally:
+            chunks.close()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+MAX_LAB_REPORTS = 50
+MAX_LAB_REPORT_BYTES = 10 * 1024 * 1024
+# Every file of an upload is held in memory until the pool has it, so the
+# upload as a whole is capped too, not just each file
+MAX_LAB_UPLOAD_BYTES = 50 * 1024 * 1024
+
+@api.route('/api/lab-reports', methods=['POST'])
+@query_budget(1)
+@jwt_required()
+def upload_lab_reports():
+    # Multipart upload, one or more files in the "reports" field. Results
+    # stream back as NDJSON, one line per file in the order OCR finishes;
+    # "index" is the file's position in the upload. ?summary=1 adds a model
+    # summary of each report. Values from a patient's own uploads are stored
+    # for the doctor panel.
+    identity = current_identity()
+    patient_id = profile_id(identity) if identity and identity.role == 'patient' else None
+    uploads = request.files.getlist('reports')
+    if not uploads:
+        return jsonify({'error': 'No reports uploaded'}), 400
+    if len(uploads) > MAX_LAB_REPORTS:
+        return jsonify({'error': f'At most {MAX_LAB_REPORTS} reports per upload'}), 413
+    files = []
+    total = 0
+    for upload in uploads:
+        data = upload.read(min(MAX_LAB_REPORT_BYTES, MAX_LAB_UPLOAD_BYTES - total) + 1)
+        if len(data) > MAX_LAB_REPORT_BYTES:
+            return jsonify({'error': f'{upload.filename} is larger than {MAX_LAB_REPORT_BYTES // (1024 * 1024)} MB'}), 413
+        total += len(data)
+        if total > MAX_LAB_UPLOAD_BYTES:
+            return jsonify({'error': f'Reports are larger than {MAX_LAB_UPLOAD_BYTES // (1024 * 1024)} MB in total'}), 413
+        files.append((upload.filename, data))
+    summarize = request.args.get('summary') == '1'
+
+    def generate():
+        results = report_pool.process(files, summarize=summarize)
+        try:
+            for index, result in results:
+                if patient_id and result.get('values'):
+                    now = datetime.utcnow()
+                    db.session.execute(LabResult.__table__.insert(), [
+                        {'patient_id': patient_id, 'test': test, 'value': value, 'recorded_at': now}
+                        for test, value in result['values'].items()
+                    ])
+                    db.session.commit()
+                    note_write(identity.user_id)
+                yield json.dumps({'index': index, **result}) + '\n'
+        finally:
+            results.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+MAX_PANEL_FLAGGED = 500
+
+@api.route('/api/doctor/lab-panel', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+@replica_reads
+def doctor_lab_panel():
+    # Lab summary across the doctor's patients (anyone with an appointment):
+    # latest value per patient and test, classified against sex- and
+    # age-specific ranges, plus the most abnormal patients (?limit=, default 50)
+    try:
+        identity = current_identity()
+        if not identity or identity.role != 'doctor':
+            return jsonify({'error': 'Unauthorized access'}), 401
+        doctor_id = profile_id(identity)
+        if not doctor_id:
+            return jsonify({'error': 'Doctor not found'}), 404
+        limit = min(request.args.get('limit', 50, type=int), MAX_PANEL_FLAGGED)
+
+        panel = select(Appointment.patient_id).where(Appointment.doctor_id == doctor_id).distinct()
+        rows = db.session.execute(
+            select(LabResult.patient_id, LabResult.test, LabResult.value, Patient.gender, Patient.age)
+            .join(Patient, Patient.id == LabResult.patient_id)
+            .where(LabResult.patient_id.in_(panel))
+            .order_by(LabResult.recorded_at, LabResult.id)
+        ).all()
+        if not rows:
+            return jsonify({'tests': {}, 'flagged': [], 'flagged_total': 0}), 200
+        # Imported here: numpy adds tens of milliseconds to every worker's
+        # startup and only this view needs it
+        from lab_analytics import build_columns, panel_report
+        columns = build_columns(rows)
+        return jsonify(panel_report(columns, flagged_limit=limit)), 200
+    except Exception as e:
+        print("Error in lab panel:", str(e))
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/assistant/stats', methods=['GET'])
+@query_budget(0)
+@jwt_required()
+def assistant_stats():
+    identity = current_identity()
+    if not identity or identity.role != 'admin':
+        return jsonify({"error": "Unauthorized access"}), 401
+    return jsonify(gateway.snapshot()), 200
+
+@api.route('/api/cache/stats', methods=['GET'])
+@query_budget(0)
+@jwt_required()
+def cache_stats():
+    identity = current_identity()
+    if not identity or identity.role != 'admin':
+        return jsonify({"error": "Unauthorized access"}), 401
+    return jsonify({
+        'response_cache': response_cache.stats(),
+        'identity_cache': identity_profile_cache.stats(),
+        'lab_report_cache': report_pool.cache.stats() if report_pool.cache is not None else None
+    }), 200
+
+@api.route('/api/pool/stats', methods=['GET'])
+@query_budget(0)
+@jwt_required()
+def pool_stats():
+    identity = current_identity()
+    if not identity or identity.role != 'admin':
+        return jsonify({"error": "Unauthorized access"}), 401
+    stats = pool_snapshot(db.engine)
+    replicas = current_app.extensions.get('db_replicas', [])
+    if replicas:
+        stats['replicas'] = [pool_snapshot(engine) for engine in replicas]
+    return jsonify(stats), 200
+
+@api.route('/metrics', methods=['GET'])
+@query_budget(0)
+def prometheus_metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/metrics/slow-queries', methods=['GET'])
+@query_budget(0)
+@jwt_required()
+def slow_queries():
+    identity = current_identity()
+    if not identity or identity.role != 'admin':
+        return jsonify({"error": "Unauthorized access"}), 401
+    return jsonify({
+        'threshold_ms': request_metrics.slow_query_ms,
+        'sample_rate': request_metrics.sample_rate,
+        'queries': list(request_metrics.slow_queries)
+    }), 200
+
+@api.route('/api/admin/export/<table>', methods=['GET'])
+@query_budget(1)
+@jwt_required()
+def export_records(table):
+    # Streams a whole table, or ?since=/?until= on its date column, as
+    # ?format=csv|ndjson|parquet, optionally ?gzip=1. Rows come in id order:
+    # to resume a broken download, pass the last id received as ?after_id=.
+    identity = current_identity()
+    if not identity or identity.role != 'admin':
+        return jsonify({"error": "Unauthorized access"}), 401
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': f'Unknown table {table}'}), 404
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip') in ('1', 'true')
+    try:
+        since = parse_date(request.args['since'], 'since') if request.args.get('since') else None
+        until = parse_date(request.args['until'], 'until') if request.args.get('until') else None
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+        chunk_size = int(request.args.get('chunk', DEFAULT_CHUNK_ROWS))
+        # Exports read from a replica when one is configured
+        replicas = current_app.extensions.get('db_replicas')
+        engine = random.choice(replicas) if replicas else db.engine
+        chunks = export_chunks(engine, table, fmt, since, until, after_id, chunk_size, compress,
+                               header=after_id is None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        try:
+            for _, _, data in chunks:
+                if data:
+                    yield data
+        except Exception as e:
+            # Headers are gone; a truncated body is the only signal left
+            print("Error exporting " + table + ":", str(e))
+            raise
+
+    mimetype, extension = FORMATS[fmt]
+    filename = f'{table}.{extension}' + ('.gz' if compress and fmt != 'parquet' else '')
+    if compress and fmt != 'parquet':
+        mimetype = 'application/gzip'
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',
+    })
+
+if __name__ == '__main__':
+    create_app().run(debug=True, port=5000)
 
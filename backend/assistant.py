@@ -0,0 +1,364 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from answer_cache import AnswerCache, normalize_question
+
+# Inference gateway for the medical assistant. One shared model client serves
+# every request; calls run on a private asyncio loop (in a background thread,
+# so sync Flask views can use it) under a concurrency limit. Identical
+# questions already in flight share a single upstream call, and failures are
+# retried with exponential backoff and full jitter.
+#
+# stream() relays the model's partial output as it is generated. Chunks pass
+# through a bounded asyncio.Queue, so a slow reader pauses the upstream
+# stream instead of buffering the whole answer, and closing the generator (the
+# client went away) cancels the upstream call. A reader that stops reading
+# altogether aborts the stream after ASSISTANT_READER_TIMEOUT, so stalled
+# clients cannot keep concurrency slots from everyone else.
+#
+#   ASSISTANT_BACKEND      "gemini" (default) or "stub" for offline runs
+#   GEMINI_API_KEY         API key for the gemini backend
+#   GEMINI_MODEL           model name (default gemini-1.5-flash)
+#   ASSISTANT_CONCURRENCY  upstream calls in flight per worker (default 8)
+#   ASSISTANT_TIMEOUT      seconds per upstream attempt (default 30)
+#   ASSISTANT_RETRIES      extra attempts after a failure (default 2)
+#   ASSISTANT_STREAM_BUFFER  chunks buffered per stream before the upstream
+#                            read pauses (default 16)
+#   ASSISTANT_READER_TIMEOUT seconds a stream waits on a full buffer before
+#                            it is aborted (default 10)
+#
+# Answers are cached by prompt version and normalized question (see
+# answer_cache.py). Bump PROMPT_VERSION whenever PROMPT changes. The cache
+# reads SQLite, so it is never touched on the loop thread: lookups run in the
+# request thread and stores in the loop's default executor.
+#
+#   ASSISTANT_PROMPT_VERSION  overrides PROMPT_VERSION (default PROMPT_VERSION)
+#   ASSISTANT_CACHE_PATH      SQLite file for cached answers; empty disables
+#                             the cache (default <instance>/assistant_answers.db)
+#   ASSISTANT_CACHE_SIZE      answers kept in memory per worker (default 5000)
+#   ASSISTANT_CACHE_TTL       seconds an answer stays valid (default 7 days)
+
+PROMPT_VERSION = '1'
+
+_END = object()
+
+PROMPT = """
+        You are an expert in conversation with a patient for any medical help.
+        Example: The patient asks for help diagnosing a disease.
+        If they mention symptoms like cold, suggest possible related diseases.
+        """
+
+
+class AssistantError(Exception):
+    pass
+
+
+class AssistantTimeout(AssistantError):
+    pass
+
+
+class _ReaderStalled(Exception):
+    pass
+
+
+class GeminiBackend:
+    def __init__(self, api_key, model_name='gemini-1.5-flash'):
+        if not api_key:
+            raise ValueError("API Key not found. Set GEMINI_API_KEY in your .env file.")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt, question):
+        response = await self.model.generate_content_async([prompt, question])
+        return response.text
+
+    async def stream(self, prompt, question):
+        response = await self.model.generate_content_async([prompt, question], stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackend:
+    # Local stand-in with configurable latency and failure rate, for
+    # benchmarking the gateway without network access or API spend
+    def __init__(self, latency=0.2, jitter=0.05, failure_rate=0.0, seed=None, chunk_delay=0.0, chunks=20):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.calls = 0
+        self.chunks_sent = 0
+        self._random = random.Random(seed)
+
+    async def generate(self, prompt, question):
+        # Same timing as a streamed answer, delivered all at once
+        self.calls += 1
+        delay = self.latency + self.chunk_delay * (self.chunks - 1)
+        await asyncio.sleep(max(0.0, delay + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.failure_rate:
+            raise AssistantError('stub backend failure')
+        return f'Stub answer to: {question}'
+
+    async def stream(self, prompt, question):
+        # latency is the time to the first chunk; the rest follow every chunk_delay
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        if self._random.random() < self.failure_rate:
+            raise AssistantError('stub backend failure')
+        for i in range(self.chunks):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            self.chunks_sent += 1
+            yield f'Stub answer to: {question} ' if i == 0 else f'part {i} '
+
+
+class InferenceGateway:
+    def __init__(self, backend=None, concurrency=8, timeout=30.0, retries=2, backoff=0.5,
+                 cache=None, prompt_version=PROMPT_VERSION, stream_buffer=16, reader_timeout=10.0):
+        self.backend = backend
+        self.stream_buffer = stream_buffer
+        self.reader_timeout = reader_timeout
+        self.cache = cache
+        self.prompt_version = prompt_version
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._config = {}
+        # Updated from request threads and the loop thread; always via _count()
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'upstream_calls': 0, 'coalesced': 0,
+                      'retries': 0, 'timeouts': 0, 'failures': 0,
+                      'streams': 0, 'streams_cancelled': 0, 'streams_stalled': 0, 'ttfb_ms_total': 0.0}
+
+    def init_app(self, app):
+        self.concurrency = app.config.get('ASSISTANT_CONCURRENCY', self.concurrency)
+        self.timeout = app.config.get('ASSISTANT_TIMEOUT', self.timeout)
+        self.retries = app.config.get('ASSISTANT_RETRIES', self.retries)
+        self.prompt_version = app.config.get('ASSISTANT_PROMPT_VERSION', self.prompt_version)
+        self.stream_buffer = app.config.get('ASSISTANT_STREAM_BUFFER', self.stream_buffer)
+        self.reader_timeout = app.config.get('ASSISTANT_READER_TIMEOUT', self.reader_timeout)
+        if self.cache is None and app.config.get('ASSISTANT_CACHE_PATH'):
+            self.cache = AnswerCache(app.config['ASSISTANT_CACHE_PATH'],
+                                     maxsize=app.config.get('ASSISTANT_CACHE_SIZE', 5000),
+                                     ttl=app.config.get('ASSISTANT_CACHE_TTL', 7 * 24 * 3600))
+        self._config = app.config
+        app.extensions['assistant'] = self
+
+    def _backend(self):
+        # The model client is created on first use, not at import
+        if self.backend is None:
+            config = self._config
+            if config.get('ASSISTANT_BACKEND', 'gemini') == 'stub':
+                self.backend = StubBackend()
+            else:
+                self.backend = GeminiBackend(config.get('GEMINI_API_KEY'), config.get('GEMINI_MODEL', 'gemini-1.5-flash'))
+        return self.backend
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _cached(self, version, question):
+        if self.cache is None or version is None:
+            return None
+        answer = self.cache.get(version, question)
+        if answer is not None:
+            self._count('cache_hits')
+        return answer
+
+    async def _store(self, version, question, answer, latency_ms):
+        if self.cache is not None and version is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.cache.put, version, question, answer, latency_ms)
+
+    def _ensure_loop(self):
+        # Started lazily so pre-fork servers create the loop in each worker
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._semaphore = None
+                self._inflight = {}
+                self._thread = threading.Thread(target=self._loop.run_forever, name='assistant-loop', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    async def _call_upstream(self, prompt, question, version):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        backend = self._backend()
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self._count('upstream_calls')
+                    start = time.perf_counter()
+                    answer = await asyncio.wait_for(backend.generate(prompt, question), self.timeout)
+                await self._store(version, question, answer, (time.perf_counter() - start) * 1000.0)
+                return answer
+            except asyncio.TimeoutError:
+                self._count('timeouts')
+                error = AssistantTimeout(f'Model did not answer within {self.timeout}s')
+            except Exception as e:
+                error = AssistantError(str(e))
+            if attempt >= self.retries:
+                self._count('failures')
+                raise error
+            attempt += 1
+            self._count('retries')
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def ask_async(self, question, prompt=PROMPT):
+        # Cache misses only: ask() has already looked the question up
+        version = self.prompt_version if prompt is PROMPT else None
+        key = (prompt, normalize_question(question))
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count('coalesced')
+        else:
+            task = asyncio.ensure_future(self._call_upstream(prompt, question, version))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller giving up must not cancel the shared call
+        return await asyncio.shield(task)
+
+    def ask(self, question, prompt=PROMPT):
+        self._count('requests')
+        # Only the versioned default prompt is cached; ad-hoc prompts have no version
+        answer = self._cached(self.prompt_version if prompt is PROMPT else None, question)
+        if answer is not None:
+            return answer
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self.ask_async(question, prompt), loop)
+        # Allow every retry to run to completion before giving up on the loop
+        deadline = (self.timeout + self.backoff * 2 ** (self.retries + 1)) * (self.retries + 1)
+        try:
+            return future.result(deadline)
+        except FutureTimeoutError:
+            future.cancel()
+            raise AssistantTimeout(f'Model did not answer within {deadline:.0f}s')
+
+    async def _relay(self, prompt, question, version, queue):
+        # Producer side of stream(): copies upstream chunks into the queue.
+        # Retries are only possible before the first chunk reaches the reader.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        backend = self._backend()
+        parts = []
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    self._count('upstream_calls')
+                    start = time.perf_counter()
+                    chunks = backend.stream(prompt, question)
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            parts.append(chunk)
+                            # Blocks while the reader is behind: backpressure.
+                            # A reader that stops altogether must not hold the
+                            # concurrency slot, so that wait is bounded too.
+                            try:
+                                await asyncio.wait_for(queue.put(chunk), self.reader_timeout)
+                            except asyncio.TimeoutError:
+                                raise _ReaderStalled()
+                    finally:
+                        if hasattr(chunks, 'aclose'):
+                            await chunks.aclose()
+                break
+            except _ReaderStalled:
+                self._count('streams_stalled')
+                # Replace what the reader never took with the error, so a
+                # reader that comes back fails at once instead of waiting
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(AssistantTimeout(f'Stream reader stalled for {self.reader_timeout}s'))
+                return
+            except asyncio.TimeoutError:
+                self._count('timeouts')
+                error = AssistantTimeout(f'Model did not answer within {self.timeout}s')
+            except Exception as e:
+                error = AssistantError(str(e))
+            if parts or attempt >= self.retries:
+                self._count('failures')
+                await queue.put(error)
+                return
+            attempt += 1
+            self._count('retries')
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        await queue.put(_END)
+        await self._store(version, question, ''.join(parts), (time.perf_counter() - start) * 1000.0)
+
+    async def _start_stream(self, prompt, question, version):
+        queue = asyncio.Queue(maxsize=self.stream_buffer)
+        return queue, asyncio.ensure_future(self._relay(prompt, question, version, queue))
+
+    def stream(self, question, prompt=PROMPT):
+        # Yields answer chunks as the model produces them. Errors raised before
+        # the first chunk can still be turned into an HTTP status by the caller.
+        start = time.perf_counter()
+        self._count('requests')
+        self._count('streams')
+        version = self.prompt_version if prompt is PROMPT else None
+        answer = self._cached(version, question)
+        if answer is not None:
+            self._count('ttfb_ms_total', (time.perf_counter() - start) * 1000.0)
+            yield answer
+            return
+        loop = self._ensure_loop()
+        queue, task = asyncio.run_coroutine_threadsafe(self._start_stream(prompt, question, version), loop).result()
+        # Longest gap between two chunks: one attempt per retry plus backoff
+        deadline = (self.timeout + self.backoff * 2 ** (self.retries + 1)) * (self.retries + 1)
+        first, finished = True, False
+        try:
+            while True:
+                future = asyncio.run_coroutine_threadsafe(queue.get(), loop)
+                try:
+                    item = future.result(deadline)
+                except FutureTimeoutError:
+                    future.cancel()
+                    raise AssistantTimeout(f'Model did not answer within {deadline:.0f}s')
+                if item is _END:
+                    finished = True
+                    return
+                if isinstance(item, Exception):
+                    finished = True
+                    raise item
+                if first:
+                    first = False
+                    self._count('ttfb_ms_total', (time.perf_counter() - start) * 1000.0)
+                yield item
+        finally:
+            if not finished:
+                # Reader gave up (client disconnect or error): stop the upstream call
+                self._count('streams_cancelled')
+                loop.call_soon_threadsafe(task.cancel)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        snapshot = {**stats, 'in_flight': len(self._inflight), 'concurrency': self.concurrency,
+                    'prompt_version': self.prompt_version}
+        streams = stats['streams']
+        snapshot['ttfb_ms_total'] = round(stats['ttfb_ms_total'], 1)
+        snapshot['ttfb_ms_avg'] = round(stats['ttfb_ms_total'] / streams, 1) if streams else 0.0
+        if self.cache is not None:
+            snapshot['cache'] = self.cache.stats()
+        return snapshot
+
+
+gateway = InferenceGateway()
@@ -0,0 +1,176 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.exc import DataError, IntegrityError
+from models import db
+from counters import add_patient_flow_counts, add_disease_counts
+from response_cache import response_cache, charts_key
+
+# Write-behind aggregation for chart clicks. Events are merged in memory per
+# (doctor_id, date, time_slot) and (doctor_id, disease_name) and written by a
+# background thread in one transaction when either threshold is reached:
+#
+#   CHART_FLUSH_MAX_EVENTS  events buffered since the last flush (default 500)
+#   CHART_FLUSH_INTERVAL    seconds since the oldest unflushed event (default 2)
+#
+# Readers therefore see chart counts at most CHART_FLUSH_INTERVAL seconds (plus
+# one flush) behind. Each worker process has its own buffer; the upserts are
+# additive, so flushes from several workers combine correctly. The buffer is
+# flushed on interpreter exit; a hard kill loses at most one window of clicks.
+#
+# A failed flush puts the counts back for the next one to retry. When the
+# database rejects the data itself (a value too long for its column, say),
+# the batch is written again key by key and the keys it still rejects are
+# dropped and logged, so one bad key cannot hold back every other doctor's
+# counts. The views validate events first; this is the backstop.
+
+
+class ChartEventBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.max_events = 500
+        self.interval = 2.0
+        self._lock = threading.Lock()
+        self._flows = Counter()
+        self._diseases = Counter()
+        self._pending = 0
+        self._oldest = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._exit_hook = False
+        self.flushes = 0
+        self.dropped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_events = app.config.get('CHART_FLUSH_MAX_EVENTS', self.max_events)
+        self.interval = app.config.get('CHART_FLUSH_INTERVAL', self.interval)
+        app.extensions['chart_buffer'] = self
+        # A later create_app() reuses the buffer after an earlier close()
+        self._stopped = False
+        if not self._exit_hook:
+            atexit.register(self.close)
+            self._exit_hook = True
+
+    def add(self, doctor_id, time_slot, disease_name, day=None):
+        day = day or datetime.now().date()
+        self.merge({(doctor_id, day, time_slot): 1}, {(doctor_id, disease_name): 1}, 1)
+
+    def merge(self, flows, diseases, events):
+        with self._lock:
+            self._flows.update(flows)
+            self._diseases.update(diseases)
+            self._pending += events
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._pending >= self.max_events
+        # The flusher thread starts on first use so it is created after a
+        # pre-fork server has forked its workers
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='chart-buffer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            # Wake when the oldest event falls due, so no event waits longer
+            # than the interval; with nothing buffered, check back after one
+            with self._lock:
+                oldest = self._oldest
+            timeout = self.interval if oldest is None else max(0, oldest + self.interval - time.monotonic())
+            self._wake.wait(timeout)
+            self._wake.clear()
+            with self._lock:
+                due = self._pending >= self.max_events or (
+                    self._oldest is not None and time.monotonic() - self._oldest >= self.interval
+                )
+            if due:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            flows, diseases = self._flows, self._diseases
+            if not flows and not diseases:
+                self._pending, self._oldest = 0, None
+                return 0
+            flushed = self._pending
+            self._flows, self._diseases = Counter(), Counter()
+            self._pending, self._oldest = 0, None
+
+        try:
+            self._write(flows, diseases)
+        except (DataError, IntegrityError) as e:
+            print(f"Error flushing chart events, retrying key by key: {str(e)}")
+            flows, diseases = self._write_each(flows, diseases)
+            if flows or diseases:
+                self._put_back(flows, diseases, flushed)
+                return 0
+        except Exception as e:
+            print(f"Error flushing chart events: {str(e)}")
+            self._put_back(flows, diseases, flushed)
+            return 0
+
+        self.flushes += 1
+        return flushed
+
+    def _write(self, flows, diseases):
+        with self.app.app_context():
+            try:
+                add_patient_flow_counts(flows)
+                add_disease_counts(diseases)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        # Disease counts appear on every day's chart, so today's entry is
+        # stale for any doctor whose diseases changed
+        today = datetime.now().date()
+        stale = {charts_key(doctor_id, day) for doctor_id, day, _ in flows}
+        stale.update(charts_key(doctor_id, today) for doctor_id, _ in diseases)
+        response_cache.invalidate(*stale)
+
+    def _write_each(self, flows, diseases):
+        # Returns the counts to retry: those that failed for another reason
+        retry_flows = Counter({key: n for key, n in flows.items() if not self._write_key(key, n, {key: n}, {})})
+        retry_diseases = Counter({key: n for key, n in diseases.items() if not self._write_key(key, n, {}, {key: n})})
+        return retry_flows, retry_diseases
+
+    def _write_key(self, key, n, flows, diseases):
+        try:
+            self._write(flows, diseases)
+        except (DataError, IntegrityError) as e:
+            self.dropped += n
+            print(f"Dropping chart counts the database rejects, {key}: {n} ({str(e)})")
+        except Exception as e:
+            print(f"Error flushing chart events: {str(e)}")
+            return False
+        return True
+
+    def _put_back(self, flows, diseases, events):
+        with self._lock:
+            self._flows.update(flows)
+            self._diseases.update(diseases)
+            self._pending += events
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+
+chart_buffer = ChartEventBuffer()
@@ -0,0 +1,65 @@
+import os
+from pool_stats import InstrumentedQueuePool
+
+# Database engine settings, read from the environment so each deployment can
+# size its pool to its worker count. Every worker process owns a pool, so the
+# database sees up to workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections;
+# keep that under MySQL's max_connections.
+#
+#   DATABASE_URL        SQLAlchemy URL (default: local MySQL 'healthcare')
+#   DB_POOL_SIZE        connections kept open per worker (default 5)
+#   DB_MAX_OVERFLOW     extra connections allowed under burst (default 10)
+#   DB_POOL_TIMEOUT     seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE     seconds before a connection is replaced; keep below
+#                       MySQL's wait_timeout to avoid stale connections (default 1800)
+#   DB_POOL_PRE_PING    test connections on checkout, 1 or 0 (default 1)
+#   DB_CONNECT_TIMEOUT  seconds to wait when opening a connection (default 10)
+#
+# Read replicas (see routing.py):
+#
+#   DATABASE_REPLICA_URLS      comma-separated replica URLs (default: none)
+#   DB_REPLICA_STICKY_SECONDS  primary-only window after a user's write (default 5)
+
+DEFAULT_DATABASE_URL = 'mysql://root:@localhost/healthcare'
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def env_bool(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url():
+    return os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+
+
+def engine_options(url):
+    if url.startswith('sqlite') and (':memory:' in url or url.rstrip('/') == 'sqlite:'):
+        # In-memory SQLite is a single connection; pool settings do not apply
+        return {}
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_float('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+    }
+    connect_timeout = env_int('DB_CONNECT_TIMEOUT', 10)
+    if url.startswith('mysql'):
+        options['connect_args'] = {'connect_timeout': connect_timeout}
+    elif url.startswith('sqlite'):
+        options['connect_args'] = {'timeout': connect_timeout}
+    return options
+
+
+def replica_binds():
+    urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    return {f'replica_{i}': {'url': url, **engine_options(url)} for i, url in enumerate(urls)}
@@ -0,0 +1,89 @@
+from datetime import datetime
+from sqlalchemy import func
+from models import db, PatientFlow, DiseaseDistribution
+
+# Chart counters are bumped with a single INSERT ... ON DUPLICATE KEY UPDATE
+# (MySQL) or INSERT ... ON CONFLICT DO UPDATE (SQLite/PostgreSQL) per batch,
+# relying on the unique keys from migration 0002. The database applies the
+# increment, so concurrent requests never lose counts.
+#
+# Both functions take {key tuple: increment}; an increment of 0 just makes
+# sure the row exists.
+#
+# chart_event_error() validates a click before it is counted. Under MySQL
+# strict mode a value too long for its column fails the whole batch it is
+# upserted with.
+#
+# upsert() is the shared building block (the vitals rollups use it too):
+# update(new, dialect) returns the SET clause for a conflicting row, where
+# new refers to the values that failed to insert.
+
+TIME_SLOT_LENGTH = PatientFlow.__table__.c.time_slot.type.length
+DISEASE_NAME_LENGTH = DiseaseDistribution.__table__.c.disease_name.type.length
+
+
+def chart_event_error(time_slot, disease_name):
+    if not time_slot or not disease_name:
+        return 'Missing required data'
+    if not isinstance(time_slot, str) or not isinstance(disease_name, str):
+        return 'time_slot and disease_name must be strings'
+    if len(time_slot) > TIME_SLOT_LENGTH:
+        return f'time_slot must be at most {TIME_SLOT_LENGTH} characters'
+    if len(disease_name) > DISEASE_NAME_LENGTH:
+        return f'disease_name must be at most {DISEASE_NAME_LENGTH} characters'
+    return None
+
+
+def upsert(table, key_columns, rows, update):
+    dialect = db.session.get_bind().dialect.name
+
+    # Only the dialect in use is imported; the PostgreSQL one alone costs
+    # tens of milliseconds of worker startup
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update(**update(stmt.inserted, dialect))
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=update(stmt.excluded, dialect))
+    else:
+        raise NotImplementedError(f'Atomic upserts are not supported on {dialect}')
+
+    db.session.execute(stmt, rows)
+
+
+def _upsert(table, key_columns, rows, extra_update=None):
+    count = table.c.patient_count
+
+    def update(new, dialect):
+        return {'patient_count': func.coalesce(count, 0) + new.patient_count, **(extra_update or {})}
+
+    upsert(table, key_columns, rows, update)
+
+
+def add_patient_flow_counts(counts):
+    if not counts:
+        return
+    rows = [
+        {'doctor_id': doctor_id, 'date': day, 'time_slot': time_slot, 'patient_count': n}
+        for (doctor_id, day, time_slot), n in counts.items()
+    ]
+    _upsert(PatientFlow.__table__, ['doctor_id', 'date', 'time_slot'], rows)
+
+
+def add_disease_counts(counts):
+    if not counts:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {'doctor_id': doctor_id, 'disease_name': disease_name, 'patient_count': n, 'last_updated': now}
+        for (doctor_id, disease_name), n in counts.items()
+    ]
+    _upsert(
+        DiseaseDistribution.__table__, ['doctor_id', 'disease_name'], rows,
+        extra_update={'last_updated': now}
+    )
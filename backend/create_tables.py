@@ -1,5 +1,6 @@
-from app import app, db
+from app import create_app, db
+from migrations import upgrade
 
-with app.app_context():
-    db.create_all()
-    print("Database tables created successfully!") 
\ No newline at end of file
+with create_app().app_context():
+    upgrade(db.engine, verbose=True)
+    print("Database tables created successfully!")
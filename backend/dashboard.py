@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, case, and_
+from models import db, Appointment, Prescription
+
+# Dashboard counters are computed with one conditional-aggregate statement per
+# role instead of one COUNT(*) per figure. Every figure is a slice of the same
+# appointment rows, so a single pass over the (doctor_id, appointment_date)
+# range answers all of them; prescriptions ride along as a scalar subquery.
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def doctor_counters(doctor_id, now=None):
+    now = now or datetime.utcnow()
+    today = datetime(now.year, now.month, now.day)
+    tomorrow = today + timedelta(days=1)
+    this_month = today.replace(day=1)
+    this_year = today.replace(month=1, day=1)
+    date = Appointment.appointment_date
+
+    prescriptions = select(func.count(Prescription.id)).where(
+        Prescription.doctor_id == doctor_id
+    ).scalar_subquery()
+
+    row = db.session.execute(
+        select(
+            _count_if(and_(date >= today, date < tomorrow)).label('daily'),
+            _count_if(date >= this_month).label('monthly'),
+            _count_if(date >= this_year).label('yearly'),
+            func.count(Appointment.id).label('total'),
+            func.count(func.distinct(Appointment.patient_id)).label('patients'),
+            prescriptions.label('prescriptions'),
+        ).where(Appointment.doctor_id == doctor_id)
+    ).one()
+
+    # MySQL returns SUM() as Decimal, which jsonify would emit as a string
+    return {
+        "appointments": int(row.daily),
+        "total_appointments": int(row.total),
+        "prescriptions": int(row.prescriptions),
+        "totalPatients": int(row.patients),
+        "visits": {
+            "daily": int(row.daily),
+            "monthly": int(row.monthly),
+            "yearly": int(row.yearly)
+        }
+    }
+
+
+def patient_counters(patient_id, now=None):
+    now = now or datetime.utcnow()
+
+    prescriptions = select(func.count(Prescription.id)).where(
+        Prescription.patient_id == patient_id
+    ).scalar_subquery()
+
+    row = db.session.execute(
+        select(
+            _count_if(Appointment.appointment_date >= now).label('upcoming'),
+            func.count(Appointment.id).label('total'),
+            prescriptions.label('prescriptions'),
+        ).where(Appointment.patient_id == patient_id)
+    ).one()
+
+    return {
+        "appointments": int(row.upcoming),
+        "total_appointments": int(row.total),
+        "prescriptions": int(row.prescriptions)
+    }
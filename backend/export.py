@@ -0,0 +1,189 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime
+from sqlalchemy import select
+from models import Patient, Appointment, Prescription
+
+# Streaming table exports for the nightly analytics and compliance dumps.
+# Rows are read through a server-side cursor (stream_results) in primary key
+# order and encoded chunk by chunk, so memory depends on the chunk size and
+# not on the table size.
+#
+# Resuming: rows go out in id order, so the last id written is the resume
+# point; pass it back as after_id to continue. With gzip each chunk is its
+# own gzip member (a concatenation of members is a valid gzip file), so an
+# interrupted file cut back to the last complete chunk can simply be
+# appended to. Parquet needs pyarrow and can only be resumed into a new file.
+
+# name -> (table, column the date filter applies to)
+EXPORT_TABLES = {
+    'patient': (Patient.__table__, 'created_at'),
+    'appointment': (Appointment.__table__, 'appointment_date'),
+    'prescription': (Prescription.__table__, 'created_at'),
+}
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+DEFAULT_CHUNK_ROWS = 10000
+MAX_CHUNK_ROWS = 100000
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _converters(table):
+    return [_isoformat if column.type.python_type in (datetime, date) else None for column in table.columns]
+
+
+def _encode_rows(rows, converters):
+    return [
+        [convert(value) if convert else value for convert, value in zip(converters, row)]
+        for row in rows
+    ]
+
+
+class CSVEncoder:
+    def __init__(self, table, header=True):
+        self.names = [column.name for column in table.columns]
+        self.converters = _converters(table)
+        self.header = header
+
+    def encode(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        if self.header:
+            writer.writerow(self.names)
+            self.header = False
+        writer.writerows(_encode_rows(rows, self.converters))
+        return buffer.getvalue().encode('utf-8')
+
+    def finish(self):
+        # A header-only file for an empty export
+        return self.encode([]) if self.header else b''
+
+
+class NDJSONEncoder:
+    def __init__(self, table, header=True):
+        self.names = [column.name for column in table.columns]
+        self.converters = _converters(table)
+
+    def encode(self, rows):
+        return ''.join(
+            json.dumps(dict(zip(self.names, row)), ensure_ascii=False) + '\n'
+            for row in _encode_rows(rows, self.converters)
+        ).encode('utf-8')
+
+    def finish(self):
+        return b''
+
+
+class _Sink:
+    # Write-only file for pyarrow that hands its bytes out on drain();
+    # tell() keeps counting so the footer offsets stay right
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+class ParquetEncoder:
+    # One row group per chunk; compress selects gzip inside the file
+    # instead of wrapping it, so the result stays readable by Parquet tools
+    def __init__(self, table, compress=False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError('Parquet export needs pyarrow')
+        types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(),
+                 datetime: pa.timestamp('us'), date: pa.date32()}
+        self.pa = pa
+        self.names = [column.name for column in table.columns]
+        self.schema = pa.schema([(column.name, types.get(column.type.python_type, pa.string()))
+                                 for column in table.columns])
+        self.sink = _Sink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression='gzip' if compress else 'snappy')
+
+    def encode(self, rows):
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(self.names)}
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+        return self.sink.drain()
+
+    def finish(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+def export_table(name):
+    if name not in EXPORT_TABLES:
+        raise ExportError(f'Unknown table {name}; expected one of {", ".join(EXPORT_TABLES)}')
+    return EXPORT_TABLES[name]
+
+
+def export_chunks(engine, name, fmt='csv', since=None, until=None, after_id=None,
+                  chunk_size=DEFAULT_CHUNK_ROWS, compress=False, header=True):
+    # Yields (last id written, rows, bytes) per chunk, then a final entry
+    # with the format's trailer (rows 0). Options are checked before the
+    # first yield, so errors surface as ExportError from this call.
+    table, date_column = export_table(name)
+    if fmt not in FORMATS:
+        raise ExportError(f'Unknown format {fmt}; expected one of {", ".join(FORMATS)}')
+    if not 1 <= chunk_size <= MAX_CHUNK_ROWS:
+        raise ExportError(f'chunk size must be between 1 and {MAX_CHUNK_ROWS}')
+    if fmt == 'parquet':
+        encoder = ParquetEncoder(table, compress=compress)
+        compress = False
+    else:
+        encoder = (CSVEncoder if fmt == 'csv' else NDJSONEncoder)(table, header=header)
+
+    stmt = select(table).order_by(table.c.id)
+    if since is not None:
+        stmt = stmt.where(table.c[date_column] >= since)
+    if until is not None:
+        stmt = stmt.where(table.c[date_column] < until)
+    if after_id is not None:
+        stmt = stmt.where(table.c.id > after_id)
+    return _chunks(engine, stmt, encoder, chunk_size, compress, after_id)
+
+
+def _chunks(engine, stmt, encoder, chunk_size, compress, last_id):
+    def pack(data):
+        return gzip.compress(data, compresslevel=6, mtime=0) if compress and data else data
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        for rows in result.partitions():
+            last_id = rows[-1].id
+            yield last_id, len(rows), pack(encoder.encode(rows))
+    yield last_id, 0, pack(encoder.finish())
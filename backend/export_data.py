@@ -0,0 +1,103 @@
+"""Export the patient, appointment or prescription table for analytics dumps.
+
+    python export_data.py appointment -o appointments.csv
+    python export_data.py appointment --format ndjson --gzip --since 2024-01-01 --until 2025-01-01 -o 2024.ndjson.gz
+    python export_data.py patient --format parquet -o patients.parquet
+    python export_data.py appointment --format ndjson --gzip -o 2024.ndjson.gz --resume
+
+Streams through a server-side cursor, so memory stays flat however many rows
+the table has. After each chunk the output is fsynced and its progress (last
+id, rows, bytes) saved next to it in <output>.progress; --resume cuts the
+output back to the last saved chunk and continues after that id. Parquet
+files cannot be appended to: use --after-id with a new output file instead.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from app import create_app, db
+from export import export_chunks, ExportError, DEFAULT_CHUNK_ROWS
+from pagination import parse_date
+
+
+def _save_progress(path, progress):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('table', help='patient, appointment or prescription')
+    parser.add_argument('-o', '--output', default='-', help="file to write; '-' for stdout")
+    parser.add_argument('--format', default='csv', help='csv, ndjson or parquet')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--since', help='YYYY-MM-DD[ HH:MM], inclusive')
+    parser.add_argument('--until', help='YYYY-MM-DD[ HH:MM], exclusive')
+    parser.add_argument('--after-id', type=int, help='only rows with a larger primary key')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted export to --output')
+    args = parser.parse_args()
+
+    options = {'table': args.table, 'format': args.format, 'gzip': args.gzip,
+               'since': args.since, 'until': args.until}
+    progress_path = args.output + '.progress'
+    after_id, rows, written = args.after_id, 0, 0
+    if args.resume:
+        if args.output == '-' or args.format == 'parquet':
+            parser.error('--resume needs a csv or ndjson --output file')
+        if not os.path.exists(progress_path):
+            parser.error(f'no progress file at {progress_path}')
+        with open(progress_path) as f:
+            progress = json.load(f)
+        if {key: progress.get(key) for key in options} != options:
+            parser.error(f'options differ from the interrupted export: {progress}')
+        if progress.get('complete'):
+            print(f'{args.output} is already complete ({progress["rows"]} rows)', file=sys.stderr)
+            return
+        after_id, rows, written = progress['last_id'], progress['rows'], progress['bytes']
+
+    try:
+        since = parse_date(args.since, 'since') if args.since else None
+        until = parse_date(args.until, 'until') if args.until else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    with create_app().app_context():
+        try:
+            chunks = export_chunks(db.engine, args.table, args.format, since, until, after_id,
+                                   args.chunk_size, args.gzip, header=written == 0)
+        except ExportError as e:
+            parser.error(str(e))
+
+        if args.output == '-':
+            out = sys.stdout.buffer
+        elif args.resume:
+            out = open(args.output, 'r+b')
+            out.truncate(written)
+            out.seek(written)
+        else:
+            out = open(args.output, 'wb')
+        started = time.perf_counter()
+        try:
+            for last_id, count, data in chunks:
+                out.write(data)
+                rows += count
+                written += len(data)
+                if out is not sys.stdout.buffer:
+                    out.flush()
+                    os.fsync(out.fileno())
+                    _save_progress(progress_path, {**options, 'last_id': last_id, 'rows': rows, 'bytes': written,
+                                                   'complete': count == 0})
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        elapsed = time.perf_counter() - started
+        print(f'exported {rows} rows ({written} bytes) in {elapsed:.1f}s, last id {last_id}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
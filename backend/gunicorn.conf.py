@@ -0,0 +1,79 @@
+import os
+import sys
+
+# Production serving profile:
+#
+#   gunicorn -c gunicorn.conf.py 'app:create_app()'
+#
+# Views spend most of their time waiting on MySQL, the model API or the OCR
+# pool, so each worker process serves many requests at once instead of one:
+#
+#   gthread  (default) WEB_THREADS threads per process. Works with every
+#            driver: mysqlclient releases the GIL while it waits on MySQL
+#   gevent   up to WEB_CONNECTIONS greenlets per process. Needs a driver
+#            gevent can patch, i.e. PyMySQL (DATABASE_URL=mysql+pymysql://);
+#            mysqlclient would block the whole worker on every query, so
+#            that combination refuses to start
+#
+#   WEB_WORKER_CLASS  gthread or gevent (default gthread)
+#   WEB_WORKERS       processes (default: one per core; the GIL keeps a
+#                     process on one core, and more only contend for it)
+#   WEB_THREADS       threads per gthread worker (default DB_POOL_SIZE +
+#                     DB_MAX_OVERFLOW, so no thread waits for a connection)
+#   WEB_CONNECTIONS   open client connections per worker (default 1000)
+#   WEB_BIND          address to listen on (default 0.0.0.0:5000)
+#   WEB_BACKLOG       connections queued before accept (default 2048)
+#   WEB_TIMEOUT       seconds before a stuck worker is restarted (default 60)
+#   WEB_KEEPALIVE     seconds an idle keep-alive connection is kept
+#                     (default 75)
+#   WEB_MAX_REQUESTS  requests before a worker is recycled, 0 to never
+#                     (default 0)
+#   WEB_ACCESS_LOG    log every request, 1 or 0 (default 0)
+#
+# Keep-alive outlasts the pauses between a client's requests. With
+# gunicorn's 5 second default, a dashboard polling every few seconds found
+# its connection closed on roughly one request in three and paid for a new
+# one; that, not the thread count, put gthread's p99 behind the dev server,
+# which never closes an idle connection. An idle connection costs a socket
+# in the worker's poller (a greenlet under gevent), not a thread, but it
+# counts against WEB_CONNECTIONS until it closes.
+#
+# The app is not preloaded: create_app() is cheap and connects to nothing,
+# and every worker builds its own pools, threads and caches after the fork.
+# Each worker owns a DB pool (see config.py), so MySQL sees up to
+# WEB_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections. Under gevent
+# that pool, not the worker, limits concurrent DB-bound views: raise
+# DB_POOL_SIZE with WEB_CONNECTIONS if requests queue on pool checkout
+# (db_pool_checkout_wait_seconds on /metrics).
+
+BLOCKING_DRIVERS = ('mysql://', 'mysql+mysqldb://')
+
+
+# Not imported from config.py: that pulls in SQLAlchemy, and gevent has to
+# patch the standard library in each worker before anything else loads it
+def env(name, default, cast=str):
+    return cast(os.environ.get(name, default))
+
+
+worker_class = env('WEB_WORKER_CLASS', 'gthread')
+if worker_class not in ('gthread', 'gevent'):
+    sys.exit(f'WEB_WORKER_CLASS must be gthread or gevent, not {worker_class}')
+
+workers = env('WEB_WORKERS', os.cpu_count() or 1, int)
+threads = env('WEB_THREADS', env('DB_POOL_SIZE', 5, int) + env('DB_MAX_OVERFLOW', 10, int), int)
+worker_connections = env('WEB_CONNECTIONS', 1000, int)
+bind = env('WEB_BIND', '0.0.0.0:5000')
+backlog = env('WEB_BACKLOG', 2048, int)
+timeout = env('WEB_TIMEOUT', 60, int)
+keepalive = env('WEB_KEEPALIVE', 75, int)
+max_requests = env('WEB_MAX_REQUESTS', 0, int)
+max_requests_jitter = max_requests // 10
+accesslog = '-' if env('WEB_ACCESS_LOG', '0').lower() in ('1', 'true', 'yes', 'on') else None
+preload_app = False
+
+if worker_class == 'gevent':
+    urls = [env('DATABASE_URL', 'mysql://')] + env('DATABASE_REPLICA_URLS', '').split(',')
+    blocking = [url for url in urls if url.strip().startswith(BLOCKING_DRIVERS)]
+    if blocking:
+        sys.exit('gevent workers need a driver gevent can patch; use mysql+pymysql:// '
+                 'instead of mysql:// (mysqlclient) in DATABASE_URL and DATABASE_REPLICA_URLS')
@@ -0,0 +1,63 @@
+from collections import namedtuple
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import select
+from models import db, User, Doctor, Patient
+from lru import LRUCache
+
+# Resolves the caller of a @jwt_required view without touching the user table.
+# login signs role, email and username into the token, so those claims are
+# trusted for role checks (a deleted user keeps access until the token
+# expires). The user -> doctor/patient profile id mapping never changes once
+# created, so it is memoized across requests in a bounded LRU with a TTL;
+# within a request both lookups are cached on flask.g.
+#
+#   IDENTITY_CACHE_SIZE  profile ids kept per worker (default 10000)
+#   IDENTITY_CACHE_TTL   seconds before an entry is re-read (default 300)
+
+Identity = namedtuple('Identity', 'user_id role username email')
+
+profile_cache = LRUCache(maxsize=10000, ttl=300)
+
+
+def init_app(app):
+    profile_cache.maxsize = app.config.get('IDENTITY_CACHE_SIZE', profile_cache.maxsize)
+    profile_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', profile_cache.ttl)
+
+
+def current_identity():
+    if 'identity' in g:
+        return g.identity
+    user_id = int(get_jwt_identity())
+    claims = get_jwt()
+    if 'role' in claims:
+        identity = Identity(user_id, claims['role'], claims.get('username'), claims.get('email'))
+    else:
+        # Tokens minted without claims fall back to the database
+        user = db.session.get(User, user_id)
+        identity = Identity(user.id, user.role, user.username, user.email) if user else None
+    g.identity = identity
+    return identity
+
+
+def profile_id(identity):
+    key = (identity.role, identity.user_id)
+    cached = g.setdefault('profile_ids', {})
+    if key in cached:
+        return cached[key]
+    pid = profile_cache.get(key)
+    if pid is None:
+        model = Doctor if identity.role == 'doctor' else Patient
+        pid = db.session.execute(select(model.id).where(model.user_id == identity.user_id)).scalar()
+        # Missing profiles are not cached: they can be created at any moment
+        if pid is not None:
+            profile_cache.set(key, pid)
+    cached[key] = pid
+    return pid
+
+
+def invalidate_profile(user_id):
+    profile_cache.delete(('doctor', int(user_id)))
+    profile_cache.delete(('patient', int(user_id)))
+    if 'profile_ids' in g:
+        g.profile_ids.clear()
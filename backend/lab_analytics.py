@@ -0,0 +1,167 @@
+from collections import namedtuple
+from operator import itemgetter
+import numpy as np
+from lab_reports import TESTS, normal_ranges
+
+# Columnar lab value analysis for doctor panels. Values are held as one set
+# of parallel NumPy arrays per test (patient, value, sex, age band), and
+# classification, z-scores and percentile bands are computed over a whole
+# column at once instead of report by report.
+#
+# Reference ranges depend on sex and age band. normal_ranges (the adult male
+# ranges from the notebook) is the default; RANGE_OVERRIDES refines it. A
+# patient of unknown sex or age is checked against the default.
+#
+# z-scores are relative to the reference interval, read as mean +/- 2 SD, so
+# |z| > 2 is out of range whatever the test's units.
+
+TEST_NAMES = [test for test, _, _ in TESTS]
+TEST_INDEX = {test: i for i, test in enumerate(TEST_NAMES)}
+
+SEX_UNKNOWN, MALE, FEMALE = 0, 1, 2
+SEXES = {'male': MALE, 'm': MALE, 'female': FEMALE, 'f': FEMALE}
+
+# Age band upper bounds: <13 child, 13-17 teen, 18-64 adult, 65+ senior
+AGE_LIMITS = np.array([13, 18, 65])
+CHILD, TEEN, ADULT, SENIOR = range(4)
+ADULT_AGE = 30
+GROWN = (ADULT, SENIOR)
+
+RANGE_OVERRIDES = [
+    # test, sex (None: any), age bands, (low, high)
+    ("Hemoglobin (g/dL)", FEMALE, GROWN, (12.0, 15.5)),
+    ("Hemoglobin (g/dL)", None, (CHILD,), (11.0, 13.5)),
+    ("Hemoglobin (g/dL)", None, (TEEN,), (12.0, 16.0)),
+    ("WBC (cells/mm³)", None, (CHILD,), (5000, 13000)),
+    ("RBC (million cells/mcL)", FEMALE, GROWN, (4.2, 5.4)),
+    ("RBC (million cells/mcL)", None, (CHILD, TEEN), (4.0, 5.5)),
+]
+
+PERCENTILES = [5, 25, 50, 75, 95]
+BAND_LABELS = ['<p5', 'p5-p25', 'p25-p50', 'p50-p75', 'p75-p95', '>p95']
+STATUS_LABELS = {-1: 'low', 0: 'normal', 1: 'high'}
+
+
+def _range_tables():
+    # LOW/HIGH[test, sex, age band], so a column's ranges are one fancy-index lookup
+    shape = (len(TEST_NAMES), 3, len(AGE_LIMITS) + 1)
+    low, high = np.empty(shape), np.empty(shape)
+    for test, index in TEST_INDEX.items():
+        low[index], high[index] = normal_ranges[test]
+    for test, sex, bands, (lo, hi) in RANGE_OVERRIDES:
+        sexes = [sex] if sex is not None else [SEX_UNKNOWN, MALE, FEMALE]
+        for s in sexes:
+            for band in bands:
+                low[TEST_INDEX[test], s, band] = lo
+                high[TEST_INDEX[test], s, band] = hi
+    # Unknown sex keeps the default adult range at every age
+    low[:, SEX_UNKNOWN, :] = low[:, MALE, ADULT][:, None]
+    high[:, SEX_UNKNOWN, :] = high[:, MALE, ADULT][:, None]
+    return low, high
+
+
+LOW, HIGH = _range_tables()
+
+Column = namedtuple('Column', 'patient_id value sex band')
+
+
+def _codes(items, lookup, dtype):
+    # Few distinct strings, many rows: translate each distinct value once
+    table = {item: lookup(item) for item in set(items)}
+    return np.array(list(map(table.__getitem__, items)), dtype=dtype)
+
+
+def sex_codes(genders):
+    return _codes(genders, lambda g: SEXES.get((g or '').strip().lower(), SEX_UNKNOWN), np.int8)
+
+
+def age_bands(ages):
+    # None becomes NaN; unknown age counts as adult
+    ages = np.array(ages, dtype=np.float64)
+    ages[np.isnan(ages)] = ADULT_AGE
+    return np.searchsorted(AGE_LIMITS, ages, side='right').astype(np.int8)
+
+
+def build_columns(rows):
+    # rows: (patient_id, test, value, gender, age) tuples, oldest first, as
+    # the panel query returns them. Returns {test: Column}; unknown test
+    # names are dropped. Columns are pulled out with itemgetter: zip(*rows)
+    # builds one huge argument tuple and is several times slower.
+    patient_ids, tests, values, genders, ages = (list(map(itemgetter(i), rows)) for i in range(5))
+    codes = _codes(tests, lambda t: TEST_INDEX.get(t, -1), np.int16)
+    patient_ids = np.array(patient_ids, dtype=np.int64)
+    values = np.array(values, dtype=np.float64)
+    sexes, bands = sex_codes(genders), age_bands(ages)
+    # Stable sort keeps each test's values in their original (time) order
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(TEST_NAMES) + 1))
+    columns = {}
+    for index, test in enumerate(TEST_NAMES):
+        rows = order[bounds[index]:bounds[index + 1]]
+        if len(rows):
+            columns[test] = Column(patient_ids[rows], values[rows], sexes[rows], bands[rows])
+    return columns
+
+
+def latest(column):
+    # Last (most recent) value per patient
+    reversed_ids = column.patient_id[::-1]
+    _, first = np.unique(reversed_ids, return_index=True)
+    keep = len(reversed_ids) - 1 - first
+    return Column(*(array[keep] for array in column))
+
+
+def analyze_column(test, column):
+    index = TEST_INDEX[test]
+    low = LOW[index, column.sex, column.band]
+    high = HIGH[index, column.sex, column.band]
+    values = column.value
+    status = (values > high).astype(np.int8) - (values < low)
+    z = (values - (low + high) / 2) / ((high - low) / 4)
+    cutpoints = np.percentile(values, PERCENTILES)
+    bands = np.searchsorted(cutpoints, values, side='right')
+    return status, z, cutpoints, bands
+
+
+def panel_report(columns, flagged_limit=50):
+    # Latest value per patient per test, summarised per test, plus the
+    # patients with the largest out-of-range deviations
+    tests, analyzed = {}, {}
+    flagged_ids, flagged_z = [], []
+    for test, column in columns.items():
+        column = latest(column)
+        status, z, cutpoints, bands = analyze_column(test, column)
+        analyzed[test] = (column, status, z, bands)
+        counts = np.bincount(status + 1, minlength=3)
+        tests[test] = {
+            'patients': int(len(column.value)),
+            'low': int(counts[0]),
+            'normal': int(counts[1]),
+            'high': int(counts[2]),
+            'mean': round(float(column.value.mean()), 2),
+            'percentiles': {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, cutpoints)},
+        }
+        out = status != 0
+        flagged_ids.append(column.patient_id[out])
+        flagged_z.append(np.abs(z[out]))
+
+    if not flagged_ids:
+        return {'tests': tests, 'flagged': [], 'flagged_total': 0}
+    # Rank patients by their largest |z|, then detail only the top ones
+    patients, inverse = np.unique(np.concatenate(flagged_ids), return_inverse=True)
+    max_z = np.zeros(len(patients))
+    np.maximum.at(max_z, inverse, np.concatenate(flagged_z))
+    top = np.argsort(-max_z, kind='stable')[:flagged_limit]
+    flagged = [{'patient_id': int(patients[i]), 'max_abs_z': round(float(max_z[i]), 2), 'results': {}} for i in top]
+    wanted = patients[top]
+    positions = {int(pid): n for n, pid in enumerate(wanted)}
+    for test, (column, status, z, bands) in analyzed.items():
+        rows = np.flatnonzero((status != 0) & np.isin(column.patient_id, wanted))
+        for i in rows:
+            flagged[positions[int(column.patient_id[i])]]['results'][test] = {
+                'value': float(column.value[i]),
+                'status': STATUS_LABELS[int(status[i])],
+                'z': round(float(z[i]), 2),
+                'band': BAND_LABELS[int(bands[i])]
+            }
+    return {'tests': tests, 'flagged': flagged, 'flagged_total': int(len(patients))}
@@ -0,0 +1,228 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from assistant import gateway, AssistantError
+from report_cache import ReportCache, content_hash
+
+# Lab report extraction, moved out of Image.ipynb: image -> grayscale ->
+# Tesseract OCR -> blood test values -> comparison with normal ranges.
+#
+# OCR is CPU bound, and decoding plus pytesseract's image conversion run in
+# Python, so batches run in a process pool sized to the cores instead of in
+# the web worker. Each worker pins Tesseract to one OpenMP thread; the pool
+# provides the parallelism, and letting every Tesseract spawn a thread per
+# core would oversubscribe the machine.
+#
+#   LAB_OCR_WORKERS  OCR processes per web worker (default: CPU count)
+#   TESSERACT_CMD    path to the tesseract binary (default: found on PATH)
+#
+# Results are cached by content hash (see report_cache.py), so a re-uploaded
+# scan skips both OCR and the summary call.
+#
+#   LAB_REPORT_CACHE_PATH    SQLite file for cached results; empty disables
+#                            the cache (default <instance>/lab_reports.db)
+#   LAB_REPORT_CACHE_MAX_MB  stored text kept before LRU eviction (default 256)
+#
+# opencv-python-headless and pytesseract are imported lazily, inside the
+# worker processes, so the rest of the API runs without them.
+#
+# Pool processes come from a forkserver, not a fork of the web worker: by the
+# time the first upload arrives, the worker runs request threads, the
+# assistant event loop and the chart flusher, and a forked child could inherit
+# a lock one of them held and block on it forever. The same holds under
+# gevent workers, where those threads are greenlets on patched locks;
+# perf/check_lab_pool.py runs a batch through the pool both ways. Like
+# spawn, the forkserver imports the main module again in every pool process,
+# so a script that uploads reports needs the if __name__ == '__main__' guard.
+
+# forkserver where the platform has it (Linux, macOS), else spawn; never fork
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Bump when decoding, OCR settings or extraction change: cached results
+# from older versions are then ignored
+OCR_VERSION = '1'
+
+# Bump with any change to SUMMARY_PROMPT; the model name is added at runtime
+SUMMARY_VERSION = '1'
+SUMMARY_PROMPT = "Summarize this medical report pointwise in 500 words:"
+
+# Normal ranges for common blood test parameters
+normal_ranges = {
+    "Hemoglobin (g/dL)": (13.0, 17.0),  # Example range for males
+    "WBC (cells/mm³)": (4000, 11000),
+    "Platelets (cells/mm³)": (150000, 450000),
+    "RBC (million cells/mcL)": (4.7, 6.1),
+    "Glucose (mg/dL)": (70, 140),  # Fasting <100, after meal <140
+}
+
+# (test, label in the report, number pattern)
+TESTS = [
+    ("Hemoglobin (g/dL)", "Hemoglobin", r"[\d.]+"),
+    ("WBC (cells/mm³)", "WBC", r"[\d,]+"),
+    ("Platelets (cells/mm³)", "Platelets", r"[\d,]+"),
+    ("RBC (million cells/mcL)", "RBC", r"[\d.]+"),
+    ("Glucose (mg/dL)", "Glucose", r"[\d.]+"),
+]
+
+# Compiled once at import. One search per test beats a single combined
+# alternation here: each pattern starts with a literal, which the regex
+# engine finds with a fast substring scan, while an alternation is tried
+# position by position (see perf/bench_lab_reports.py).
+_PATTERNS = [(test, re.compile(rf"{label}:\s*({number})")) for test, label, number in TESTS]
+
+
+def extract_values(text):
+    extracted_data = {}
+    for test, pattern in _PATTERNS:
+        match = pattern.search(text)
+        if match:
+            try:
+                extracted_data[test] = float(match.group(1).replace(",", ""))
+            except ValueError:
+                # OCR noise such as "14.2." or a lone ","
+                pass
+    return extracted_data
+
+
+def analyze_report(extracted_data):
+    health_analysis = {}
+
+    for test, value in extracted_data.items():
+        min_val, max_val = normal_ranges.get(test, (None, None))
+
+        if min_val is not None and max_val is not None:
+            if min_val <= value <= max_val:
+                health_analysis[test] = f"✅ Normal ({value})"
+            elif value < min_val:
+                health_analysis[test] = f"⚠️ Low ({value}) - May indicate anemia or infection"
+            else:
+                health_analysis[test] = f"⚠️ High ({value}) - Could indicate inflammation, diabetes, or infection"
+
+    return health_analysis
+
+
+# Set in each pool process by _init_worker
+_tesseract_cmd = None
+
+
+def ocr_image(data):
+    import cv2
+    import numpy as np
+    import pytesseract
+
+    if _tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = _tesseract_cmd
+
+    # Decoding straight to grayscale skips the separate cvtColor pass
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Image not found or failed to load")
+    return pytesseract.image_to_string(gray)
+
+
+def report_result(name, text, values):
+    return {'file': name, 'text': text, 'values': values, 'analysis': analyze_report(values)}
+
+
+def process_report(name, data):
+    # Runs in a pool worker; errors are reported per file, never raised
+    try:
+        text = ocr_image(data)
+        return report_result(name, text, extract_values(text))
+    except Exception as e:
+        return {'file': name, 'error': str(e)}
+
+
+def _init_worker(tesseract_cmd):
+    global _tesseract_cmd
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    _tesseract_cmd = tesseract_cmd
+
+
+class ReportPool:
+    def __init__(self, workers=None, tesseract_cmd=None, cache=None, summary_version=SUMMARY_VERSION):
+        self.workers = workers
+        self.tesseract_cmd = tesseract_cmd
+        self.cache = cache
+        self.summary_version = summary_version
+        self._executor = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.workers = app.config.get('LAB_OCR_WORKERS') or self.workers
+        self.tesseract_cmd = app.config.get('TESSERACT_CMD') or self.tesseract_cmd
+        self.summary_version = f"{SUMMARY_VERSION}:{app.config.get('GEMINI_MODEL', '')}"
+        if self.cache is None and app.config.get('LAB_REPORT_CACHE_PATH'):
+            self.cache = ReportCache(app.config['LAB_REPORT_CACHE_PATH'],
+                                     max_bytes=app.config.get('LAB_REPORT_CACHE_MAX_MB', 256) * 1024 * 1024)
+        app.extensions['lab_reports'] = self
+
+    def _pool(self):
+        # Created on first use, and again after a fork, so pre-fork servers get
+        # one pool per web worker instead of sharing the parent's. The
+        # processes start from a forkserver (see the top of this file).
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers or os.cpu_count(),
+                                                 mp_context=multiprocessing.get_context(START_METHOD),
+                                                 initializer=_init_worker, initargs=(self.tesseract_cmd,))
+            self._pid = os.getpid()
+        return self._executor
+
+    def _summarize(self, result, digest, summary):
+        if summary is None and result['text'].strip():
+            try:
+                summary = gateway.ask(result['text'], prompt=SUMMARY_PROMPT)
+            except AssistantError as e:
+                result['summary_error'] = str(e)
+                return result
+            if self.cache is not None:
+                self.cache.put_summary(digest, OCR_VERSION, summary, self.summary_version)
+        result['summary'] = summary
+        return result
+
+    def process(self, files, summarize=False):
+        # files: [(name, bytes)]. Yields (index, result) as each report
+        # finishes, so callers can stream results in completion order.
+        # Cached reports come first; identical files in one batch share an
+        # OCR run.
+        pending = {}
+        for index, (name, data) in enumerate(files):
+            digest = content_hash(data)
+            cached = self.cache.get(digest, OCR_VERSION, self.summary_version) if self.cache is not None else None
+            if cached is None:
+                pending.setdefault(digest, []).append(index)
+                continue
+            result = {**report_result(name, cached['text'], cached['values']), 'cached': True}
+            yield index, self._summarize(result, digest, cached['summary']) if summarize else result
+        if not pending:
+            return
+
+        pool = self._pool()
+        futures = {pool.submit(process_report, *files[indexes[0]]): digest for digest, indexes in pending.items()}
+        try:
+            for future in as_completed(futures):
+                digest = futures[future]
+                result = future.result()
+                if 'error' not in result and self.cache is not None:
+                    self.cache.put(digest, OCR_VERSION, result['text'], result['values'])
+                summary = None
+                for index in pending[digest]:
+                    copy = {**result, 'file': files[index][0]}
+                    if summarize and 'error' not in result:
+                        # Summarized once per digest, then reused for duplicates
+                        copy = self._summarize(copy, digest, summary)
+                        summary = copy.get('summary')
+                    yield index, copy
+        finally:
+            # Reader went away: drop reports that have not started yet
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+report_pool = ReportPool()
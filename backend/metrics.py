@@ -0,0 +1,205 @@
+import bisect
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from pool_stats import WAIT_BUCKETS_MS, InstrumentedQueuePool
+
+# Per-request instrumentation: wall time, number of SQL statements, total DB
+# time and the slowest statement of every request, kept as per-endpoint
+# histograms and served in the Prometheus text format on /metrics. Endpoints
+# are labelled by their URL rule, so the label set stays bounded.
+#
+#   METRICS_ENABLED         record request metrics, 1 or 0 (default 1)
+#   SLOW_QUERY_MS           a request whose slowest statement takes longer
+#                           counts as slow (default 200)
+#   SLOW_QUERY_SAMPLE_RATE  fraction of slow requests whose statement is kept
+#                           in the slow query log (default 0.1); all are counted
+#   SLOW_QUERY_LOG_SIZE     slow query log entries kept (default 200)
+#
+# The cost per statement is two perf_counter calls and a few attribute
+# updates; nothing is formatted until /metrics is scraped. Statements are
+# logged without their parameters, which may hold patient data. Metrics are
+# per worker process: with several workers each scrape sees one of them.
+
+REQUEST_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+STATEMENT_BUCKETS = [0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89]
+DB_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+_local = threading.local()
+
+
+class Histogram:
+    # Not locked; RequestMetrics serializes updates
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestStats:
+    # SQL activity of the request running on this thread
+    __slots__ = ('started', 'statements', 'db_time', 'slowest', 'slowest_sql')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+
+
+class RequestMetrics:
+    def __init__(self, app=None, db=None):
+        self.enabled = True
+        self.slow_query_ms = 200.0
+        self.sample_rate = 0.1
+        self.slow_queries = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._requests = {}
+        self._slow = {}
+        self._engines = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.enabled = app.config.get('METRICS_ENABLED', self.enabled)
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self.sample_rate = app.config.get('SLOW_QUERY_SAMPLE_RATE', self.sample_rate)
+        self.slow_queries = deque(maxlen=app.config.get('SLOW_QUERY_LOG_SIZE', self.slow_queries.maxlen))
+        with app.app_context():
+            replicas = app.extensions.get('db_replicas', [])
+            self._engines = [('primary', db.engine)] + [(f'replica_{i}', e) for i, e in enumerate(replicas)]
+        app.extensions['request_metrics'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _before_request(self):
+        _local.stats = RequestStats() if self.enabled else None
+
+    def _after_request(self, response):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            return response
+        _local.stats = None
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        key = (endpoint, request.method)
+        with self._lock:
+            histograms = self._endpoints.get(key)
+            if histograms is None:
+                histograms = self._endpoints[key] = (
+                    Histogram(REQUEST_BUCKETS), Histogram(STATEMENT_BUCKETS),
+                    Histogram(DB_BUCKETS), Histogram(DB_BUCKETS),
+                )
+            histograms[0].observe(elapsed)
+            histograms[1].observe(stats.statements)
+            histograms[2].observe(stats.db_time)
+            histograms[3].observe(stats.slowest)
+            status = key + (response.status_code,)
+            self._requests[status] = self._requests.get(status, 0) + 1
+        if stats.slowest_sql is not None and stats.slowest * 1000.0 >= self.slow_query_ms:
+            self._slow_query(endpoint, request.method, stats)
+        return response
+
+    def _slow_query(self, endpoint, method, stats):
+        with self._lock:
+            self._slow[endpoint] = self._slow.get(endpoint, 0) + 1
+        if random.random() < self.sample_rate:
+            self.slow_queries.append({
+                'at': datetime.utcnow().isoformat(timespec='seconds'),
+                'endpoint': endpoint,
+                'method': method,
+                'ms': round(stats.slowest * 1000.0, 2),
+                'statements': stats.statements,
+                'statement': ' '.join(stats.slowest_sql.split())[:1000],
+            })
+
+    def render(self):
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = []
+            for name, kind, help_text, index in (
+                ('http_request_duration_seconds', 'histogram', 'Request wall time', 0),
+                ('db_statements_per_request', 'histogram', 'SQL statements issued per request', 1),
+                ('db_time_per_request_seconds', 'histogram', 'Time spent in SQL per request', 2),
+                ('db_slowest_statement_seconds', 'histogram', 'Slowest SQL statement of each request', 3),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for (endpoint, method), histograms in endpoints:
+                    lines.extend(histograms[index].lines(name, _labels(endpoint=endpoint, method=method)))
+            lines += ['# HELP http_requests_total Requests by endpoint and status', '# TYPE http_requests_total counter']
+            lines += [f'http_requests_total{{{_labels(endpoint=e, method=m, status=s)}}} {n}'
+                      for (e, m, s), n in sorted(self._requests.items())]
+            lines += [f'# HELP db_slow_requests_total Requests whose slowest statement took over {self.slow_query_ms}ms',
+                      '# TYPE db_slow_requests_total counter']
+            lines += [f'db_slow_requests_total{{{_labels(endpoint=e)}}} {n}' for e, n in sorted(self._slow.items())]
+        lines += list(self._pool_lines())
+        return '\n'.join(lines) + '\n'
+
+    def _pool_lines(self):
+        name = 'db_pool_checkout_wait_seconds'
+        yield f'# HELP {name} Time spent waiting for a pooled connection'
+        yield f'# TYPE {name} histogram'
+        for engine_name, engine in self._engines:
+            pool = engine.pool
+            if not isinstance(pool, InstrumentedQueuePool):
+                continue
+            snapshot = pool.wait_histogram.snapshot()
+            labels = _labels(engine=engine_name)
+            for bound in WAIT_BUCKETS_MS + ['+Inf']:
+                le = bound if bound == '+Inf' else bound / 1000.0
+                yield f'{name}_bucket{{{labels},le="{le}"}} {snapshot["wait_ms_buckets"][str(bound)]}'
+            yield f'{name}_sum{{{labels}}} {snapshot["wait_ms_total"] / 1000.0:.6f}'
+            yield f'{name}_count{{{labels}}} {snapshot["checkouts"]}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_local, 'stats', None) is not None:
+        conn.info['metrics_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = getattr(_local, 'stats', None)
+    started = conn.info.pop('metrics_started', None)
+    if stats is None or started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.statements += 1
+    stats.db_time += elapsed
+    if elapsed > stats.slowest:
+        stats.slowest = elapsed
+        stats.slowest_sql = statement
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,51 @@
+import importlib
+import os
+import pkgutil
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, String, DateTime, select
+
+# Minimal versioned migrations. Each module in versions/ is named
+# NNNN_description.py and exposes upgrade(conn); applied versions are recorded
+# in schema_migrations so every step runs exactly once per database.
+
+VERSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'versions')
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', String(64), primary_key=True),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def available():
+    names = sorted(
+        info.name for info in pkgutil.iter_modules([VERSIONS_DIR])
+        if info.name[:4].isdigit()
+    )
+    return [(name, importlib.import_module(f'{__name__}.versions.{name}')) for name in names]
+
+
+def applied(engine):
+    _metadata.create_all(engine)
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def pending(engine):
+    done = applied(engine)
+    return [(name, module) for name, module in available() if name not in done]
+
+
+def upgrade(engine, verbose=False):
+    ran = []
+    for name, module in pending(engine):
+        # MySQL commits DDL implicitly, so a failed step can leave partial
+        # changes behind; steps are written to be safe to re-run
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(version=name, applied_at=datetime.utcnow()))
+        if verbose:
+            print(f'Applied {name}')
+        ran.append(name)
+    return ran
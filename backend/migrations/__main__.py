@@ -0,0 +1,18 @@
+import sys
+from app import create_app, db
+from migrations import available, applied, upgrade
+
+# Usage (from backend/): python -m migrations [upgrade|status]
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    with create_app().app_context():
+        if command == 'upgrade':
+            ran = upgrade(db.engine, verbose=True)
+            print(f'{len(ran)} migration(s) applied' if ran else 'Database is up to date')
+        elif command == 'status':
+            done = applied(db.engine)
+            for name, module in available():
+                print(f"[{'x' if name in done else ' '}] {name}")
+        else:
+            sys.exit(f'Unknown command: {command}')
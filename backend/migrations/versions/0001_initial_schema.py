@@ -0,0 +1,98 @@
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, Text, Float, Date, DateTime, ForeignKey
+)
+
+# Snapshot of the schema previously produced by db.create_all(). Tables are
+# created with checkfirst, so databases built that way are adopted as-is.
+
+metadata = MetaData()
+
+Table(
+    'user', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password', String(120), nullable=False),
+    Column('role', String(20), nullable=False),
+    Column('created_at', DateTime),
+)
+
+Table(
+    'doctor', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False, unique=True),
+    Column('specialization', String(100)),
+    Column('qualification', String(200)),
+    Column('experience_years', Integer),
+    Column('consultation_fee', Float),
+    Column('available_days', String(200)),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+
+Table(
+    'patient', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False, unique=True),
+    Column('age', Integer),
+    Column('gender', String(20)),
+    Column('blood_group', String(10)),
+    Column('weight', Float),
+    Column('height', Float),
+    Column('medical_history', Text),
+    Column('allergies', Text),
+    Column('emergency_contact', String(100)),
+    Column('address', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+
+Table(
+    'appointment', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_id', Integer, ForeignKey('patient.id'), nullable=False),
+    Column('doctor_id', Integer, ForeignKey('doctor.id'), nullable=False),
+    Column('appointment_date', DateTime, nullable=False),
+    Column('status', String(20)),
+    Column('symptoms', Text),
+    Column('diagnosis', Text),
+    Column('notes', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+
+Table(
+    'prescription', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('appointment_id', Integer, ForeignKey('appointment.id')),
+    Column('patient_id', Integer, ForeignKey('patient.id'), nullable=False),
+    Column('doctor_id', Integer, ForeignKey('doctor.id'), nullable=False),
+    Column('medications', Text),
+    Column('dosage_instructions', Text),
+    Column('duration', String(100)),
+    Column('additional_notes', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+
+Table(
+    'patient_flow', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('doctor_id', Integer, ForeignKey('doctor.id'), nullable=False),
+    Column('time_slot', String(10), nullable=False),
+    Column('patient_count', Integer),
+    Column('date', Date, nullable=False),
+)
+
+Table(
+    'disease_distribution', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('doctor_id', Integer, ForeignKey('doctor.id'), nullable=False),
+    Column('disease_name', String(100), nullable=False),
+    Column('patient_count', Integer),
+    Column('last_updated', DateTime),
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,44 @@
+from sqlalchemy import MetaData, Table, Index, inspect, select, update, delete, func
+
+# Composite indexes for the filters every hot endpoint uses, plus the unique
+# keys the chart counters rely on (one row per doctor/day/slot and per
+# doctor/disease). Duplicate counter rows left by the old read-modify-write
+# path are merged into the lowest id first so the unique indexes can be built.
+
+INDEXES = [
+    ('appointment', 'ix_appointment_doctor_date', ['doctor_id', 'appointment_date'], False),
+    ('appointment', 'ix_appointment_patient_date', ['patient_id', 'appointment_date'], False),
+    ('prescription', 'ix_prescription_doctor', ['doctor_id'], False),
+    ('prescription', 'ix_prescription_patient', ['patient_id'], False),
+    ('patient_flow', 'uq_patient_flow_doctor_date_slot', ['doctor_id', 'date', 'time_slot'], True),
+    ('disease_distribution', 'uq_disease_distribution_doctor_disease', ['doctor_id', 'disease_name'], True),
+]
+
+
+def _merge_duplicates(conn, table, key_columns):
+    keys = [table.c[name] for name in key_columns]
+    groups = conn.execute(
+        select(*keys, func.min(table.c.id), func.sum(table.c.patient_count))
+        .group_by(*keys)
+        .having(func.count() > 1)
+    ).all()
+    for row in groups:
+        match = [column == value for column, value in zip(keys, row[:len(keys)])]
+        keep_id, total = row[len(keys)], row[len(keys) + 1]
+        conn.execute(update(table).where(table.c.id == keep_id).values(patient_count=total))
+        conn.execute(delete(table).where(*match, table.c.id != keep_id))
+
+
+def upgrade(conn):
+    metadata = MetaData()
+    tables = {name: Table(name, metadata, autoload_with=conn) for name in {spec[0] for spec in INDEXES}}
+
+    _merge_duplicates(conn, tables['patient_flow'], ['doctor_id', 'date', 'time_slot'])
+    _merge_duplicates(conn, tables['disease_distribution'], ['doctor_id', 'disease_name'])
+
+    inspector = inspect(conn)
+    for table_name, index_name, columns, unique in INDEXES:
+        existing = {index['name'] for index in inspector.get_indexes(table_name)}
+        if index_name not in existing:
+            table = tables[table_name]
+            Index(index_name, *[table.c[name] for name in columns], unique=unique).create(conn)
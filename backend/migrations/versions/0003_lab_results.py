@@ -0,0 +1,23 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, DateTime, ForeignKey, Index
+
+# Lab values parsed from uploaded reports, one row per test per report, for
+# panel analytics (see lab_analytics.py). The index serves "latest value per
+# patient and test" and per-patient history.
+
+metadata = MetaData()
+
+Table('patient', metadata, Column('id', Integer, primary_key=True))
+
+lab_result = Table(
+    'lab_result', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('patient_id', Integer, ForeignKey('patient.id'), nullable=False),
+    Column('test', String(40), nullable=False),
+    Column('value', Float, nullable=False),
+    Column('recorded_at', DateTime, nullable=False),
+    Index('ix_lab_result_patient_test_recorded', 'patient_id', 'test', 'recorded_at'),
+)
+
+
+def upgrade(conn):
+    lab_result.create(conn, checkfirst=True)
@@ -0,0 +1,57 @@
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, BigInteger, SmallInteger, Float, DateTime, ForeignKey, Index,
+    inspect, text
+)
+
+# Vitals readings with blood pressure split into systolic/diastolic, plus
+# hourly and daily rollups keyed by (patient, metric, bucket).
+#
+# schema.sql used to define a patient_vitals table with a free-text
+# blood_pressure column. The app never had a model for it, so it can hold no
+# rows written by the API; if present it is renamed to patient_vitals_legacy
+# and left alone.
+
+metadata = MetaData()
+
+Table('patient', metadata, Column('id', Integer, primary_key=True))
+
+patient_vitals = Table(
+    'patient_vitals', metadata,
+    Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True),
+    Column('patient_id', Integer, ForeignKey('patient.id'), nullable=False),
+    Column('recorded_at', DateTime, nullable=False),
+    Column('systolic', SmallInteger),
+    Column('diastolic', SmallInteger),
+    Column('heart_rate', SmallInteger),
+    Column('temperature', Float),
+    Column('respiratory_rate', SmallInteger),
+    Column('blood_sugar', SmallInteger),
+    Index('ix_patient_vitals_patient_recorded', 'patient_id', 'recorded_at'),
+)
+
+
+def _rollup(name):
+    return Table(
+        name, metadata,
+        Column('patient_id', Integer, ForeignKey('patient.id'), primary_key=True),
+        Column('metric', SmallInteger, primary_key=True, autoincrement=False),
+        Column('bucket', DateTime, primary_key=True),
+        Column('n', Integer, nullable=False),
+        Column('total', Float, nullable=False),
+        Column('min_value', Float, nullable=False),
+        Column('max_value', Float, nullable=False),
+    )
+
+
+vitals_hourly = _rollup('vitals_hourly')
+vitals_daily = _rollup('vitals_daily')
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    if inspector.has_table('patient_vitals'):
+        columns = {column['name'] for column in inspector.get_columns('patient_vitals')}
+        if 'systolic' not in columns:
+            conn.execute(text('ALTER TABLE patient_vitals RENAME TO patient_vitals_legacy'))
+    for table in (patient_vitals, vitals_hourly, vitals_daily):
+        table.create(conn, checkfirst=True)
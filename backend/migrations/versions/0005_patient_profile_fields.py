@@ -0,0 +1,25 @@
+from sqlalchemy import String, Text, inspect, text
+
+# Profile fields the patient form has always sent (and schema.sql always
+# defined) but the patient table never stored. Columns already present are
+# skipped, so the step is safe to re-run.
+
+COLUMNS = [
+    ('chronic_diseases', Text()),
+    ('current_medications', Text()),
+    ('family_history', Text()),
+    ('lifestyle_habits', Text()),
+    ('emergency_contact_relation', String(50)),
+    ('occupation', String(100)),
+    ('marital_status', String(20)),
+]
+
+
+def upgrade(conn):
+    existing = {column['name'] for column in inspect(conn).get_columns('patient')}
+    quote = conn.dialect.identifier_preparer.quote
+    for name, type_ in COLUMNS:
+        if name not in existing:
+            conn.execute(text(
+                f'ALTER TABLE {quote("patient")} ADD COLUMN {quote(name)} {type_.compile(dialect=conn.dialect)}'
+            ))
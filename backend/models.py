@@ -0,0 +1,175 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Database Models
+# Schema changes go through migrations/ (python -m migrations upgrade); keep
+# index and constraint names here in sync with the migration that adds them.
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(120), nullable=False)
+    role = db.Column(db.String(20), nullable=False, default='patient')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Doctor(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    specialization = db.Column(db.String(100))
+    qualification = db.Column(db.String(200))
+    experience_years = db.Column(db.Integer)
+    consultation_fee = db.Column(db.Float)
+    available_days = db.Column(db.String(200))  # Stored as JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User', backref=db.backref('doctor_profile', uselist=False))
+    appointments = db.relationship('Appointment', backref='doctor', foreign_keys='Appointment.doctor_id')
+
+class Patient(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    age = db.Column(db.Integer)
+    gender = db.Column(db.String(20))
+    blood_group = db.Column(db.String(10))
+    weight = db.Column(db.Float)
+    height = db.Column(db.Float)
+    medical_history = db.Column(db.Text)
+    allergies = db.Column(db.Text)
+    chronic_diseases = db.Column(db.Text)
+    current_medications = db.Column(db.Text)
+    family_history = db.Column(db.Text)
+    lifestyle_habits = db.Column(db.Text)
+    emergency_contact = db.Column(db.String(100))
+    emergency_contact_relation = db.Column(db.String(50))
+    address = db.Column(db.Text)
+    occupation = db.Column(db.String(100))
+    marital_status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    user = db.relationship('User', backref=db.backref('patient_profile', uselist=False))
+    appointments = db.relationship('Appointment', backref='patient', foreign_keys='Appointment.patient_id')
+    prescriptions = db.relationship('Prescription', backref='patient')
+
+class Appointment(db.Model):
+    __table_args__ = (
+        db.Index('ix_appointment_doctor_date', 'doctor_id', 'appointment_date'),
+        db.Index('ix_appointment_patient_date', 'patient_id', 'appointment_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    appointment_date = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), default='pending')
+    symptoms = db.Column(db.Text)
+    diagnosis = db.Column(db.Text)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Prescription(db.Model):
+    __table_args__ = (
+        db.Index('ix_prescription_doctor', 'doctor_id'),
+        db.Index('ix_prescription_patient', 'patient_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'))
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    medications = db.Column(db.Text)  # Stored as JSON string
+    dosage_instructions = db.Column(db.Text)
+    duration = db.Column(db.String(100))
+    additional_notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationships
+    appointment = db.relationship('Appointment', backref='prescriptions')
+    doctor = db.relationship('Doctor', backref='prescriptions')
+
+# Add these models after other models
+class PatientFlow(db.Model):
+    __table_args__ = (
+        db.Index('uq_patient_flow_doctor_date_slot', 'doctor_id', 'date', 'time_slot', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    time_slot = db.Column(db.String(10), nullable=False)
+    patient_count = db.Column(db.Integer, default=0)
+    date = db.Column(db.Date, nullable=False)
+    
+    doctor = db.relationship('Doctor', backref='patient_flows')
+
+class DiseaseDistribution(db.Model):
+    __table_args__ = (
+        db.Index('uq_disease_distribution_doctor_disease', 'doctor_id', 'disease_name', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    disease_name = db.Column(db.String(100), nullable=False)
+    patient_count = db.Column(db.Integer, default=0)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    doctor = db.relationship('Doctor', backref='disease_distributions')
+
+class LabResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_lab_result_patient_test_recorded', 'patient_id', 'test', 'recorded_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    test = db.Column(db.String(40), nullable=False)  # key of lab_reports.normal_ranges
+    value = db.Column(db.Float, nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class PatientVitals(db.Model):
+    # One row per reading; metrics a device did not report stay NULL.
+    # Rollups live in VitalsHourly / VitalsDaily (see vitals.py).
+    __tablename__ = 'patient_vitals'
+    __table_args__ = (
+        db.Index('ix_patient_vitals_patient_recorded', 'patient_id', 'recorded_at'),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), nullable=False)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    systolic = db.Column(db.SmallInteger)
+    diastolic = db.Column(db.SmallInteger)
+    heart_rate = db.Column(db.SmallInteger)
+    temperature = db.Column(db.Float)
+    respiratory_rate = db.Column(db.SmallInteger)
+    blood_sugar = db.Column(db.SmallInteger)
+
+class VitalsHourly(db.Model):
+    # metric is an index into vitals.METRICS
+    __tablename__ = 'vitals_hourly'
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), primary_key=True)
+    metric = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    n = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Float, nullable=False)
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+
+class VitalsDaily(db.Model):
+    __tablename__ = 'vitals_daily'
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), primary_key=True)
+    metric = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    n = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Float, nullable=False)
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
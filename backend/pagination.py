@@ -0,0 +1,54 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Cursors are opaque to clients: the (sort value, id) of the last row served,
+# base64-encoded so they survive a round trip through a query string.
+
+
+def encode_cursor(sort_value, row_id):
+    raw = f'{sort_value.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def after_cursor(sort_column, id_column, cursor):
+    # Expanded form of (sort_column, id) > (value, id); MySQL only uses the
+    # composite index for row-value comparisons on recent versions
+    sort_value, row_id = decode_cursor(cursor)
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > row_id)
+    )
+
+
+def page_size(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if size < 1:
+        raise ValueError('limit must be positive')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def parse_date(value, name):
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f'{name} must be YYYY-MM-DD or YYYY-MM-DD HH:MM')
@@ -0,0 +1,88 @@
+"""Peak Python memory of the appointment listing: legacy .all() vs NDJSON stream.
+
+    python perf/bench_appointments.py --appointments 100000
+"""
+import argparse
+import json
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import make_app, create_schema
+from sqlalchemy import insert, select
+from models import db, User, Doctor, Patient, Appointment
+
+
+def legacy(doctor_id):
+    appointments = Appointment.query.filter_by(doctor_id=doctor_id).all()
+    return json.dumps({'appointments': [{
+        'id': apt.id,
+        'appointment_date': apt.appointment_date.strftime('%Y-%m-%d %H:%M'),
+        'status': apt.status,
+        'symptoms': apt.symptoms,
+        'diagnosis': apt.diagnosis,
+        'notes': apt.notes
+    } for apt in appointments]})
+
+
+def streamed(doctor_id):
+    stmt = select(
+        Appointment.id, Appointment.appointment_date, Appointment.status,
+        Appointment.symptoms, Appointment.diagnosis, Appointment.notes
+    ).where(Appointment.doctor_id == doctor_id).order_by(Appointment.appointment_date, Appointment.id)
+    written = 0
+    for apt in db.session.execute(stmt.execution_options(yield_per=1000)):
+        line = json.dumps({
+            'id': apt.id,
+            'appointment_date': apt.appointment_date.strftime('%Y-%m-%d %H:%M'),
+            'status': apt.status,
+            'symptoms': apt.symptoms,
+            'diagnosis': apt.diagnosis,
+            'notes': apt.notes
+        }) + '\n'
+        written += len(line)
+    return written
+
+
+def measure(label, fn):
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<10} peak={peak / 1024 / 1024:8.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--appointments', type=int, default=100000)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        create_schema()
+        db.session.execute(insert(User), [
+            {'username': 'doc', 'email': 'doc@example.com', 'password': 'x', 'role': 'doctor'},
+            {'username': 'pat', 'email': 'pat@example.com', 'password': 'x', 'role': 'patient'},
+        ])
+        db.session.execute(insert(Doctor), [{'user_id': 1}])
+        db.session.execute(insert(Patient), [{'user_id': 2}])
+        start = datetime(2015, 1, 1)
+        for offset in range(0, args.appointments, 10000):
+            db.session.execute(insert(Appointment), [{
+                'doctor_id': 1,
+                'patient_id': 1,
+                'appointment_date': start + timedelta(minutes=random.randint(0, 5_000_000)),
+                'status': 'completed',
+                'symptoms': 'fever and cold',
+                'notes': 'follow up in two weeks',
+            } for _ in range(min(10000, args.appointments - offset))])
+        db.session.commit()
+
+        measure('legacy', legacy)
+        measure('ndjson', streamed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Throughput and tail latency of the assistant gateway against a stub model.
+
+    python perf/bench_assistant.py --requests 400 --clients 50 --latency 0.2
+
+Compares the previous one-blocking-call-per-request pattern (a new client per
+call, each request waiting on its own call) with the gateway's bounded
+concurrency and coalescing of identical in-flight questions. --duplicates is
+the share of requests that repeat a popular question; repeats are reworded
+(case, punctuation, word order) the way patients retype them.
+
+A third run adds the answer cache, in a temporary SQLite file, and reports
+its hit rate and the model latency it saved.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from common import percentile
+from answer_cache import AnswerCache
+from assistant import InferenceGateway, StubBackend
+
+POPULAR = ['nose is bleeding after a hit', 'fever and cold', 'headache since morning', 'stomach pain after food']
+
+
+def reword(question, rng):
+    words = question.split()
+    rng.shuffle(words)
+    text = ' '.join(words)
+    return rng.choice([text, text.upper(), text.capitalize() + '?', text + '!!', '  ' + text.replace(' ', ', ')])
+
+
+def questions(n, duplicates, seed=7):
+    rng = random.Random(seed)
+    return [reword(rng.choice(POPULAR), rng) if rng.random() < duplicates else f'question {i}' for i in range(n)]
+
+
+def drive(label, ask, items, clients, calls):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    queue = list(items)
+
+    def client():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                question = queue.pop()
+            start = time.perf_counter()
+            try:
+                ask(question)
+            except Exception as e:
+                errors.append(e)
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<10} {len(latencies) / elapsed:8.1f} req/s  p50={percentile(latencies, 50):7.0f}ms '
+          f'p95={percentile(latencies, 95):7.0f}ms p99={percentile(latencies, 99):7.0f}ms  '
+          f'upstream calls={calls()}  errors={len(errors)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4, help='sync workers for the per-call baseline')
+    parser.add_argument('--duplicates', type=float, default=0.3)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    items = questions(args.requests, args.duplicates)
+
+    # Old pattern: each request builds a client and blocks a sync worker on
+    # its own call, so only --workers calls are in flight; the rest queue
+    legacy_calls = [0]
+    workers = threading.Semaphore(args.workers)
+
+    def legacy(question):
+        with workers:
+            backend = StubBackend(args.latency, failure_rate=args.failure_rate)
+            legacy_calls[0] += 1
+            return asyncio.run(backend.generate('prompt', question))
+
+    drive('per-call', legacy, items, args.clients, lambda: legacy_calls[0])
+
+    backend = StubBackend(args.latency, failure_rate=args.failure_rate, seed=1)
+    gateway = InferenceGateway(backend, concurrency=args.concurrency, timeout=5, retries=2, backoff=0.05)
+    drive('gateway', gateway.ask, items, args.clients, lambda: backend.calls)
+    print(f'gateway stats: {gateway.snapshot()}')
+
+    workdir = tempfile.mkdtemp(prefix='answer-cache-')
+    try:
+        cache = AnswerCache(os.path.join(workdir, 'answers.db'))
+        backend = StubBackend(args.latency, failure_rate=args.failure_rate, seed=1)
+        gateway = InferenceGateway(backend, concurrency=args.concurrency, timeout=5, retries=2, backoff=0.05,
+                                   cache=cache)
+        drive('cached', gateway.ask, items, args.clients, lambda: backend.calls)
+        print(f'cache stats: {cache.stats()}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Commits and throughput for chart clicks: direct upserts vs write-behind.
+
+    python perf/bench_chart_ingest.py --clicks 20000 --threads 8
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import date
+
+from common import make_app, create_schema
+from sqlalchemy import event, insert
+from models import db, User, Doctor, PatientFlow
+from counters import add_patient_flow_counts, add_disease_counts
+from chart_buffer import ChartEventBuffer
+
+SLOTS = ['9 AM', '10 AM', '11 AM', '12 PM', '2 PM', '3 PM', '4 PM', '5 PM']
+DISEASES = ['Fever', 'Cold & Flu', 'Diabetes', 'Blood Pressure', 'Others']
+
+
+def run(label, app, clicks, threads, click):
+    commits = []
+    event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+
+    def worker(n):
+        with app.app_context():
+            for _ in range(n):
+                click(random.choice(SLOTS), random.choice(DISEASES))
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(clicks // threads,)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return start, commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--max-events', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=2.0)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url, engine_options={
+        'connect_args': {'timeout': 60} if not args.database_url else {},
+    })
+    app.config['CHART_FLUSH_MAX_EVENTS'] = args.max_events
+    app.config['CHART_FLUSH_INTERVAL'] = args.interval
+    buffer = ChartEventBuffer(app)
+    today = date.today()
+
+    with app.app_context():
+        create_schema()
+        db.session.execute(insert(User), [{'username': 'doc', 'email': 'doc@example.com', 'password': 'x', 'role': 'doctor'}])
+        db.session.execute(insert(Doctor), [{'user_id': 1}])
+        db.session.commit()
+
+        def direct(slot, disease):
+            add_patient_flow_counts({(1, today, slot): 1})
+            add_disease_counts({(1, disease): 1})
+            db.session.commit()
+
+        start, commits = run('direct', app, args.clicks, args.threads, direct)
+        elapsed = time.perf_counter() - start
+        print(f'direct        {args.clicks / elapsed:10.0f} clicks/s  commits={len(commits)}')
+
+        def buffered(slot, disease):
+            buffer.add(1, slot, disease, today)
+
+        start, commits = run('write-behind', app, args.clicks, args.threads, buffered)
+        accepted = time.perf_counter() - start
+        buffer.close()
+        elapsed = time.perf_counter() - start
+        print(f'write-behind  {args.clicks / accepted:10.0f} clicks/s  commits={len(commits)} '
+              f'(drained in {elapsed:.2f}s)')
+
+        total = sum(f.patient_count for f in PatientFlow.query.filter_by(doctor_id=1, date=today))
+        print(f'stored clicks {total} (expected {2 * (args.clicks // args.threads) * args.threads})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Compare the old per-counter dashboard queries with the aggregate version.
+
+    python perf/bench_dashboard.py --appointments 200000 --iterations 200
+
+Reports the SQL statements issued and p50/p95 latency for one doctor and one
+patient dashboard. Set --database-url to run against MySQL instead of SQLite.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from common import make_app, create_schema, StatementCounter, percentile, timed
+from sqlalchemy import insert
+from models import db, User, Doctor, Patient, Appointment, Prescription
+from dashboard import doctor_counters, patient_counters
+
+
+def legacy_doctor_counters(doctor_id):
+    # Verbatim copy of the counters get_dashboard_data used to issue
+    today = datetime.utcnow().date()
+    this_month = today.replace(day=1)
+    this_year = today.replace(month=1, day=1)
+    return {
+        "appointments": Appointment.query.filter_by(doctor_id=doctor_id, appointment_date=today).count(),
+        "total_appointments": Appointment.query.filter_by(doctor_id=doctor_id).count(),
+        "prescriptions": Prescription.query.filter_by(doctor_id=doctor_id).count(),
+        "totalPatients": Patient.query.join(Appointment).filter(
+            Appointment.doctor_id == doctor_id
+        ).distinct().count(),
+        "visits": {
+            "daily": Appointment.query.filter_by(doctor_id=doctor_id, appointment_date=today).count(),
+            "monthly": Appointment.query.filter(
+                Appointment.doctor_id == doctor_id,
+                Appointment.appointment_date >= this_month
+            ).count(),
+            "yearly": Appointment.query.filter(
+                Appointment.doctor_id == doctor_id,
+                Appointment.appointment_date >= this_year
+            ).count()
+        }
+    }
+
+
+def legacy_patient_counters(patient_id):
+    return {
+        "appointments": Appointment.query.filter(
+            Appointment.patient_id == patient_id,
+            Appointment.appointment_date >= datetime.utcnow()
+        ).count(),
+        "total_appointments": Appointment.query.filter_by(patient_id=patient_id).count(),
+        "prescriptions": Prescription.query.filter_by(patient_id=patient_id).count()
+    }
+
+
+def seed(doctors, patients, appointments):
+    now = datetime.utcnow()
+    users = [{'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x',
+              'role': 'doctor' if i < doctors else 'patient'} for i in range(doctors + patients)]
+    db.session.execute(insert(User), users)
+    db.session.execute(insert(Doctor), [{'user_id': i + 1} for i in range(doctors)])
+    db.session.execute(insert(Patient), [{'user_id': doctors + i + 1} for i in range(patients)])
+    batch = []
+    for i in range(appointments):
+        batch.append({
+            'doctor_id': random.randint(1, doctors),
+            'patient_id': random.randint(1, patients),
+            'appointment_date': now - timedelta(minutes=random.randint(-60 * 24 * 30, 60 * 24 * 365 * 3)),
+            'status': 'completed',
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Appointment), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Appointment), batch)
+    db.session.execute(insert(Prescription), [
+        {'doctor_id': random.randint(1, doctors), 'patient_id': random.randint(1, patients)}
+        for _ in range(appointments // 4)
+    ])
+    db.session.commit()
+
+
+def run(label, fn, profile_model, profile_id, iterations):
+    engine = db.engine
+    samples = []
+    with StatementCounter(engine) as counter:
+        # Include the user and profile lookups the endpoint performs
+        db.session.get(User, 1)
+        db.session.query(profile_model).filter_by(id=profile_id).first()
+        fn(profile_id)
+    for _ in range(iterations):
+        with timed(samples):
+            db.session.get(User, 1)
+            db.session.query(profile_model).filter_by(id=profile_id).first()
+            fn(profile_id)
+        db.session.expunge_all()
+    print(f'{label:<28} queries={counter.count:<3} '
+          f'p50={percentile(samples, 50):8.2f}ms p95={percentile(samples, 95):8.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--appointments', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=100)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        create_schema()
+        seed(args.doctors, args.patients, args.appointments)
+        run('doctor  (legacy)', legacy_doctor_counters, Doctor, 1, args.iterations)
+        run('doctor  (aggregate)', doctor_counters, Doctor, 1, args.iterations)
+        run('patient (legacy)', legacy_patient_counters, Patient, 1, args.iterations)
+        run('patient (aggregate)', patient_counters, Patient, 1, args.iterations)
+
+
+if __name__ == '__main__':
+    main()
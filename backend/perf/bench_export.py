@@ -0,0 +1,93 @@
+"""Table export throughput and memory: does peak memory stay flat as rows grow?
+
+    python perf/bench_export.py --rows 1000000
+    python perf/bench_export.py --rows 10000000 --database-url mysql://root:@localhost/healthcare_bench
+
+Seeds --rows appointments, then exports the first tenth and the whole table
+in each format to /dev/null, reporting rows/s, output size and the peak
+Python heap during the export (tracemalloc, which slows the run down). With
+the server-side cursor the peak should depend on --chunk-size, not on the
+row count.
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import make_app, create_schema
+from sqlalchemy import insert, select, func
+from models import db, User, Doctor, Patient, Appointment
+from export import export_chunks, ExportError
+
+
+def seed(rows, batch=20000, seed=18):
+    rng = random.Random(seed)
+    db.session.execute(insert(User), [
+        {'username': 'doc', 'email': 'doc@example.com', 'password': 'x', 'role': 'doctor'},
+        {'username': 'pat', 'email': 'pat@example.com', 'password': 'x', 'role': 'patient'},
+    ])
+    db.session.execute(insert(Doctor), [{'user_id': 1}])
+    db.session.execute(insert(Patient), [{'user_id': 2}])
+    start = datetime(2020, 1, 1)
+    for offset in range(0, rows, batch):
+        db.session.execute(insert(Appointment), [{
+            'patient_id': 1, 'doctor_id': 1,
+            'appointment_date': start + timedelta(minutes=rng.randrange(5 * 365 * 24 * 60)),
+            'status': rng.choice(['pending', 'confirmed', 'completed']),
+            'symptoms': rng.choice(['fever', 'cough, sore throat', 'headache', 'back pain']),
+        } for _ in range(min(batch, rows - offset))])
+        db.session.commit()
+
+
+def run(fmt, compress, until_id, chunk_size):
+    chunks = export_chunks(db.engine, 'appointment', fmt, chunk_size=chunk_size, compress=compress)
+    tracemalloc.start()
+    began = time.perf_counter()
+    rows = size = 0
+    with open(os.devnull, 'wb') as out:
+        for last_id, count, data in chunks:
+            out.write(data)
+            rows += count
+            size += len(data)
+            if until_id is not None and last_id >= until_id:
+                chunks.close()
+                break
+    elapsed = time.perf_counter() - began
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--formats', default='csv,ndjson,parquet')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        create_schema()
+        if not db.session.execute(select(func.count()).select_from(Appointment)).scalar():
+            began = time.perf_counter()
+            seed(args.rows)
+            print(f'seeded {args.rows} appointments in {time.perf_counter() - began:.1f}s')
+        limit = args.rows // 10 + 1
+
+        for fmt in args.formats.split(','):
+            try:
+                for compress in (False, True):
+                    for label, until_id in (('10%', limit), ('all', None)):
+                        rows, size, elapsed, peak = run(fmt, compress, until_id, args.chunk_size)
+                        name = fmt + ('+gzip' if compress else '')
+                        print(f'{name:<13} {label:>4} {rows:9d} rows  {elapsed:7.2f}s  {rows / elapsed:9.0f} rows/s  '
+                              f'{size / 1e6:8.1f}MB out  peak heap {peak / 1e6:6.1f}MB')
+            except ExportError as e:
+                print(f'{fmt}: skipped ({e})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Panel analysis of stored lab values: per-report dict loop vs columnar NumPy.
+
+    python perf/bench_lab_analytics.py --reports 100000
+
+The baseline is the notebook's analyze_report, called once per report dict
+(fixed adult ranges, emoji strings). The columnar engine also applies sex and
+age specific ranges and computes z-scores, percentile bands and the per-test
+summary. It is timed both with and without building the columns from the
+rows (the rows arrive from SQL as tuples).
+"""
+import argparse
+import random
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from lab_analytics import build_columns, panel_report, latest, analyze_column
+from lab_reports import TESTS, analyze_report
+
+SPREAD = {
+    "Hemoglobin (g/dL)": (14.0, 2.0),
+    "WBC (cells/mm³)": (7500, 2500),
+    "Platelets (cells/mm³)": (280000, 90000),
+    "RBC (million cells/mcL)": (5.0, 0.6),
+    "Glucose (mg/dL)": (110, 35),
+}
+
+
+def make_reports(n, seed=3):
+    rng = random.Random(seed)
+    reports = []
+    for patient_id in range(1, n + 1):
+        values = {test: round(rng.gauss(*SPREAD[test]), 2) for test, _, _ in TESTS if rng.random() < 0.9}
+        reports.append((patient_id, rng.choice(['male', 'female', None]), rng.choice([None] + list(range(2, 90))), values))
+    return reports
+
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<28} {elapsed * 1000:9.1f}ms  {n / elapsed:12.0f} reports/s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=100000)
+    args = parser.parse_args()
+    reports = make_reports(args.reports)
+    # Flattened the way the panel query returns them
+    rows = [(pid, test, value, gender, age) for pid, gender, age, values in reports for test, value in values.items()]
+    print(f'{len(reports)} reports, {len(rows)} values')
+
+    legacy = timed('dict loop (analyze_report)', lambda: [analyze_report(values) for _, _, _, values in reports],
+                   args.reports)
+    columns = timed('build columns', lambda: build_columns(rows), args.reports)
+
+    def classify():
+        return {test: analyze_column(test, latest(column)) for test, column in columns.items()}
+
+    analyzed = timed('columnar classify + z', classify, args.reports)
+    timed('columnar panel report', lambda: panel_report(columns), args.reports)
+    timed('build + panel report', lambda: panel_report(build_columns(rows)), args.reports)
+
+    # Sanity check on men of unknown age, where both use the same ranges
+    legacy_high = sum(1 for (_, gender, age, _), result in zip(reports, legacy)
+                      if gender == 'male' and age is None and 'High' in result.get('Glucose (mg/dL)', ''))
+    column = latest(columns['Glucose (mg/dL)'])
+    status = analyzed['Glucose (mg/dL)'][0]
+    mask = (column.sex == 1) & (column.band == 2)
+    ages = {pid: age for pid, _, age, _ in reports}
+    columnar_high = sum(1 for pid, s, m in zip(column.patient_id, status, mask) if m and s == 1 and ages[int(pid)] is None)
+    print(f'glucose highs among men of unknown age: dict loop={legacy_high} columnar={columnar_high}')
+
+
+if __name__ == '__main__':
+    main()
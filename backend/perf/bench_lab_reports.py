@@ -0,0 +1,155 @@
+"""Lab report OCR throughput, in reports/second, against the number of worker processes.
+
+    python perf/bench_lab_reports.py --reports 200 --workers 1,2,4,8
+    python perf/bench_lab_reports.py --folder ~/scans      # real report images
+    python perf/bench_lab_reports.py --extract-only        # no OpenCV/Tesseract needed
+
+Synthetic reports are rendered with OpenCV into a temporary folder: a few
+blood test lines with random values, plus noise lines. The OCR runs need
+opencv-python-headless, pytesseract and the tesseract binary.
+
+Every run first times value extraction on its own: the notebook's
+extract_values, which rebuilds its patterns per call, against the module's
+precompiled patterns, and a single combined alternation for reference.
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from lab_reports import ReportPool, TESTS, extract_values
+
+NOISE = ['Patient ID: {n}', 'Collected: 2024-03-{d:02d} 08:{d:02d}', 'Ref. Dr. Sharma', 'Method: Automated analyser']
+
+
+def legacy_extract_values(text):
+    # Image.ipynb version: patterns rebuilt and searched one by one per call
+    extracted_data = {}
+    patterns = {
+        "Hemoglobin (g/dL)": r"Hemoglobin:\s*([\d.]+)",
+        "WBC (cells/mm³)": r"WBC:\s*([\d,]+)",
+        "Platelets (cells/mm³)": r"Platelets:\s*([\d,]+)",
+        "RBC (million cells/mcL)": r"RBC:\s*([\d.]+)",
+        "Glucose (mg/dL)": r"Glucose:\s*([\d.]+)",
+    }
+    for test, pattern in patterns.items():
+        match = re.search(pattern, text)
+        if match:
+            extracted_data[test] = float(match.group(1).replace(",", ""))
+    return extracted_data
+
+
+_COMBINED = re.compile('|'.join(rf"{label}:\s*(?P<t{i}>{number})" for i, (_, label, number) in enumerate(TESTS)))
+_GROUP_TESTS = {f't{i}': test for i, (test, _, _) in enumerate(TESTS)}
+
+
+def combined_extract_values(text):
+    # One alternation, one pass over the text
+    extracted_data = {}
+    for match in _COMBINED.finditer(text):
+        test = _GROUP_TESTS[match.lastgroup]
+        if test not in extracted_data:
+            extracted_data[test] = float(match.group(match.lastgroup).replace(",", ""))
+    return extracted_data
+
+
+def report_lines(rng):
+    values = {
+        'Hemoglobin': f'{rng.uniform(9, 18):.1f}',
+        'WBC': f'{rng.randint(2500, 16000):,}',
+        'Platelets': str(rng.randint(90000, 500000)),
+        'RBC': f'{rng.uniform(3.8, 6.6):.2f}',
+        'Glucose': str(rng.randint(60, 240)),
+    }
+    lines = [f'{label}: {values[label]}' for _, label, _ in TESTS if rng.random() < 0.9]
+    lines += [rng.choice(NOISE).format(n=rng.randint(1000, 9999), d=rng.randint(1, 28)) for _ in range(4)]
+    rng.shuffle(lines)
+    return lines
+
+
+def bench_extraction(n, rng):
+    texts = ['\n'.join(report_lines(rng)) for _ in range(n)]
+    for label, fn in (('notebook', legacy_extract_values), ('combined', combined_extract_values),
+                      ('module', extract_values)):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        elapsed = time.perf_counter() - start
+        print(f'extract {label:<9} {n / elapsed:10.0f} reports/s')
+    mismatches = sum(not legacy_extract_values(t) == extract_values(t) == combined_extract_values(t) for t in texts)
+    print(f'extract results differ on {mismatches} of {n} reports')
+
+
+def render_reports(folder, n, rng):
+    import cv2
+    import numpy as np
+
+    paths = []
+    for i in range(n):
+        lines = report_lines(rng)
+        image = np.full((60 + 50 * len(lines), 900), 255, np.uint8)
+        for row, line in enumerate(lines):
+            cv2.putText(image, line, (40, 70 + 50 * row), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+        path = os.path.join(folder, f'report_{i:04d}.png')
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=200)
+    parser.add_argument('--workers', default=None, help='comma-separated pool sizes (default: 1, 2, 4 ... cores)')
+    parser.add_argument('--folder', default=None, help='existing folder of report images to use instead')
+    parser.add_argument('--extract-only', action='store_true')
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    bench_extraction(max(args.reports, 10000), rng)
+    if args.extract_only:
+        return
+
+    cores = os.cpu_count()
+    if args.workers:
+        sizes = [int(n) for n in args.workers.split(',')]
+    else:
+        sizes = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    workdir = None
+    if args.folder:
+        paths = sorted(os.path.join(args.folder, name) for name in os.listdir(args.folder))
+    else:
+        workdir = tempfile.mkdtemp(prefix='lab-reports-')
+        paths = render_reports(workdir, args.reports, rng)
+    files = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            files.append((os.path.basename(path), f.read()))
+    print(f'{len(files)} reports, {cores} cores')
+
+    try:
+        baseline = None
+        for workers in sizes:
+            pool = ReportPool(workers=workers)
+            # Warm the pool so process start-up is not timed
+            list(pool.process(files[:workers]))
+            start = time.perf_counter()
+            results = [result for _, result in pool.process(files)]
+            elapsed = time.perf_counter() - start
+            pool.close()
+            errors = sum('error' in result for result in results)
+            found = sum(len(result.get('values', {})) for result in results)
+            rate = len(files) / elapsed
+            baseline = baseline or rate
+            print(f'workers={workers:<3} {rate:8.1f} reports/s  speedup={rate / baseline:4.2f}x  '
+                  f'values found={found}  errors={errors}')
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cost of the request/SQL instrumentation: the same requests with metrics on and off.
+
+    python perf/bench_metrics_overhead.py --requests 2000 --rounds 5
+
+Boots the app on a throwaway SQLite database, signs up a doctor with some
+appointments and replays doctor dashboard and appointment list requests
+through the test client, alternating rounds with request_metrics.enabled
+switched on and off. Reports per-request latency both ways, the difference,
+and how long a /metrics scrape takes afterwards.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+workdir = tempfile.mkdtemp(prefix='metrics-overhead-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+os.environ['ASSISTANT_BACKEND'] = 'stub'
+os.environ['ASSISTANT_CACHE_PATH'] = ''
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from app import create_app, db
+from metrics import request_metrics
+from migrations import upgrade
+from models import Appointment
+from sqlalchemy import insert
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade(db.engine)
+    client = app.test_client()
+    client.post('/api/signup', json={'username': 'doc', 'email': 'doc@example.com', 'password': 'pw', 'role': 'doctor'})
+    client.post('/api/signup', json={'username': 'pat', 'email': 'pat@example.com', 'password': 'pw', 'role': 'patient'})
+    login = client.post('/api/login', json={'email': 'doc@example.com', 'password': 'pw'}).get_json()
+    headers = {'Authorization': 'Bearer ' + login['token']}
+    with app.app_context():
+        start = datetime.utcnow() - timedelta(days=200)
+        db.session.execute(insert(Appointment), [
+            {'patient_id': 1, 'doctor_id': 1, 'appointment_date': start + timedelta(hours=i)} for i in range(2000)
+        ])
+        db.session.commit()
+    paths = ['/api/dashboard', f'/api/appointments/{login["user"]["id"]}?limit=50']
+
+    timings = {True: [], False: []}
+    for round_ in range(args.rounds * 2):
+        enabled = round_ % 2 == 0
+        request_metrics.enabled = enabled
+        began = time.perf_counter()
+        for i in range(args.requests):
+            assert client.get(paths[i % len(paths)], headers=headers).status_code == 200
+        timings[enabled].append((time.perf_counter() - began) / args.requests * 1e6)
+
+    on, off = statistics.median(timings[True]), statistics.median(timings[False])
+    print(f'metrics off: {off:8.1f}us/request')
+    print(f'metrics on:  {on:8.1f}us/request  ({on - off:+.1f}us, {(on - off) / off:+.1%})')
+    began = time.perf_counter()
+    body = request_metrics.render()
+    print(f'/metrics render: {(time.perf_counter() - began) * 1000:.2f}ms, {len(body.splitlines())} lines')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,55 @@
+"""Re-upload cost of lab reports with the content-hash cache: cold vs warm.
+
+    python perf/bench_report_cache.py --reports 50 --workers 4 --latency 1.0
+
+Renders synthetic reports (see bench_lab_reports.py), then processes the
+same batch twice with summaries from a stub model that takes --latency
+seconds per call. The first pass runs OCR and the model for every report;
+the second should run neither. Needs opencv-python-headless, pytesseract
+and the tesseract binary.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from assistant import StubBackend, gateway
+from bench_lab_reports import render_reports
+from lab_reports import ReportPool
+from report_cache import ReportCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--latency', type=float, default=1.0, help='stub model seconds per summary')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='report-cache-')
+    try:
+        files = []
+        for path in render_reports(workdir, args.reports, random.Random(5)):
+            with open(path, 'rb') as f:
+                files.append((os.path.basename(path), f.read()))
+        gateway.backend = StubBackend(args.latency)
+        pool = ReportPool(workers=args.workers, cache=ReportCache(os.path.join(workdir, 'cache.db')))
+        for label in ('cold', 'warm'):
+            calls = gateway.backend.calls
+            start = time.perf_counter()
+            results = [result for _, result in pool.process(files, summarize=True)]
+            elapsed = time.perf_counter() - start
+            cached = sum(bool(result.get('cached')) for result in results)
+            print(f'{label}: {elapsed:7.2f}s  {len(files) / elapsed:8.1f} reports/s  '
+                  f'cached={cached}/{len(files)}  model calls={gateway.backend.calls - calls}')
+        print(f'cache stats: {pool.cache.stats()}')
+        pool.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
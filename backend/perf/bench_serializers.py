@@ -0,0 +1,155 @@
+"""Appointment list serialization: ORM objects and jsonify vs compiled serializers.
+
+    python perf/bench_serializers.py --rows 10000 --rounds 7
+
+Inserts --rows appointments for one doctor into a throwaway SQLite database
+and builds the full list body (the ?limit= page of GET /api/appointments,
+at --rows rows) several ways, each split into fetch, serialize and encode:
+
+  orm + jsonify         Appointment ORM objects, a dict per row built field
+                        by field with strftime, flask.jsonify
+  columns + jsonify     the same from plain column rows (the list endpoint
+                        before compiled serializers)
+  columns + compiled    select(*APPOINTMENT.columns), APPOINTMENT.from_tuples,
+                        encoded with json and, when installed, orjson
+
+Every variant's body is decoded and compared with the first, so the
+serializer is checked to emit the same data. Rounds run the variants in
+turn; reports the median of --rounds.
+"""
+import argparse
+import gc
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from common import make_app, create_schema
+from flask import jsonify
+from sqlalchemy import insert, select
+from models import db, User, Doctor, Patient, Appointment
+from app import APPOINTMENT
+
+STATUSES = ('scheduled', 'completed', 'cancelled')
+
+
+def legacy_row(apt):
+    return {
+        'id': apt.id,
+        'appointment_date': apt.appointment_date.strftime('%Y-%m-%d %H:%M'),
+        'status': apt.status,
+        'symptoms': apt.symptoms,
+        'diagnosis': apt.diagnosis,
+        'notes': apt.notes
+    }
+
+
+def orm_fetch():
+    return Appointment.query.filter_by(doctor_id=1).order_by(Appointment.appointment_date, Appointment.id).all()
+
+
+def columns_fetch():
+    stmt = select(Appointment.id, Appointment.appointment_date, Appointment.status, Appointment.symptoms,
+                  Appointment.diagnosis, Appointment.notes)
+    return db.session.execute(stmt.where(Appointment.doctor_id == 1)
+                              .order_by(Appointment.appointment_date, Appointment.id)).all()
+
+
+def compiled_fetch():
+    return db.session.execute(select(*APPOINTMENT.columns).where(Appointment.doctor_id == 1)
+                              .order_by(Appointment.appointment_date, Appointment.id)).all()
+
+
+def legacy_serialize(rows):
+    return [legacy_row(apt) for apt in rows]
+
+
+def jsonify_encode(body):
+    return jsonify(body).get_data()
+
+
+def json_encode(body):
+    return json.dumps(body, separators=(',', ':')).encode()
+
+
+def variants():
+    found = [
+        ('orm + jsonify', orm_fetch, legacy_serialize, jsonify_encode),
+        ('columns + jsonify', columns_fetch, legacy_serialize, jsonify_encode),
+        ('columns + compiled + json', compiled_fetch, APPOINTMENT.from_tuples, json_encode),
+    ]
+    try:
+        import orjson
+        found.append(('columns + compiled + orjson', compiled_fetch, APPOINTMENT.from_tuples, orjson.dumps))
+    except ImportError:
+        print('orjson is not installed; skipping the orjson variant')
+    return found
+
+
+def seed(rows):
+    create_schema()
+    db.session.execute(insert(User), [
+        {'username': 'doc', 'email': 'doc@example.com', 'password': 'pw', 'role': 'doctor'},
+        {'username': 'pat', 'email': 'pat@example.com', 'password': 'pw', 'role': 'patient'},
+    ])
+    db.session.execute(insert(Doctor), [{'user_id': 1, 'specialization': 'General'}])
+    db.session.execute(insert(Patient), [{'user_id': 2, 'age': 40}])
+    start = datetime(2024, 1, 1, 8, 0)
+    db.session.execute(insert(Appointment), [
+        {'patient_id': 1, 'doctor_id': 1, 'appointment_date': start + timedelta(minutes=30 * i),
+         'status': STATUSES[i % 3], 'symptoms': 'fever, cough' if i % 2 else None,
+         'diagnosis': 'viral infection' if i % 3 == 1 else None, 'notes': f'follow up in {i % 14} days'}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=7)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.rows)
+        # Rounds interleave the variants so drift hits all of them alike
+        found = variants()
+        timings = {name: {'fetch': [], 'serialize': [], 'encode': []} for name, *_ in found}
+        sizes, reference = {}, None
+        for _ in range(args.rounds):
+            for name, fetch, serialize, encode in found:
+                db.session.expunge_all()
+                gc.collect()
+                started = time.perf_counter()
+                rows = fetch()
+                fetched = time.perf_counter()
+                body = {'appointments': serialize(rows), 'next_cursor': None}
+                serialized = time.perf_counter()
+                data = encode(body)
+                encoded = time.perf_counter()
+                timings[name]['fetch'].append((fetched - started) * 1000)
+                timings[name]['serialize'].append((serialized - fetched) * 1000)
+                timings[name]['encode'].append((encoded - serialized) * 1000)
+                db.session.rollback()
+                if name not in sizes:
+                    decoded = json.loads(data)
+                    if reference is None:
+                        reference = decoded
+                    elif decoded != reference:
+                        raise SystemExit(f'{name}: body differs from {found[0][0]}')
+                    sizes[name] = len(data)
+        results = [(name, {stage: statistics.median(values) for stage, values in timings[name].items()}, sizes[name])
+                   for name, *_ in found]
+
+    print(f'{args.rows} appointments, median of {args.rounds} rounds')
+    print(f'{"variant":<28} {"fetch":>9} {"serialize":>10} {"encode":>9} {"total":>9} {"bytes":>9}')
+    baseline = sum(results[0][1].values())
+    for name, medians, size in results:
+        total = sum(medians.values())
+        print(f'{name:<28} {medians["fetch"]:7.1f}ms {medians["serialize"]:8.1f}ms {medians["encode"]:7.1f}ms '
+              f'{total:7.1f}ms {size:9d}  {baseline / total:4.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Worker startup time: from a bare interpreter to the first request served.
+
+    python perf/bench_startup.py --runs 10
+    python perf/bench_startup.py --database-url mysql://user:pw@localhost/msu_healthcare
+
+Each run is a fresh interpreter, like a gunicorn worker without --preload or a
+test process, that imports app, builds the app with create_app() and serves
+POST /api/login through the test client (one query, so the first database
+connection is included). Reports the median of each phase and the modules
+imported before the first request. Trees from before the app factory expose
+a module-level app instead; that is picked up too, so older commits can be
+measured with the same script.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app() if hasattr(module, 'create_app') else module.app
+created = time.perf_counter()
+modules = len(sys.modules)
+client = app.test_client()
+response = client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'x'})
+served = time.perf_counter()
+assert response.status_code == 401, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+    'modules': modules,
+    'heavy': sorted(name for name in ('numpy', 'google.generativeai', 'sqlalchemy.dialects.postgresql', 'cv2', 'pyarrow')
+                    if name in sys.modules),
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='database with the schema applied (default: a throwaway SQLite file)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    try:
+        env = dict(os.environ)
+        env.setdefault('ASSISTANT_CACHE_PATH', os.path.join(workdir, 'answers.db'))
+        env.setdefault('LAB_REPORT_CACHE_PATH', os.path.join(workdir, 'lab_reports.db'))
+        env['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'app.db')
+        if not args.database_url:
+            subprocess.run([sys.executable, '-m', 'migrations', 'upgrade'], check=True, cwd=BACKEND, env=env,
+                           stdout=subprocess.DEVNULL)
+
+        runs = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, '-c', CHILD], check=True, cwd=BACKEND, env=env,
+                                 capture_output=True, text=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+
+        print(f'{args.runs} runs, median:')
+        for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+            print(f'  {key[:-3]:<14} {statistics.median(run[key] for run in runs):8.1f}ms')
+        print(f'  modules loaded before the first request: {runs[-1]["modules"]}')
+        print(f'  heavy modules loaded: {", ".join(runs[-1]["heavy"]) or "none"}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
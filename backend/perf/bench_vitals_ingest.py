@@ -0,0 +1,97 @@
+"""Vitals ingestion rate: one POST per reading vs the bulk NDJSON/CSV endpoint.
+
+    python perf/bench_vitals_ingest.py --single 2000 --bulk 100000
+
+Boots the real app on a throwaway SQLite file, posts --single readings one
+at a time to /api/patient/vitals, then uploads --bulk readings in one body
+to /api/patient/vitals/bulk as NDJSON and as CSV, and reports rows/s for
+each. Every 1000th bulk row is deliberately invalid so the per-row error
+path is exercised too.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+workdir = tempfile.mkdtemp(prefix='vitals-ingest-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+os.environ['ASSISTANT_BACKEND'] = 'stub'
+os.environ['ASSISTANT_CACHE_PATH'] = ''
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from app import create_app, db
+from migrations import upgrade
+
+app = create_app()
+
+COLUMNS = ['recorded_at', 'heart_rate', 'systolic', 'diastolic', 'temperature']
+
+
+def readings(n, start, rng):
+    step = timedelta(minutes=1)
+    for i in range(n):
+        yield {
+            'recorded_at': (start + step * i).isoformat(),
+            'heart_rate': rng.randint(55, 110) if i % 1000 != 999 else 5000,
+            'systolic': rng.randint(100, 150),
+            'diastolic': rng.randint(60, 95),
+            'temperature': round(rng.uniform(36.0, 38.5), 1),
+        }
+
+
+def ndjson_body(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+
+def csv_body(rows):
+    lines = [','.join(COLUMNS)] + [','.join(str(row[c]) for c in COLUMNS) for row in rows]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--single', type=int, default=2000)
+    parser.add_argument('--bulk', type=int, default=100000)
+    args = parser.parse_args()
+    rng = random.Random(17)
+
+    with app.app_context():
+        upgrade(db.engine)
+    client = app.test_client()
+    client.post('/api/signup', json={'username': 'pat', 'email': 'pat@example.com', 'password': 'pw', 'role': 'patient'})
+    token = client.post('/api/login', json={'email': 'pat@example.com', 'password': 'pw'}).get_json()['token']
+    headers = {'Authorization': 'Bearer ' + token}
+
+    start = time.perf_counter()
+    for row in readings(args.single, datetime(2023, 1, 1), rng):
+        row['heart_rate'] = min(row['heart_rate'], 200)
+        response = client.post('/api/patient/vitals', json=row, headers=headers)
+        assert response.status_code == 201, response.get_json()
+    elapsed = time.perf_counter() - start
+    single_rate = args.single / elapsed
+    print(f'{"single-row POST":<16} {args.single:8d} rows  {elapsed:7.2f}s  {single_rate:9.0f} rows/s')
+
+    for label, content_type, encode, origin in (
+        ('bulk NDJSON', 'application/x-ndjson', ndjson_body, datetime(2024, 1, 1)),
+        ('bulk CSV', 'text/csv', csv_body, datetime(2025, 1, 1)),
+    ):
+        body = encode(readings(args.bulk, origin, rng))
+        start = time.perf_counter()
+        response = client.post('/api/patient/vitals/bulk', data=body,
+                               headers={**headers, 'Content-Type': content_type})
+        elapsed = time.perf_counter() - start
+        summary = response.get_json()
+        print(f'{label:<16} {summary["accepted"]:8d} rows  {elapsed:7.2f}s  '
+              f'{summary["accepted"] / elapsed:9.0f} rows/s  {summary["accepted"] / elapsed / single_rate:5.1f}x  '
+              f'rejected={summary["rejected"]} status={response.status_code}')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,86 @@
+"""Year-long vitals chart: scanning raw readings vs reading the rollups.
+
+    python perf/bench_vitals_range.py --days 365 --per-hour 60
+    python perf/bench_vitals_range.py --database-url mysql://root:@localhost/healthcare_bench
+
+Seeds one patient with --per-hour heart-rate/blood-pressure readings for
+--days days through record_vitals (so the rollups are built by the same code
+path as the API), then times a year chart read both ways and counts the rows
+each one fetches. Also reports the ingest rate including rollup upkeep.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import make_app, create_schema
+from sqlalchemy import insert, select, func
+from models import db, User, Patient, PatientVitals
+from vitals import record_vitals, vitals_range, RESOLUTIONS, METRIC_CODES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--per-hour', type=int, default=60)
+    parser.add_argument('--batch', type=int, default=2000)
+    parser.add_argument('--points', type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    rng = random.Random(9)
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=args.days)
+    step = timedelta(hours=1) / args.per_hour
+
+    with app.app_context():
+        create_schema()
+        db.session.execute(insert(User), [{'username': 'pat', 'email': 'pat@example.com', 'password': 'x', 'role': 'patient'}])
+        db.session.execute(insert(Patient), [{'user_id': 1}])
+        db.session.commit()
+
+        total = args.days * 24 * args.per_hour
+        began = time.perf_counter()
+        moment, batch = start, []
+        for _ in range(total):
+            batch.append({'patient_id': 1, 'recorded_at': moment, 'heart_rate': rng.randint(55, 110),
+                          'systolic': rng.randint(100, 150), 'diastolic': rng.randint(60, 95)})
+            moment += step
+            if len(batch) == args.batch:
+                record_vitals(batch)
+                db.session.commit()
+                batch = []
+        record_vitals(batch)
+        db.session.commit()
+        elapsed = time.perf_counter() - began
+        print(f'ingested {total} readings in {elapsed:.1f}s ({total / elapsed:.0f}/s, rollups included)')
+
+        began = time.perf_counter()
+        raw = db.session.execute(
+            select(PatientVitals.recorded_at, PatientVitals.heart_rate)
+            .where(PatientVitals.patient_id == 1, PatientVitals.recorded_at >= start, PatientVitals.recorded_at < end)
+            .order_by(PatientVitals.recorded_at)
+        ).all()
+        raw_ms = (time.perf_counter() - began) * 1000.0
+        print(f'raw scan:  {len(raw):9d} rows  {raw_ms:9.1f}ms')
+
+        db.session.rollback()
+        began = time.perf_counter()
+        resolution, series = vitals_range(1, 'heart_rate', start, end, args.points)
+        rollup_ms = (time.perf_counter() - began) * 1000.0
+        if resolution == 'raw':
+            fetched = len(series)
+        else:
+            model = dict((name, model) for name, model, _ in RESOLUTIONS)[resolution]
+            fetched = db.session.execute(
+                select(func.count()).select_from(model)
+                .where(model.patient_id == 1, model.metric == METRIC_CODES['heart_rate'],
+                       model.bucket >= start, model.bucket < end)
+            ).scalar()
+        print(f'rollups:   {fetched:9d} rows  {rollup_ms:9.1f}ms  resolution={resolution} points={len(series)}')
+        print(f'speedup {raw_ms / rollup_ms:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
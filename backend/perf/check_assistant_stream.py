@@ -0,0 +1,126 @@
+"""Check assistant streaming against the stub backend: TTFB, backpressure, cancellation.
+
+    python perf/check_assistant_stream.py --latency 0.3 --chunks 20 --chunk-delay 0.05
+
+Boots the real app with ASSISTANT_BACKEND=stub and checks that:
+
+  * /api/assistant/stream delivers its first event about when the model
+    produces its first chunk, while /api/assistant waits for the whole answer
+  * a reader that stops consuming pauses the upstream stream once the
+    buffer is full
+  * closing the response (client disconnect) cancels the upstream call
+  * a reader stalled for longer than --reader-timeout aborts the stream and
+    gives its concurrency slot back
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+workdir = tempfile.mkdtemp(prefix='stream-check-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+os.environ['ASSISTANT_BACKEND'] = 'stub'
+os.environ['ASSISTANT_CACHE_PATH'] = ''
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from app import create_app, db
+from assistant import StubBackend, gateway
+from migrations import upgrade
+
+app = create_app()
+
+failures = []
+
+
+def check(label, condition):
+    print(f'[{"ok" if condition else "FAIL":>4}] {label}')
+    if not condition:
+        failures.append(label)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds to the first chunk')
+    parser.add_argument('--chunks', type=int, default=20)
+    parser.add_argument('--chunk-delay', type=float, default=0.05)
+    parser.add_argument('--buffer', type=int, default=4)
+    parser.add_argument('--reader-timeout', type=float, default=0.5)
+    args = parser.parse_args()
+
+    backend = StubBackend(args.latency, jitter=0, chunk_delay=args.chunk_delay, chunks=args.chunks)
+    gateway.backend = backend
+    gateway.stream_buffer = args.buffer
+    with app.app_context():
+        upgrade(db.engine)
+    client = app.test_client()
+    client.post('/api/signup', json={'username': 'pat', 'email': 'pat@example.com', 'password': 'pw', 'role': 'patient'})
+    token = client.post('/api/login', json={'email': 'pat@example.com', 'password': 'pw'}).get_json()['token']
+    headers = {'Authorization': 'Bearer ' + token}
+    full = args.latency + args.chunk_delay * (args.chunks - 1)
+
+    start = time.perf_counter()
+    response = client.post('/api/assistant', json={'question': 'fever and cold'}, headers=headers)
+    blocking_ms = (time.perf_counter() - start) * 1000.0
+    check('blocking endpoint answers', response.status_code == 200)
+
+    start = time.perf_counter()
+    response = client.post('/api/assistant/stream', json={'question': 'headache since morning'},
+                           headers=headers, buffered=False)
+    events = iter(response.response)
+    first = next(events)
+    ttfb_ms = (time.perf_counter() - start) * 1000.0
+    body = first + b''.join(events)
+    total_ms = (time.perf_counter() - start) * 1000.0
+    response.close()
+    print(f'model: first chunk {args.latency * 1000:.0f}ms, full answer {full * 1000:.0f}ms')
+    print(f'blocking: {blocking_ms:.0f}ms to first byte | stream: {ttfb_ms:.0f}ms to first byte, {total_ms:.0f}ms total')
+    check('stream is text/event-stream', response.mimetype == 'text/event-stream')
+    check('stream ends with a done event', body.rstrip().endswith(b'event: done\ndata: {}'))
+    check('stream TTFB tracks the first chunk, not the full answer',
+          ttfb_ms < (args.latency + args.chunk_delay * 2) * 1000.0 < blocking_ms)
+
+    # Backpressure: read one event, then stall; upstream may run at most the
+    # buffer (plus the chunk being put) ahead of the reader
+    sent_before = backend.chunks_sent
+    response = client.post('/api/assistant/stream', json={'question': 'stomach pain after food'},
+                           headers=headers, buffered=False)
+    events = iter(response.response)
+    next(events)
+    time.sleep(args.chunk_delay * args.chunks)
+    produced = backend.chunks_sent - sent_before
+    print(f'stalled reader: read 1 chunk, upstream produced {produced} of {args.chunks}')
+    check('stalled reader pauses the upstream stream', produced <= 1 + args.buffer + 1 < args.chunks)
+
+    # Cancellation: closing the response closes the generators down to the gateway
+    cancelled_before = gateway.stats['streams_cancelled']
+    response.close()
+    time.sleep(args.chunk_delay * 4)
+    after_close = backend.chunks_sent
+    time.sleep(args.chunk_delay * args.chunks)
+    check('disconnect cancels the stream', gateway.stats['streams_cancelled'] == cancelled_before + 1)
+    check('no chunks are produced after the disconnect', backend.chunks_sent == after_close)
+
+    # Reader timeout: a reader that never comes back must not hold a slot
+    gateway.reader_timeout = args.reader_timeout
+    stalled_before = gateway.stats['streams_stalled']
+    response = client.post('/api/assistant/stream', json={'question': 'back pain when sitting'},
+                           headers=headers, buffered=False)
+    events = iter(response.response)
+    next(events)
+    time.sleep(args.chunk_delay * (args.buffer + 2) + args.reader_timeout + 0.2)
+    check('stalled reader is aborted after the reader timeout', gateway.stats['streams_stalled'] == stalled_before + 1)
+    check('aborted stream frees its concurrency slot', gateway._semaphore._value == gateway.concurrency)
+    rest = b''.join(events)
+    check('returning reader gets an error event', b'event: error' in rest)
+    response.close()
+    print(f'gateway stats: {gateway.snapshot()}')
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if failures:
+        sys.exit(f'{len(failures)} streaming check(s) failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Check the lab report OCR pool starts cleanly from a threaded (or gevent) web worker.
+
+    python perf/check_lab_pool.py
+    python perf/check_lab_pool.py --gevent
+
+Builds a ReportPool the way a web worker does, after other threads are
+already running, and checks that:
+
+  * pool processes come from a forkserver (spawn where there is none), not
+    a fork of this process
+  * a lock another thread holds while the pool starts is not inherited
+    locked by the pool processes, as it would be after a fork
+  * each pool process gets TESSERACT_CMD and the one-thread OpenMP limit
+  * a batch with duplicate files goes through the pool and yields one
+    result per file; without OpenCV and Tesseract every result is a
+    per-file error, which still makes the full round trip
+
+--gevent first patches the standard library the way gunicorn's gevent
+worker does, so the pool runs against greenlet threads and patched locks.
+Exits 1 on any failure; a hang past --timeout dumps the stacks and exits.
+"""
+import sys
+
+if __name__ == '__main__' and '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import faulthandler
+import os
+import threading
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+import lab_reports
+from lab_reports import ReportPool, START_METHOD
+
+# Pool processes import this module again; a forked one would get a copy of
+# the lock as the holding thread left it
+HELD = threading.Lock()
+
+failures = []
+
+
+def check(label, condition):
+    print(f'[{"ok" if condition else "FAIL":>4}] {label}')
+    if not condition:
+        failures.append(label)
+
+
+def worker_settings():
+    # Runs in a pool process
+    free = HELD.acquire(timeout=2)
+    if free:
+        HELD.release()
+    return {
+        'tesseract_cmd': lab_reports._tesseract_cmd,
+        'omp_thread_limit': os.environ.get('OMP_THREAD_LIMIT'),
+        'held_lock_free': free,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gevent', action='store_true', help='monkey-patch with gevent first')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    faulthandler.dump_traceback_later(args.timeout, exit=True)
+
+    # Another thread holds a lock while the pool starts, as a request or the
+    # chart flusher might in a web worker
+    release = threading.Event()
+
+    def hold():
+        with HELD:
+            release.wait()
+
+    holder = threading.Thread(target=hold, daemon=True)
+    holder.start()
+    time.sleep(0.1)
+
+    pool = ReportPool(workers=args.workers, tesseract_cmd='/opt/tesseract/bin/tesseract')
+    executor = pool._pool()
+    check(f'pool processes start with {START_METHOD}', executor._mp_context.get_start_method() == START_METHOD != 'fork')
+    settings = [executor.submit(worker_settings).result(timeout=args.timeout) for _ in range(args.workers)]
+    release.set()
+    print(f'pool process settings: {settings[0]}')
+    check('a lock held during pool start is free in the pool processes',
+          all(s['held_lock_free'] for s in settings))
+    check('pool processes get TESSERACT_CMD',
+          all(s['tesseract_cmd'] == '/opt/tesseract/bin/tesseract' for s in settings))
+    check('pool processes limit OpenMP to one thread', all(s['omp_thread_limit'] == '1' for s in settings))
+
+    files = [('a.png', b'not an image'), ('b.png', b'also not an image'), ('a-copy.png', b'not an image')]
+    started = time.perf_counter()
+    results = dict(pool.process(files))
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    print(f'batch of {len(files)}: {elapsed_ms:.0f}ms, first result {results.get(0)}')
+    check('batch yields one result per file', sorted(results) == list(range(len(files))))
+    check('results keep their file names', [results[i]['file'] for i in sorted(results)] == [name for name, _ in files])
+    check('unreadable files are reported per file', all('error' in result for result in results.values()))
+    pool.close()
+
+    faulthandler.cancel_dump_traceback_later()
+    if failures:
+        sys.exit(f'{len(failures)} lab pool check(s) failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Run every API route against seeded data and check its SQL query budget.
+
+    python perf/check_query_budgets.py
+    python perf/check_query_budgets.py --appointments 50000 --verbose
+
+Seeds a throwaway SQLite database with seed.py, boots the app and sends one
+or more requests to every route in app.url_map, each twice (the first call
+may create default rows, the second is the steady state). The first call
+also starts with an empty identity cache, so the profile id lookup every
+request makes after IDENTITY_CACHE_TTL expires is counted. A route fails if
+it declares no @query_budget, has no scenario here, or issues more SQL
+statements than its budget; overruns print the statements, grouped so an
+N+1 shows up as one line repeated N times, with the line of our code that
+issued them. Exits 1 on any failure.
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+workdir = tempfile.mkdtemp(prefix='query-budgets-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+os.environ['ASSISTANT_BACKEND'] = 'stub'
+os.environ['ASSISTANT_CACHE_PATH'] = ''
+os.environ['LAB_REPORT_CACHE_PATH'] = ''
+# The decorators stay quiet; budgets are measured here instead
+os.environ['QUERY_BUDGET_MODE'] = 'off'
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCTORS, PATIENTS = 10, 200
+# Spans several VITALS_INGEST_CHUNK chunks
+VITALS_NDJSON = ''.join(
+    json.dumps({'recorded_at': (datetime(2024, 3, 1) + timedelta(minutes=i)).isoformat(), 'heart_rate': 60 + i % 40}) + '\n'
+    for i in range(2500)
+)
+
+
+def scenarios(users):
+    # (rule, method, role, request kwargs); 'path' overrides the rule as URL
+    return [
+        ('/api/signup', 'POST', None, {'json': {'username': 'new', 'email': 'new@example.com',
+                                                'password': 'pw', 'role': 'patient'}}),
+        ('/api/login', 'POST', None, {'json': {'email': 'doctor1@example.com', 'password': 'password'}}),
+        ('/api/dashboard', 'GET', 'doctor', {}),
+        ('/api/dashboard', 'GET', 'patient', {}),
+        ('/api/patient-info', 'POST', 'patient', {'json': {'age': 40, 'gender': 'female', 'weight': 60}}),
+        ('/api/appointments', 'POST', None, {'json': {'patient_id': 1, 'doctor_id': 1,
+                                                      'appointment_date': '2024-05-01 10:00'}}),
+        ('/api/appointments/<int:user_id>', 'GET', None, {'path': f'/api/appointments/{users["doctor"]}?limit=50'}),
+        ('/api/appointments/<int:user_id>', 'GET', None, {'path': f'/api/appointments/{users["patient"]}?limit=50'}),
+        ('/api/doctor/profile', 'GET', 'doctor', {}),
+        ('/api/doctor/profile', 'GET', 'fresh doctor', {}),
+        ('/api/doctor/profile', 'PUT', 'doctor', {'json': {'specialization': 'ENT'}}),
+        ('/api/doctor/charts', 'GET', 'doctor', {}),
+        ('/api/doctor/charts', 'GET', 'fresh doctor', {}),
+        ('/api/doctor/charts/update', 'POST', 'doctor', {'json': {'time_slot': '9 AM', 'disease_name': 'Fever'}}),
+        ('/api/doctor/charts/events', 'POST', 'doctor', {'json': {'events': [
+            {'time_slot': slot, 'disease_name': disease}
+            for slot in ('9 AM', '10 AM', '11 AM', '12 PM') for disease in ('Fever', 'Others', 'Diabetes')]}}),
+        ('/api/patient/profile', 'GET', 'patient', {}),
+        ('/api/patient/profile', 'PUT', 'patient', {'json': {'age': 41}}),
+        ('/api/patient/vitals', 'GET', 'patient', {}),
+        ('/api/patient/vitals', 'POST', 'patient', {'json': {'heart_rate': 72, 'blood_pressure': '120/80'}}),
+        ('/api/patient/vitals/bulk', 'POST', 'patient', {'data': VITALS_NDJSON,
+                                                         'content_type': 'application/x-ndjson'}),
+        ('/api/patient/vitals/range', 'GET', 'patient', {'path': '/api/patient/vitals/range?metric=heart_rate'}),
+        ('/api/assistant', 'POST', 'patient', {'json': {'question': 'fever and cough'}}),
+        ('/api/assistant/stream', 'POST', 'patient', {'json': {'question': 'headache'}}),
+        ('/api/lab-reports', 'POST', 'patient', {'data': {'reports': (io.BytesIO(b'not an image'), 'r.png')},
+                                                 'content_type': 'multipart/form-data'}),
+        ('/api/doctor/lab-panel', 'GET', 'doctor', {}),
+        ('/api/assistant/stats', 'GET', 'admin', {}),
+        ('/api/cache/stats', 'GET', 'admin', {}),
+        ('/api/pool/stats', 'GET', 'admin', {}),
+        ('/metrics', 'GET', None, {}),
+        ('/api/metrics/slow-queries', 'GET', 'admin', {}),
+        ('/api/admin/export/<table>', 'GET', 'admin', {'path': '/api/admin/export/appointment?format=ndjson'}),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=20000)
+    parser.add_argument('--verbose', action='store_true', help='print the statements of every route')
+    args = parser.parse_args()
+
+    subprocess.run([
+        sys.executable, os.path.join(BACKEND, 'seed.py'), '--database-url', os.environ['DATABASE_URL'],
+        '--doctors', str(DOCTORS), '--patients', str(PATIENTS), '--appointments', str(args.appointments),
+        '--years', '1',
+    ], check=True, cwd=BACKEND, stdout=subprocess.DEVNULL)
+
+    from app import create_app, db
+    from identity import profile_cache
+    from models import User
+    from query_budget import QueryBudget
+    from sqlalchemy import insert
+
+    app = create_app()
+    with app.app_context():
+        db.session.execute(insert(User), [{'username': 'admin', 'email': 'admin@example.com',
+                                           'password': 'password', 'role': 'admin'}])
+        db.session.commit()
+    client = app.test_client()
+    tokens, users = {}, {}
+    for role, email in (('doctor', 'doctor1@example.com'), ('patient', 'patient1@example.com'),
+                        ('admin', 'admin@example.com')):
+        login = client.post('/api/login', json={'email': email, 'password': 'password'}).get_json()
+        tokens[role], users[role] = login['token'], login['user']['id']
+    # A doctor with no chart rows yet, for the first-access paths
+    client.post('/api/signup', json={'username': 'fresh', 'email': 'fresh@example.com',
+                                     'password': 'password', 'role': 'doctor'})
+    login = client.post('/api/login', json={'email': 'fresh@example.com', 'password': 'password'}).get_json()
+    tokens['fresh doctor'], users['fresh doctor'] = login['token'], login['user']['id']
+
+    endpoints = {rule.rule: rule.endpoint for rule in app.url_map.iter_rules()}
+    failures = []
+    covered = set()
+    for rule, method, role, kwargs in scenarios(users):
+        kwargs = dict(kwargs)
+        path = kwargs.pop('path', rule)
+        limit = getattr(app.view_functions[endpoints[rule]], 'query_budget', None)
+        covered.add((rule, method))
+        headers = {'Authorization': 'Bearer ' + tokens[role]} if role else {}
+        counts, statuses, worst = [], [], None
+        for attempt in range(2):
+            if attempt == 0:
+                # Cold path: the profile id is read from the database again.
+                # Per-request state on flask.g starts empty with each request.
+                profile_cache.clear()
+            if isinstance(kwargs.get('data'), dict):
+                # Uploaded files are consumed by the first request
+                kwargs['data'] = {key: (io.BytesIO(b'not an image'), name) for key, (_, name) in kwargs['data'].items()}
+            with QueryBudget(limit, f'{method} {path} as {role or "anonymous"}', strict=False, trace=True) as budget:
+                response = client.open(path, method=method, headers=headers, **kwargs)
+                response.get_data()
+            counts.append(budget.count)
+            statuses.append(response.status_code)
+            if worst is None or budget.count > worst.count:
+                worst = budget
+        status = '/'.join(map(str, statuses))
+        label = f'{method:<4} {path[:50]:<50} {role or "-":<12}'
+        if limit is None:
+            failures.append(f'{method} {rule}: no @query_budget')
+            print(f'[FAIL] {label} statements={counts} no budget declared (status {status})')
+        elif worst.exceeded:
+            failures.append(f'{method} {rule}: {max(counts)} statements, budget {limit}')
+            print(f'[FAIL] {label} statements={counts} budget={worst.limit} (status {status})')
+            print(worst.report())
+        else:
+            print(f'[  ok] {label} statements={counts} budget={worst.limit} (status {status})')
+        if args.verbose:
+            print(worst.report())
+
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (rule.rule, method) not in covered:
+                failures.append(f'{method} {rule.rule}: no scenario in check_query_budgets.py')
+                print(f'[FAIL] {method} {rule.rule}: no scenario')
+
+    if failures:
+        print(f'{len(failures)} failure(s):')
+        for failure in failures:
+            print('  ' + failure)
+        sys.exit(1)
+    print('all routes within budget')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
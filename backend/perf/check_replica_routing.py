@@ -0,0 +1,108 @@
+"""Check read/write routing with two local SQLite files as primary and replica.
+
+    python perf/check_replica_routing.py
+
+"Replication" is a file copy from primary to replica, so the script controls
+exactly how far the replica lags. It boots the real app with
+DATABASE_REPLICA_URLS pointing at the copy and checks that:
+
+  * writes, and reads inside the sticky window after a write, hit the primary
+  * read-only GETs outside the window are served by the replica
+  * GETs on views without @replica_reads never touch the replica
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+workdir = tempfile.mkdtemp(prefix='replica-check-')
+primary_path = os.path.join(workdir, 'primary.db')
+replica_path = os.path.join(workdir, 'replica.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + primary_path
+os.environ['DATABASE_REPLICA_URLS'] = 'sqlite:///' + replica_path
+os.environ['DB_REPLICA_STICKY_SECONDS'] = '1'
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from sqlalchemy import event, insert
+from app import create_app, db
+from migrations import upgrade
+from models import User
+
+app = create_app()
+
+failures = []
+
+
+def check(label, condition):
+    print(f'[{"ok" if condition else "FAIL":>4}] {label}')
+    if not condition:
+        failures.append(label)
+
+
+def main():
+    with app.app_context():
+        upgrade(db.engine)
+        # Pool stats are admin-only; signup does not create admins
+        db.session.execute(insert(User), [{'username': 'admin', 'email': 'admin@example.com',
+                                           'password': 'pw', 'role': 'admin'}])
+        db.session.commit()
+        primary, replica = db.engine, app.extensions['db_replicas'][0]
+    hits = {'primary': 0, 'replica': 0}
+    event.listen(primary, 'before_cursor_execute', lambda *a: hits.__setitem__('primary', hits['primary'] + 1))
+    event.listen(replica, 'before_cursor_execute', lambda *a: hits.__setitem__('replica', hits['replica'] + 1))
+
+    def request(method, path, **kwargs):
+        hits['primary'] = hits['replica'] = 0
+        response = getattr(client, method)(path, **kwargs)
+        return response, dict(hits)
+
+    client = app.test_client()
+    request('post', '/api/signup', json={'username': 'doc', 'email': 'doc@example.com', 'password': 'pw', 'role': 'doctor'})
+    response, _ = request('post', '/api/login', json={'email': 'doc@example.com', 'password': 'pw'})
+    headers = {'Authorization': 'Bearer ' + response.get_json()['token']}
+
+    # The replica file does not exist yet: a replica read would fail loudly
+    response, hits_ = request('get', '/api/dashboard', headers=headers)
+    check('read inside sticky window after signup uses the primary',
+          response.status_code == 200 and hits_['replica'] == 0)
+
+    # Replicate, then let the sticky window lapse
+    replica.dispose()
+    shutil.copyfile(primary_path, replica_path)
+    time.sleep(1.2)
+    response, hits_ = request('get', '/api/dashboard', headers=headers)
+    check('read-only GET outside the window uses the replica',
+          response.status_code == 200 and hits_['replica'] > 0 and hits_['primary'] == 0)
+
+    response, hits_ = request('post', '/api/doctor/charts/update', headers=headers,
+                              json={'time_slot': '9 AM', 'disease_name': 'Fever'})
+    check('write goes to the primary', response.status_code == 200 and hits_['replica'] == 0)
+
+    response, hits_ = request('get', '/api/doctor/charts', headers=headers)
+    check("user's read right after their write uses the primary",
+          response.status_code == 200 and hits_['replica'] == 0
+          and response.get_json()['patient_flow'][0]['patients'] == 1)
+
+    time.sleep(1.2)
+    response, hits_ = request('get', '/api/doctor/profile', headers=headers)
+    check('profile GET outside the window uses the replica',
+          response.status_code == 200 and hits_['replica'] > 0 and hits_['primary'] == 0)
+
+    response, hits_ = request('put', '/api/doctor/profile', headers=headers, json={'specialization': 'ENT'})
+    check('profile PUT on a @replica_reads view stays on the primary',
+          response.status_code == 200 and hits_['replica'] == 0)
+
+    response, _ = request('post', '/api/login', json={'email': 'admin@example.com', 'password': 'pw'})
+    admin_headers = {'Authorization': 'Bearer ' + response.get_json()['token']}
+    response, hits_ = request('get', '/api/pool/stats', headers=admin_headers)
+    check('views without @replica_reads never touch the replica',
+          response.status_code == 200 and hits_['replica'] == 0 and 'replicas' in response.get_json())
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if failures:
+        sys.exit(f'{len(failures)} routing check(s) failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Check the shared (Redis) response cache against fakeredis: hits, TTL, invalidation.
+
+    python perf/check_response_cache.py
+    python perf/check_response_cache.py --ttl 2
+
+Boots the real app with RESPONSE_CACHE_CLIENT set to a fakeredis client, so
+the RedisBackend serves the chart and doctor profile views, and checks that:
+
+  * the first GET misses and stores the payload, the second is a hit
+  * the stored entry is visible to another client of the same server, as it
+    would be to another worker, and expires after RESPONSE_CACHE_TTL
+  * chart updates, direct and write-behind, and profile PUTs delete the
+    entry, so the next GET misses and shows the new data
+
+Needs fakeredis (pip install fakeredis); exits 1 on any failure.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+workdir = tempfile.mkdtemp(prefix='response-cache-check-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+os.environ['ASSISTANT_BACKEND'] = 'stub'
+os.environ['ASSISTANT_CACHE_PATH'] = ''
+os.environ['LAB_REPORT_CACHE_PATH'] = ''
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from datetime import datetime
+from app import create_app, db
+from chart_buffer import chart_buffer
+from migrations import upgrade
+from response_cache import response_cache, charts_key, doctor_profile_key
+
+failures = []
+
+
+def check(label, condition):
+    print(f'[{"ok" if condition else "FAIL":>4}] {label}')
+    if not condition:
+        failures.append(label)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ttl', type=int, default=1, help='RESPONSE_CACHE_TTL in seconds')
+    args = parser.parse_args()
+
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit('fakeredis is not installed (pip install fakeredis)')
+    server = fakeredis.FakeServer()
+    app = create_app({'RESPONSE_CACHE_CLIENT': fakeredis.FakeRedis(server=server),
+                      'RESPONSE_CACHE_TTL': args.ttl})
+    # A second client of the same server, standing in for another worker
+    other = fakeredis.FakeRedis(server=server)
+    backend = response_cache.backend
+    check('RESPONSE_CACHE_CLIENT selects the Redis backend', type(backend).__name__ == 'RedisBackend')
+    with app.app_context():
+        upgrade(db.engine)
+
+    client = app.test_client()
+    client.post('/api/signup', json={'username': 'doc', 'email': 'doc@example.com', 'password': 'pw', 'role': 'doctor'})
+    login = client.post('/api/login', json={'email': 'doc@example.com', 'password': 'pw'}).get_json()
+    headers = {'Authorization': 'Bearer ' + login['token']}
+    user_id = login['user']['id']
+    client.put('/api/doctor/profile', headers=headers, json={'specialization': 'General'})
+
+    def get(path, key):
+        hits, misses = backend.hits, backend.misses
+        response = client.get(path, headers=headers)
+        return response, backend.hits - hits, backend.misses - misses, other.exists(backend.prefix + key)
+
+    for label, path, key in (('charts', '/api/doctor/charts', charts_key(1, datetime.now().date())),
+                             ('doctor profile', '/api/doctor/profile', doctor_profile_key(user_id))):
+        other.delete(backend.prefix + key)
+        response, hits, misses, stored = get(path, key)
+        check(f'{label}: first GET misses and stores the payload',
+              response.status_code == 200 and (hits, misses) == (0, 1) and stored)
+        first = response.get_json()
+        response, hits, misses, _ = get(path, key)
+        check(f'{label}: second GET is a hit with the same body',
+              response.status_code == 200 and (hits, misses) == (1, 0) and response.get_json() == first)
+        check(f'{label}: entry carries the TTL', 0 < other.ttl(backend.prefix + key) <= args.ttl)
+        time.sleep(args.ttl + 0.2)
+        response, hits, misses, _ = get(path, key)
+        check(f'{label}: entry expires after the TTL', response.status_code == 200 and (hits, misses) == (0, 1))
+
+    key = charts_key(1, datetime.now().date())
+    client.post('/api/doctor/charts/update', headers=headers, json={'time_slot': '9 AM', 'disease_name': 'Fever'})
+    check('chart update deletes the charts entry', not other.exists(backend.prefix + key))
+    response, hits, misses, _ = get('/api/doctor/charts', key)
+    check('next charts GET misses and shows the update',
+          (hits, misses) == (0, 1) and response.get_json()['patient_flow'][0]['patients'] == 1)
+
+    # Write-behind: the entry goes when the buffered clicks are flushed
+    app.config['CHART_WRITE_BEHIND'] = True
+    client.post('/api/doctor/charts/update', headers=headers, json={'time_slot': '9 AM', 'disease_name': 'Fever'})
+    check('buffered click leaves the entry until the flush', other.exists(backend.prefix + key))
+    chart_buffer.flush()
+    check('flush deletes the charts entry', not other.exists(backend.prefix + key))
+    response, hits, misses, _ = get('/api/doctor/charts', key)
+    check('next charts GET shows the flushed click',
+          (hits, misses) == (0, 1) and response.get_json()['patient_flow'][0]['patients'] == 2)
+    app.config['CHART_WRITE_BEHIND'] = False
+    chart_buffer.close()
+
+    key = doctor_profile_key(user_id)
+    get('/api/doctor/profile', key)
+    client.put('/api/doctor/profile', headers=headers, json={'specialization': 'ENT'})
+    check('profile PUT deletes the profile entry', not other.exists(backend.prefix + key))
+    response, hits, misses, _ = get('/api/doctor/profile', key)
+    check('next profile GET misses and shows the update',
+          (hits, misses) == (0, 1) and response.get_json()['specialization'] == 'ENT')
+    print(f'cache stats: {response_cache.stats()}')
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if failures:
+        sys.exit(f'{len(failures)} response cache check(s) failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import tempfile
+from contextlib import contextmanager
+
+# Benchmarks run from backend/ or backend/perf/; both need the backend modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+from models import db
+from migrations import upgrade
+
+
+def make_app(uri=None, engine_options=None):
+    # A bare Flask app bound to the shared models, defaulting to a throwaway
+    # SQLite file so benchmarks never touch the real database
+    if uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db', prefix='bench-')
+        os.close(fd)
+        uri = 'sqlite:///' + path
+    app = Flask('perf')
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if engine_options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    db.init_app(app)
+    return app
+
+
+def create_schema():
+    # Build the schema the same way production does, through the migrations
+    upgrade(db.engine)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.parameters = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    def __enter__(self):
+        self.statements = []
+        self.parameters = []
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@contextmanager
+def timed(samples):
+    start = time.perf_counter()
+    yield
+    samples.append((time.perf_counter() - start) * 1000.0)
@@ -0,0 +1,160 @@
+"""Assert that every hot endpoint query is answered from an index.
+
+    python perf/explain_indexes.py --appointments 1000000
+
+Builds the schema through the migrations, seeds a large appointment table,
+then sends a request to each hot endpoint through the real app and runs
+EXPLAIN on every SELECT, UPDATE and DELETE it issued. The statements are
+captured from the routes, so the report follows the code. Inserts and
+upserts are listed but not explained. Each request starts with an empty
+identity cache, so the profile id lookup is checked too. Exits non-zero if
+any statement scans a table instead of searching an index.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta, date
+
+from common import create_schema, StatementCounter
+from sqlalchemy import insert
+from models import (
+    db, User, Doctor, Patient, Appointment, Prescription, PatientFlow, DiseaseDistribution
+)
+from pagination import encode_cursor
+
+DOCTORS = 200
+PATIENTS = 50000
+
+
+def seed(appointments):
+    db.session.execute(insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password',
+         'role': 'doctor' if i < DOCTORS else 'patient'}
+        for i in range(DOCTORS + PATIENTS)
+    ])
+    db.session.execute(insert(Doctor), [{'user_id': i + 1} for i in range(DOCTORS)])
+    db.session.execute(insert(Patient), [{'user_id': DOCTORS + i + 1} for i in range(PATIENTS)])
+    start = datetime(2018, 1, 1)
+    for offset in range(0, appointments, 50000):
+        db.session.execute(insert(Appointment), [{
+            'doctor_id': random.randint(1, DOCTORS),
+            'patient_id': random.randint(1, PATIENTS),
+            'appointment_date': start + timedelta(minutes=random.randint(0, 4_000_000)),
+            'status': 'completed',
+        } for _ in range(min(50000, appointments - offset))])
+    db.session.execute(insert(Prescription), [
+        {'doctor_id': random.randint(1, DOCTORS), 'patient_id': random.randint(1, PATIENTS)}
+        for _ in range(appointments // 10)
+    ])
+    db.session.execute(insert(PatientFlow), [
+        {'doctor_id': d, 'date': date.today() - timedelta(days=day), 'time_slot': slot, 'patient_count': 1}
+        for d in range(1, DOCTORS + 1) for day in range(30) for slot in ('9 AM', '10 AM', '11 AM')
+    ])
+    db.session.execute(insert(DiseaseDistribution), [
+        {'doctor_id': d, 'disease_name': name, 'patient_count': random.randint(0, 100)}
+        for d in range(1, DOCTORS + 1) for name in ('Fever', 'Cold & Flu', 'Diabetes', 'Blood Pressure', 'Others')
+    ])
+    db.session.commit()
+
+
+# (name, method, path, role, request kwargs) for each hot endpoint. Users
+# 1..DOCTORS are doctors; the first patient is user DOCTORS + 1.
+def endpoint_requests():
+    patient_user = DOCTORS + 1
+    cursor = encode_cursor(datetime(2020, 1, 1), 0)
+    return [
+        ('login', 'POST', '/api/login', None, {'json': {'email': 'user0@example.com', 'password': 'password'}}),
+        ('dashboard (doctor)', 'GET', '/api/dashboard', 'doctor', {}),
+        ('dashboard (patient)', 'GET', '/api/dashboard', 'patient', {}),
+        ('appointments (doctor)', 'GET', '/api/appointments/1?limit=50', None, {}),
+        ('appointments (patient, cursor)', 'GET', f'/api/appointments/{patient_user}?limit=50&cursor={cursor}',
+         None, {}),
+        ('doctor profile', 'GET', '/api/doctor/profile', 'doctor', {}),
+        ('patient profile', 'GET', '/api/patient/profile', 'patient', {}),
+        ('charts', 'GET', '/api/doctor/charts', 'doctor', {}),
+        ('charts/update', 'POST', '/api/doctor/charts/update', 'doctor',
+         {'json': {'time_slot': '9 AM', 'disease_name': 'Fever'}}),
+        ('charts/events', 'POST', '/api/doctor/charts/events', 'doctor',
+         {'json': {'events': [{'time_slot': '10 AM', 'disease_name': 'Diabetes'}]}}),
+        ('vitals', 'GET', '/api/patient/vitals', 'patient', {}),
+        ('vitals/range', 'GET', '/api/patient/vitals/range?metric=heart_rate', 'patient', {}),
+    ]
+
+
+def sqlite_plan_problems(conn, statement, parameters):
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    details = [row[-1] for row in rows]
+    # "SCAN t" without "USING ... INDEX" is a full table scan
+    return [d for d in details if re.match(r'SCAN \w+$', d.strip())], details
+
+
+def mysql_plan_problems(conn, statement, parameters):
+    rows = conn.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+    problems = [
+        f"{row['table']}: type={row['type']} key={row['key']}" for row in rows
+        if row['table'] and not str(row['table']).startswith('<') and (row['type'] == 'ALL' or row['key'] is None)
+    ]
+    return problems, [f"{row['table']}: {row['type']} via {row['key']}" for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--appointments', type=int, default=1_000_000)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse an already seeded database')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + tempfile.mkstemp(suffix='.db', prefix='bench-')[1]
+    os.environ['ASSISTANT_BACKEND'] = 'stub'
+    os.environ['ASSISTANT_CACHE_PATH'] = ''
+    os.environ['LAB_REPORT_CACHE_PATH'] = ''
+    os.environ['QUERY_BUDGET_MODE'] = 'off'
+    from app import create_app
+    from identity import profile_cache
+
+    app = create_app()
+    failures = 0
+    with app.app_context():
+        create_schema()
+        if not args.skip_seed:
+            seed(args.appointments)
+        engine = db.engine
+    explain = mysql_plan_problems if engine.dialect.name == 'mysql' else sqlite_plan_problems
+
+    client = app.test_client()
+    headers = {}
+    for role, email in (('doctor', 'user0@example.com'), ('patient', f'user{DOCTORS}@example.com')):
+        token = client.post('/api/login', json={'email': email, 'password': 'password'}).get_json()['token']
+        headers[role] = {'Authorization': 'Bearer ' + token}
+
+    for name, method, path, role, kwargs in endpoint_requests():
+        profile_cache.clear()
+        with StatementCounter(engine) as captured:
+            response = client.open(path, method=method, headers=headers.get(role, {}), **kwargs)
+            response.get_data()
+        if response.status_code >= 400:
+            failures += 1
+            print(f'[FAIL] {name}: {method} {path} answered {response.status_code}')
+            continue
+        with engine.connect() as conn:
+            for statement, parameters in zip(captured.statements, captured.parameters):
+                verb = statement.lstrip().split(None, 1)[0].upper()
+                if verb not in ('SELECT', 'UPDATE', 'DELETE'):
+                    print(f'[  ok] {name}: {verb} (not explained)')
+                    continue
+                problems, plan = explain(conn, statement, parameters)
+                status = 'FAIL' if problems else 'ok'
+                failures += bool(problems)
+                print(f'[{status:>4}] {name}: {" | ".join(plan)}')
+                if args.verbose or problems:
+                    print('       ' + ' '.join(statement.split()))
+    if failures:
+        sys.exit(f'{failures} statement(s) not using an index')
+
+
+if __name__ == '__main__':
+    main()
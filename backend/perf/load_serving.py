@@ -0,0 +1,261 @@
+"""Compare serving modes under hundreds of concurrent dashboard users.
+
+    python perf/load_serving.py --users 500 --duration 30
+    python perf/load_serving.py --modes dev,gthread --workers 4 --output perf/serving.json
+    python perf/load_serving.py --database-url mysql+pymysql://user:pw@localhost/healthcare --doctors 500
+
+Seeds a throwaway SQLite database with seed.py unless --database-url is
+given (it must then hold seed.py data with at least --doctors doctors and
+--patients patients), then starts each mode in turn on a free local port:
+
+  dev      the current setup, app.run(debug=True): werkzeug's development
+           server, one process, a thread per request (no reloader)
+  gthread  gunicorn -c gunicorn.conf.py, WEB_WORKER_CLASS=gthread
+  gevent   gunicorn -c gunicorn.conf.py, WEB_WORKER_CLASS=gevent
+
+and runs --users concurrent users against it. Each user logs in as a random
+seeded doctor or patient, then loads /api/dashboard in a loop with
+exponential think time (--think-ms) over a keep-alive connection. Users
+start over --ramp seconds and only requests issued after the ramp count.
+They are asyncio tasks in this process, so the load generator stays cheap
+next to the server; on a small machine it still shares the CPU with it.
+Reports sustained requests/s, errors and p50/p95/p99 latency per mode.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import percentile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('dev', 'gthread', 'gevent')
+DEV_SERVER = ("from app import create_app; "
+              "create_app().run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)")
+
+
+class Connection:
+    # Minimal HTTP/1.1 client; reconnects when the server closes the connection
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, token=None):
+        reused = self.writer is not None
+        try:
+            return await self._request(method, path, body, token)
+        except (ConnectionError, asyncio.IncompleteReadError, IndexError):
+            # The server may close an idle keep-alive connection between two
+            # requests; like any HTTP client, retry those once on a new one
+            if not reused:
+                raise
+            return await self._request(method, path, body, token)
+
+    async def _request(self, method, path, body, token):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b''
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(data)}']
+        if body is not None:
+            head.append('Content-Type: application/json')
+        if token:
+            head.append('Authorization: Bearer ' + token)
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + data)
+        try:
+            status = int((await self.reader.readline()).split()[1])
+            headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if 'content-length' in headers:
+                payload = await self.reader.readexactly(int(headers['content-length']))
+            else:
+                payload = await self.reader.read()
+                headers['connection'] = 'close'
+        except Exception:
+            self.close()
+            raise
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def dashboard_user(host, port, args, rng, measure_from, deadline, samples, errors):
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    doctor = rng.random() < args.doctor_share
+    email = f'{"doctor" if doctor else "patient"}{rng.randint(1, args.doctors if doctor else args.patients)}@example.com'
+    conn = Connection(host, port)
+    try:
+        status, payload = await asyncio.wait_for(
+            conn.request('POST', '/api/login', {'email': email, 'password': 'password'}), args.timeout)
+        token = json.loads(payload)['token'] if status == 200 else None
+    except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        token = None
+    if token is None:
+        errors['login'] += 1
+        conn.close()
+        return
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status, _ = await asyncio.wait_for(conn.request('GET', '/api/dashboard', token=token), args.timeout)
+            ok = status == 200
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            conn.close()
+            ok = False
+        if started >= measure_from and time.perf_counter() <= deadline:
+            samples.append((time.perf_counter() - started) * 1000.0)
+            if not ok:
+                errors['dashboard'] += 1
+        if args.think_ms:
+            await asyncio.sleep(rng.expovariate(1000.0 / args.think_ms))
+    conn.close()
+
+
+async def run_users(port, args):
+    samples, errors = [], {'login': 0, 'dashboard': 0}
+    rng = random.Random(args.seed)
+    measure_from = time.perf_counter() + args.ramp
+    deadline = measure_from + args.duration
+    await asyncio.gather(*[
+        dashboard_user('127.0.0.1', port, args, random.Random(rng.random()), measure_from, deadline, samples, errors)
+        for _ in range(args.users)
+    ])
+    return samples, errors
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, args, env, log):
+    env = dict(env)
+    if mode == 'dev':
+        command = [sys.executable, '-c', DEV_SERVER.format(port=port)]
+    else:
+        env['WEB_WORKER_CLASS'] = mode
+        if args.workers:
+            env['WEB_WORKERS'] = str(args.workers)
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}',
+                   'app:create_app()']
+    server = subprocess.Popen(command, cwd=BACKEND, env=env, stdout=log, stderr=subprocess.STDOUT)
+    # Ready once the port accepts; until a worker is up, requests wait in the
+    # listen backlog, and the ramp absorbs that
+    for _ in range(300):
+        if server.poll() is not None:
+            log.seek(0)
+            sys.exit(f'{mode} server exited:\n{log.read().decode()[-2000:]}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                break
+        except OSError:
+            time.sleep(0.1)
+    else:
+        server.kill()
+        sys.exit(f'{mode} server did not start')
+    return server
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated: dev, gthread, gevent')
+    parser.add_argument('--users', type=int, default=500, help='concurrent dashboard users')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds, after the ramp')
+    parser.add_argument('--ramp', type=float, default=10, help='seconds over which users start')
+    parser.add_argument('--think-ms', type=float, default=1000, help="mean pause between a user's requests")
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a request counts as failed')
+    parser.add_argument('--workers', type=int, help='WEB_WORKERS for the gunicorn modes')
+    parser.add_argument('--database-url', help='seeded database to serve (default: a freshly seeded SQLite file)')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=100000)
+    parser.add_argument('--doctor-share', type=float, default=0.3)
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--seed', type=int, default=24)
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f'unknown mode {mode}')
+
+    workdir = tempfile.mkdtemp(prefix='load-serving-')
+    try:
+        url = args.database_url
+        if not url:
+            url = 'sqlite:///' + os.path.join(workdir, 'app.db')
+            print(f'seeding {url}')
+            subprocess.run([
+                sys.executable, os.path.join(BACKEND, 'seed.py'), '--database-url', url,
+                '--doctors', str(args.doctors), '--patients', str(args.patients),
+                '--appointments', str(args.appointments), '--years', '1',
+            ], check=True, cwd=BACKEND, stdout=subprocess.DEVNULL)
+        env = dict(os.environ, DATABASE_URL=url, ASSISTANT_BACKEND='stub', ASSISTANT_CACHE_PATH='',
+                   LAB_REPORT_CACHE_PATH='', QUERY_BUDGET_MODE='off')
+
+        results = {}
+        for mode in modes:
+            port = free_port()
+            # The dev server logs every request; a file keeps it from blocking
+            with open(os.path.join(workdir, mode + '.log'), 'w+b') as log:
+                server = start_server(mode, port, args, env, log)
+                try:
+                    samples, errors = asyncio.run(run_users(port, args))
+                finally:
+                    stop_server(server)
+            results[mode] = {
+                'requests': len(samples),
+                'errors': errors['dashboard'],
+                'login_errors': errors['login'],
+                'rps': round(len(samples) / args.duration, 1),
+                'p50_ms': round(percentile(samples, 50), 1),
+                'p95_ms': round(percentile(samples, 95), 1),
+                'p99_ms': round(percentile(samples, 99), 1),
+            }
+            print(f'{mode:<8} done: {results[mode]}')
+
+        print(f'\n{args.users} dashboard users, {args.think_ms:.0f}ms mean think time, {args.duration:.0f}s measured, '
+              f'{os.cpu_count()} cores')
+        print(f'{"mode":<8} {"req/s":>8} {"errors":>7} {"p50":>9} {"p95":>9} {"p99":>9}')
+        for mode, stats in results.items():
+            print(f'{mode:<8} {stats["rps"]:8.1f} {stats["errors"] + stats["login_errors"]:7d} '
+                  f'{stats["p50_ms"]:7.1f}ms {stats["p95_ms"]:7.1f}ms {stats["p99_ms"]:7.1f}ms')
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'meta': {'users': args.users, 'think_ms': args.think_ms, 'duration': args.duration,
+                             'workers': args.workers, 'cpus': os.cpu_count(), 'python': platform.python_version()},
+                    'modes': results,
+                }, f, indent=2)
+            print(f'saved {args.output}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Load-test the API with a realistic user mix and check for latency regressions.
+
+    python perf/load_test.py --users 20 --duration 30 --output perf/results.json
+    python perf/load_test.py --users 20 --duration 30 --baseline perf/baseline.json --threshold 0.25
+    python perf/load_test.py --url http://localhost:5000 --doctors 500 --patients 200000
+    python perf/load_test.py --compare perf/results.json --baseline perf/baseline.json
+
+Without --url the app is booted in-process on a local port (werkzeug's
+threaded server) against --database-url, which defaults to a throwaway
+SQLite file filled by seed.py. A given --database-url, or the database
+behind a server given with --url (gunicorn, say), must already have been
+filled by seed.py with at least --doctors doctors and --patients patients.
+
+Each virtual user logs in as a random seeded doctor or patient, then loops
+over that role's weighted mix of requests with exponential think time:
+
+  doctor   dashboard, charts, charts/update, profile, appointments
+  patient  dashboard, profile, vitals (read and write), vitals range,
+           appointments
+
+Per endpoint it reports requests/s, errors and p50/p95/p99 latency, and
+saves them as JSON with --output. With --baseline, an endpoint regresses
+when its p95 or p99 grows, or its throughput drops, by more than
+--threshold (and the latency by at least --min-delta-ms, which keeps
+sub-millisecond noise out); any regression or new error makes the exit
+status 1 so the run can gate CI.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from common import percentile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, method, path, weight); {user_id} is filled in per user
+DOCTOR_MIX = [
+    ('dashboard', 'GET', '/api/dashboard', 30),
+    ('doctor charts', 'GET', '/api/doctor/charts', 25),
+    ('doctor charts/update', 'POST', '/api/doctor/charts/update', 10),
+    ('doctor profile', 'GET', '/api/doctor/profile', 10),
+    ('appointments', 'GET', '/api/appointments/{user_id}', 25),
+]
+PATIENT_MIX = [
+    ('dashboard', 'GET', '/api/dashboard', 30),
+    ('patient profile', 'GET', '/api/patient/profile', 15),
+    ('vitals', 'GET', '/api/patient/vitals', 15),
+    ('vitals POST', 'POST', '/api/patient/vitals', 10),
+    ('vitals range', 'GET', '/api/patient/vitals/range?metric=heart_rate', 10),
+    ('appointments', 'GET', '/api/appointments/{user_id}', 20),
+]
+TIME_SLOTS = ['9 AM', '10 AM', '11 AM', '12 PM', '2 PM', '3 PM', '4 PM', '5 PM']
+DISEASES = ['Fever', 'Cold & Flu', 'Diabetes', 'Blood Pressure', 'Others']
+
+
+def body_for(name, rng):
+    if name == 'doctor charts/update':
+        return {'time_slot': rng.choice(TIME_SLOTS), 'disease_name': rng.choice(DISEASES)}
+    if name == 'vitals POST':
+        return {'heart_rate': rng.randint(55, 110), 'blood_pressure': f'{rng.randint(100, 150)}/{rng.randint(60, 95)}',
+                'temperature': round(rng.uniform(36.0, 38.0), 1)}
+    return None
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, ms, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(ms)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            endpoints[name] = {
+                'requests': len(samples),
+                'errors': self.errors.get(name, 0),
+                'rps': round(len(samples) / duration, 2),
+                'p50_ms': round(percentile(samples, 50), 2),
+                'p95_ms': round(percentile(samples, 95), 2),
+                'p99_ms': round(percentile(samples, 99), 2),
+            }
+        every = [ms for samples in self.samples.values() for ms in samples]
+        total = {
+            'requests': len(every),
+            'errors': sum(self.errors.values()),
+            'rps': round(len(every) / duration, 2),
+            'p50_ms': round(percentile(every, 50), 2),
+            'p95_ms': round(percentile(every, 95), 2),
+            'p99_ms': round(percentile(every, 99), 2),
+        }
+        return endpoints, total
+
+
+def request(host, port, method, path, body=None, token=None, timeout=30):
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = 'Bearer ' + token
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, data
+    finally:
+        conn.close()
+
+
+def virtual_user(host, port, recorder, deadline, args, seed):
+    rng = random.Random(seed)
+    doctor = rng.random() < args.doctor_share
+    number = rng.randint(1, args.doctors if doctor else args.patients)
+    email = f'{"doctor" if doctor else "patient"}{number}@example.com'
+
+    def timed(name, method, path, body=None, token=None):
+        start = time.perf_counter()
+        try:
+            status, data = request(host, port, method, path, body, token)
+        except (OSError, http.client.HTTPException):
+            status, data = 0, b''
+        recorder.add(name, (time.perf_counter() - start) * 1000.0, 200 <= status < 300)
+        return status, data
+
+    status, data = timed('login', 'POST', '/api/login', {'email': email, 'password': 'password'})
+    if status != 200:
+        return
+    login = json.loads(data)
+    token, user_id = login['token'], login['user']['id']
+    mix = DOCTOR_MIX if doctor else PATIENT_MIX
+    weights = [weight for _, _, _, weight in mix]
+    while time.perf_counter() < deadline:
+        name, method, path, _ = rng.choices(mix, weights)[0]
+        timed(name, method, path.format(user_id=user_id), body_for(name, rng), token)
+        if args.think_ms:
+            time.sleep(rng.expovariate(1000.0 / args.think_ms))
+
+
+def seed_database(args):
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='load-')
+    os.close(fd)
+    os.remove(path)
+    url = 'sqlite:///' + path
+    print(f'seeding {url}')
+    subprocess.run([
+        sys.executable, os.path.join(BACKEND, 'seed.py'), '--database-url', url,
+        '--doctors', str(args.doctors), '--patients', str(args.patients),
+        '--appointments', str(args.appointments), '--years', '1',
+    ], check=True, cwd=BACKEND, stdout=subprocess.DEVNULL)
+    return url
+
+
+def start_server(args):
+    from werkzeug.serving import make_server
+    from app import create_app
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': args.database_url,
+        'ASSISTANT_BACKEND': os.environ.get('ASSISTANT_BACKEND', 'stub'),
+        'ASSISTANT_CACHE_PATH': os.environ.get('ASSISTANT_CACHE_PATH', ''),
+    })
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, '127.0.0.1', server.server_port
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    # Returns a list of regression messages
+    regressions = []
+    print(f'{"endpoint":<22} {"p95 base":>9} {"p95 now":>9} {"p99 base":>9} {"p99 now":>9} '
+          f'{"rps base":>9} {"rps now":>9}')
+    for name, now in sorted(current['endpoints'].items()):
+        base = baseline['endpoints'].get(name)
+        if base is None:
+            print(f'{name:<22} (not in baseline)')
+            continue
+        problems = []
+        for key in ('p95_ms', 'p99_ms'):
+            if now[key] > base[key] * (1 + threshold) and now[key] - base[key] >= min_delta_ms:
+                problems.append(f'{key} {base[key]:.1f} -> {now[key]:.1f}')
+        if now['rps'] < base['rps'] * (1 - threshold):
+            problems.append(f'rps {base["rps"]:.1f} -> {now["rps"]:.1f}')
+        if now['errors'] and not base['errors']:
+            problems.append(f'{now["errors"]} errors')
+        print(f'{name:<22} {base["p95_ms"]:9.1f} {now["p95_ms"]:9.1f} {base["p99_ms"]:9.1f} {now["p99_ms"]:9.1f} '
+              f'{base["rps"]:9.1f} {now["rps"]:9.1f}  {"REGRESSED: " + ", ".join(problems) if problems else "ok"}')
+        regressions.extend(f'{name}: {problem}' for problem in problems)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='target a running server instead of booting the app')
+    parser.add_argument('--database-url', help='seeded database to serve (default: a freshly seeded SQLite file)')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--appointments', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual users')
+    parser.add_argument('--doctor-share', type=float, default=0.3)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--think-ms', type=float, default=50, help='mean pause between a user\'s requests')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--compare', help='compare this results JSON with --baseline without running')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error('--compare needs --baseline')
+        with open(args.compare) as f:
+            current = json.load(f)
+    else:
+        if args.url:
+            parts = urlsplit(args.url)
+            host, port, server = parts.hostname, parts.port or 80, None
+        else:
+            args.database_url = args.database_url or seed_database(args)
+            server, host, port = start_server(args)
+
+        recorder = Recorder()
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        users = [threading.Thread(target=virtual_user, args=(host, port, recorder, deadline, args, args.seed + i))
+                 for i in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - started
+        if server is not None:
+            server.shutdown()
+
+        endpoints, total = recorder.summary(elapsed)
+        current = {
+            'meta': {
+                'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'target': args.url or 'in-process werkzeug',
+                'users': args.users,
+                'duration': round(elapsed, 2),
+                'think_ms': args.think_ms,
+                'doctor_share': args.doctor_share,
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+            },
+            'endpoints': endpoints,
+            'total': total,
+        }
+        print(f'{"endpoint":<22} {"requests":>8} {"errors":>6} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8}')
+        for name, stats in list(endpoints.items()) + [('TOTAL', total)]:
+            print(f'{name:<22} {stats["requests"]:8d} {stats["errors"]:6d} {stats["rps"]:8.1f} '
+                  f'{stats["p50_ms"]:7.1f}ms {stats["p95_ms"]:7.1f}ms {stats["p99_ms"]:7.1f}ms')
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f'saved {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f'{len(regressions)} regression(s) past {args.threshold:.0%}:')
+            for regression in regressions:
+                print('  ' + regression)
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
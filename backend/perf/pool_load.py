@@ -0,0 +1,107 @@
+"""Size the connection pool for a given per-worker concurrency.
+
+    python perf/pool_load.py --threads 8 --hold-ms 20 --workers 4 --max-connections 151
+
+Simulates one worker process: --threads request threads each spend
+--think-ms outside the database, then check out a connection, run a query and
+hold it for --hold-ms (the time a handler keeps its session busy). The sweep
+over pool sizes reports throughput, checkout wait and timeouts. The
+recommendation is the smallest pool that reaches 95% of the best throughput
+with p95 wait under --target-wait-ms, checked against
+--workers * (pool_size + max_overflow) <= --max-connections.
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+from common import percentile
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from pool_stats import InstrumentedQueuePool
+
+
+def run(url, pool_size, max_overflow, threads, hold_ms, think_ms, duration, pool_timeout):
+    engine = create_engine(
+        url, poolclass=InstrumentedQueuePool, pool_size=pool_size,
+        max_overflow=max_overflow, pool_timeout=pool_timeout, pool_pre_ping=True,
+    )
+    waits, done, timeouts = [], [0], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            time.sleep(think_ms / 1000.0)
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    waited = (time.perf_counter() - start) * 1000.0
+                    conn.execute(text('SELECT 1')).scalar()
+                    time.sleep(hold_ms / 1000.0)
+            except PoolTimeoutError:
+                with lock:
+                    timeouts[0] += 1
+                continue
+            with lock:
+                waits.append(waited)
+                done[0] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    return {
+        'throughput': done[0] / duration,
+        'p50': percentile(waits, 50),
+        'p95': percentile(waits, 95),
+        'timeouts': timeouts[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent requests per worker')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes sharing the database')
+    parser.add_argument('--max-connections', type=int, default=151, help="MySQL's max_connections")
+    parser.add_argument('--max-overflow', type=int, default=2)
+    parser.add_argument('--hold-ms', type=float, default=20)
+    parser.add_argument('--think-ms', type=float, default=20)
+    parser.add_argument('--duration', type=float, default=3)
+    parser.add_argument('--pool-timeout', type=float, default=2)
+    parser.add_argument('--target-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + tempfile.mkstemp(suffix='.db', prefix='pool-')[1]
+    sizes = sorted({1, 2, 4, 8, 16, args.threads})
+    print(f'{args.threads} threads/worker, {args.think_ms}ms think, {args.hold_ms}ms hold, '
+          f'overflow={args.max_overflow}')
+    results = {}
+    for size in sizes:
+        result = results[size] = run(url, size, args.max_overflow, args.threads, args.hold_ms,
+                                     args.think_ms, args.duration, args.pool_timeout)
+        total = args.workers * (size + args.max_overflow)
+        print(f'pool_size={size:<3} {result["throughput"]:8.0f} req/s  wait p50={result["p50"]:7.2f}ms '
+              f'p95={result["p95"]:7.2f}ms  timeouts={result["timeouts"]:<4} db connections={total}'
+              f'{"" if total <= args.max_connections else " (exceeds max_connections)"}')
+
+    best = max(result['throughput'] for result in results.values())
+    recommended = next((
+        size for size in sizes
+        if args.workers * (size + args.max_overflow) <= args.max_connections
+        and results[size]['throughput'] >= 0.95 * best
+        and results[size]['p95'] <= args.target_wait_ms
+        and not results[size]['timeouts']
+    ), None)
+    if recommended is None:
+        print('No pool size met the target; raise max_connections or run fewer workers/threads')
+    else:
+        print(f'Recommended: DB_POOL_SIZE={recommended} DB_MAX_OVERFLOW={args.max_overflow} '
+              f'for {args.workers} workers x {args.threads} threads')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Fire concurrent chart updates and check that no increment is lost.
+
+    python perf/stress_chart_counters.py --threads 16 --updates 250
+    python perf/stress_chart_counters.py --legacy   # old read-modify-write path
+
+Each thread runs its own session, as a separate request would. Exits
+non-zero if the final patient_flow/disease_distribution counts differ from
+the number of updates sent.
+"""
+import argparse
+import random
+import sys
+import threading
+from collections import Counter
+from datetime import date
+
+from common import make_app, create_schema
+from sqlalchemy import insert
+from models import db, User, Doctor, PatientFlow, DiseaseDistribution
+from counters import add_patient_flow_counts, add_disease_counts
+
+SLOTS = ['9 AM', '10 AM', '11 AM', '12 PM']
+DISEASES = ['Fever', 'Cold & Flu', 'Diabetes']
+
+
+def atomic_update(doctor_id, day, slot, disease):
+    add_patient_flow_counts({(doctor_id, day, slot): 1})
+    add_disease_counts({(doctor_id, disease): 1})
+    db.session.commit()
+
+
+def legacy_update(doctor_id, day, slot, disease):
+    # The handler's previous .first() / += 1 / commit sequence
+    flow = PatientFlow.query.filter_by(doctor_id=doctor_id, date=day, time_slot=slot).first()
+    if flow:
+        flow.patient_count += 1
+    else:
+        db.session.add(PatientFlow(doctor_id=doctor_id, time_slot=slot, date=day, patient_count=1))
+    dist = DiseaseDistribution.query.filter_by(doctor_id=doctor_id, disease_name=disease).first()
+    if dist:
+        dist.patient_count += 1
+    else:
+        db.session.add(DiseaseDistribution(doctor_id=doctor_id, disease_name=disease, patient_count=1))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--updates', type=int, default=250, help='updates per thread')
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url, engine_options={
+        'pool_size': args.threads,
+        'connect_args': {'timeout': 60} if not args.database_url else {},
+    })
+    update = legacy_update if args.legacy else atomic_update
+    day = date.today()
+    sent_flow, sent_disease = Counter(), Counter()
+    errors = []
+    lock = threading.Lock()
+
+    with app.app_context():
+        create_schema()
+        db.session.execute(insert(User), [{'username': 'doc', 'email': 'doc@example.com', 'password': 'x', 'role': 'doctor'}])
+        db.session.execute(insert(Doctor), [{'user_id': 1}])
+        db.session.commit()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            for _ in range(args.updates):
+                slot, disease = rng.choice(SLOTS), rng.choice(DISEASES)
+                try:
+                    update(1, day, slot, disease)
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(type(e).__name__)
+                    continue
+                with lock:
+                    sent_flow[slot] += 1
+                    sent_disease[disease] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        flows = {f.time_slot: f.patient_count for f in PatientFlow.query.filter_by(doctor_id=1, date=day)}
+        diseases = {d.disease_name: d.patient_count for d in DiseaseDistribution.query.filter_by(doctor_id=1)}
+
+    print(f'{sum(sent_flow.values())} updates committed, {len(errors)} failed {dict(Counter(errors))}')
+    lost = sum(sent_flow.values()) - sum(flows.values()) + sum(sent_disease.values()) - sum(diseases.values())
+    for slot in SLOTS:
+        print(f'  flow    {slot:<8} sent={sent_flow[slot]:<6} stored={flows.get(slot, 0)}')
+    for disease in DISEASES:
+        print(f'  disease {disease:<12} sent={sent_disease[disease]:<6} stored={diseases.get(disease, 0)}')
+    if lost or dict(sent_flow) != flows or dict(sent_disease) != diseases:
+        sys.exit(f'Counts do not match ({lost} increments lost)')
+    print('All increments accounted for')
+
+
+if __name__ == '__main__':
+    main()
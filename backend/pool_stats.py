@@ -0,0 +1,86 @@
+import bisect
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Live connection-pool telemetry. InstrumentedQueuePool is a drop-in QueuePool
+# that times how long each checkout waits for a free connection, so pool
+# starvation shows up as a shifting wait histogram long before requests
+# start failing with pool timeouts.
+
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class WaitHistogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.checkouts = 0
+        self.timeouts = 0
+
+    def observe(self, wait_ms):
+        index = bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.total_ms += wait_ms
+            self.checkouts += 1
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            total_ms, checkouts, timeouts = self.total_ms, self.checkouts, self.timeouts
+        buckets, cumulative = {}, 0
+        for bound, count in zip(WAIT_BUCKETS_MS + ['+Inf'], counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            'checkouts': checkouts,
+            'timeouts': timeouts,
+            'wait_ms_total': round(total_ms, 3),
+            'wait_ms_buckets': buckets
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_histogram = WaitHistogram()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.wait_histogram.observe_timeout()
+            raise
+        finally:
+            self.wait_histogram.observe((time.perf_counter() - start) * 1000.0)
+
+    def recreate(self):
+        # Keep counting across engine.dispose() / invalidation-driven recreates
+        pool = super().recreate()
+        pool.wait_histogram = self.wait_histogram
+        return pool
+
+
+def pool_snapshot(engine):
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.wait_histogram.snapshot())
+    return stats
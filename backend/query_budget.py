@@ -0,0 +1,151 @@
+import os
+import sys
+import threading
+from collections import Counter
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Query budgets: the most SQL statements a block of code, usually a view, may
+# issue. Lazy relationship loads inside a loop (N+1) show up as a budget
+# overrun instead of as a slow page in production.
+#
+#   @app.route('/api/things')
+#   @query_budget(3)
+#   def things(): ...
+#
+#   with QueryBudget(3):        # in scripts and checks; raises on overrun
+#       ...
+#
+#   QUERY_BUDGET_MODE   off, log (print overruns, default) or raise
+#
+# Work whose statement count grows with the input by design, such as one
+# batch per chunk of a bulk upload, calls allow_statements() per batch
+# instead of getting a budget sized for the largest upload.
+#
+# Budgets are sized for the cold path, where the identity cache has expired
+# and the caller's profile id is read again. In raise mode an overrun is
+# only logged once the view has committed: the write has happened, and a
+# 500 would tell the client it had not.
+#
+# The view decorator goes right under @app.route so the JWT and identity
+# lookups count too. Statements run after the view returns, inside a
+# streamed response body, are not counted. perf/check_query_budgets.py runs
+# every route against seeded data and fails on overruns and on routes that
+# declare no budget.
+
+MODES = ('off', 'log', 'raise')
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, label, limit, statements):
+        self.label = label
+        self.limit = limit
+        self.statements = statements
+        super().__init__(describe(label, limit, statements))
+
+
+def describe(label, limit, statements):
+    # Identical statements are grouped, so an N+1 shows up as one line
+    # repeated N times
+    lines = [f'{label or "block"} issued {len(statements)} SQL statements, budget {limit}:']
+    counts = Counter(statements)
+    for entry, count in sorted(counts.items(), key=lambda item: -item[1]):
+        sql, caller = entry
+        sql = ' '.join(sql.split())
+        lines.append(f'  {count:3d}x {sql[:300]}' + (f'\n        at {caller}' if caller else ''))
+    return '\n'.join(lines)
+
+
+def _caller():
+    # Innermost frame in our own code outside this module
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BACKEND) and filename != __file__:
+            return f'{os.path.relpath(filename, BACKEND)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    budgets = getattr(_local, 'budgets', None)
+    if budgets:
+        caller = _caller() if any(budget.trace for budget in budgets) else None
+        for budget in budgets:
+            budget.statements.append((statement, caller if budget.trace else None))
+
+
+def _after_commit(session):
+    for budget in getattr(_local, 'budgets', ()):
+        budget.committed = True
+
+
+class QueryBudget:
+    # Counts statements on this thread while active; budgets nest
+    def __init__(self, limit, label=None, strict=True, trace=False):
+        self.limit = limit
+        self.label = label
+        self.strict = strict
+        self.trace = trace
+        self.statements = []
+        self.committed = False
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        if not event.contains(Session, 'after_commit', _after_commit):
+            event.listen(Session, 'after_commit', _after_commit)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def exceeded(self):
+        return self.limit is not None and self.count > self.limit
+
+    def __enter__(self):
+        self.statements = []
+        self.committed = False
+        if not hasattr(_local, 'budgets'):
+            _local.budgets = []
+        _local.budgets.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.budgets.remove(self)
+        if self.strict and exc_type is None and self.exceeded:
+            raise QueryBudgetExceeded(self.label, self.limit, self.statements)
+
+    def report(self):
+        return describe(self.label, self.limit, self.statements)
+
+
+def allow_statements(count):
+    # Raises every active budget on this thread by count
+    for budget in getattr(_local, 'budgets', ()):
+        if budget.limit is not None:
+            budget.limit += count
+
+
+def query_budget(limit):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = current_app.config.get('QUERY_BUDGET_MODE', 'log')
+            if mode == 'off':
+                return view(*args, **kwargs)
+            with QueryBudget(limit, f'{request.method} {request.path}', strict=False) as budget:
+                response = view(*args, **kwargs)
+            if budget.exceeded:
+                if mode == 'raise' and not budget.committed:
+                    raise QueryBudgetExceeded(budget.label, budget.limit, budget.statements)
+                print("Query budget exceeded:", budget.report())
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import threading
+import time
+from sqlite_file import SQLiteFile
+
+# Content-addressed cache for lab report processing. Entries are keyed by the
+# SHA-256 of the uploaded bytes plus the OCR pipeline version, so re-uploading
+# the same scan skips Tesseract, and a pipeline change (new version) misses
+# instead of serving stale text. The summary is stored with its own version
+# (prompt and model), so changing the summarizer re-summarizes without
+# repeating OCR.
+#
+# Entries live in a SQLite file shared by every worker on the host. When the
+# stored text exceeds max_bytes, the least recently used entries are evicted.
+# The running total lives in the file too, in report_bytes, kept current by
+# triggers, so every worker sees the same figure and a write costs one row
+# read instead of a SUM over the table. Files from before report_bytes get
+# it initialised from a single SUM on first open.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    key TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    report_values TEXT NOT NULL,
+    summary TEXT,
+    summary_version TEXT,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_reports_last_used ON reports (last_used);
+CREATE TABLE IF NOT EXISTS report_bytes (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS reports_bytes_insert AFTER INSERT ON reports
+BEGIN UPDATE report_bytes SET total = total + NEW.size; END;
+CREATE TRIGGER IF NOT EXISTS reports_bytes_update AFTER UPDATE OF size ON reports
+BEGIN UPDATE report_bytes SET total = total + NEW.size - OLD.size; END;
+CREATE TRIGGER IF NOT EXISTS reports_bytes_delete AFTER DELETE ON reports
+BEGIN UPDATE report_bytes SET total = total - OLD.size; END;
+INSERT OR IGNORE INTO report_bytes (id, total) SELECT 1, COALESCE(SUM(size), 0) FROM reports;
+"""
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ReportCache:
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = SQLiteFile(path, SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.summary_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self):
+        # See sqlite_file.py
+        return self.db.connection()
+
+    @staticmethod
+    def key(digest, ocr_version):
+        return f'{digest}:{ocr_version}'
+
+    def get(self, digest, ocr_version, summary_version=None):
+        # Returns {'text', 'values', 'summary'} or None; 'summary' is None
+        # unless it was made by summary_version
+        key = self.key(digest, ocr_version)
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT text, report_values, summary, summary_version FROM reports WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        conn.execute('UPDATE reports SET last_used = ? WHERE key = ?', (time.time(), key))
+        summary = row[2] if summary_version is not None and row[3] == summary_version else None
+        with self._lock:
+            self.hits += 1
+            if summary is not None:
+                self.summary_hits += 1
+        return {'text': row[0], 'values': json.loads(row[1]), 'summary': summary}
+
+    def put(self, digest, ocr_version, text, values):
+        report_values = json.dumps(values)
+        # An upsert rather than INSERT OR REPLACE: the rows REPLACE deletes
+        # do not fire the delete trigger
+        self._connection().execute(
+            'INSERT INTO reports (key, text, report_values, size, last_used) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET text = excluded.text, report_values = excluded.report_values, '
+            'summary = NULL, summary_version = NULL, size = excluded.size, last_used = excluded.last_used',
+            (self.key(digest, ocr_version), text, report_values, len(text) + len(report_values), time.time())
+        )
+        self._evict()
+
+    def put_summary(self, digest, ocr_version, summary, summary_version):
+        self._connection().execute(
+            'UPDATE reports SET summary = ?, summary_version = ?, size = length(text) + length(report_values) + ? '
+            'WHERE key = ?',
+            (summary, summary_version, len(summary), self.key(digest, ocr_version))
+        )
+        self._evict()
+
+    def _evict(self):
+        conn = self._connection()
+        total = conn.execute('SELECT total FROM report_bytes').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the rest fit
+        doomed, excess = [], total - self.max_bytes
+        for key, size in conn.execute('SELECT key, size FROM reports ORDER BY last_used'):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM reports WHERE key = ?', doomed)
+        with self._lock:
+            self.evictions += len(doomed)
+
+    def stats(self):
+        entries, size = self._connection().execute(
+            'SELECT (SELECT COUNT(*) FROM reports), total FROM report_bytes'
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'summary_hits': self.summary_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,123 @@
+import json
+from lru import LRUCache
+
+# Read-through cache for hot GET payloads, invalidated by the writes that
+# change them. Values are the JSON-serializable dicts a view would return.
+#
+#   RESPONSE_CACHE_URL   empty for the in-process LRU (default), or a
+#                        redis:// URL for a cache shared by all workers
+#   RESPONSE_CACHE_SIZE  LRU entries per worker (default 2048)
+#   RESPONSE_CACHE_TTL   seconds an entry may be served (default 60)
+#
+# create_app(config={'RESPONSE_CACHE_CLIENT': client}) uses a redis-py
+# compatible client in place of the URL, e.g. fakeredis in
+# perf/check_response_cache.py.
+#
+# The in-process LRU is per worker: an invalidation only reaches the worker
+# that handled the write, so other workers may serve the old payload until the
+# TTL runs out. Use the shared backend when running several workers.
+
+
+class LocalBackend:
+    def __init__(self, maxsize, ttl):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.cache.delete(key)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class RedisBackend:
+    # Works with any redis-py compatible client, e.g. a local redis-server or
+    # fakeredis as a stand-in (RESPONSE_CACHE_CLIENT)
+    def __init__(self, client, ttl, prefix='healthcare:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(self.ttl))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def stats(self):
+        try:
+            evictions = self.client.info('stats').get('evicted_keys', 0)
+        except Exception:
+            evictions = None
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': evictions}
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = LocalBackend(2048, 60)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = app.config.get('RESPONSE_CACHE_URL')
+        ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        client = app.config.get('RESPONSE_CACHE_CLIENT')
+        if client is None and url:
+            import redis
+            client = redis.Redis.from_url(url)
+        if client is not None:
+            self.backend = RedisBackend(client, ttl)
+        else:
+            self.backend = LocalBackend(app.config.get('RESPONSE_CACHE_SIZE', 2048), ttl)
+        app.extensions['response_cache'] = self
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            # A cache outage must not take the endpoint down with it
+            print(f"Response cache read failed: {str(e)}")
+            return None
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            print(f"Response cache write failed: {str(e)}")
+
+    def invalidate(self, *keys):
+        try:
+            self.backend.delete(*keys)
+        except Exception as e:
+            print(f"Response cache invalidation failed: {str(e)}")
+
+    def stats(self):
+        return {'backend': type(self.backend).__name__, **self.backend.stats()}
+
+
+def charts_key(doctor_id, day):
+    return f'charts:{doctor_id}:{day.isoformat()}'
+
+
+def doctor_profile_key(user_id):
+    return f'doctor_profile:{user_id}'
+
+
+response_cache = ResponseCache()
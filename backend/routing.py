@@ -0,0 +1,71 @@
+import random
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from lru import LRUCache
+
+# Read/write splitting. Views decorated with @replica_reads send their
+# SELECTs to one of the replica binds (SQLALCHEMY_BINDS keys starting with
+# "replica"); everything else, and every INSERT/UPDATE/DELETE or flush, goes
+# to the primary. Once a session has written, it stays on the primary.
+#
+# Read-your-writes: after a user's write commits, that user's reads stay on
+# the primary for DB_REPLICA_STICKY_SECONDS, which should cover replica lag.
+# The window is tracked per worker process, so a follow-up request served by
+# another worker can still see a lagging replica.
+
+recent_writers = LRUCache(maxsize=100000, ttl=5)
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def note_write(user_id):
+    recent_writers.set(int(user_id), True)
+
+
+def _current_user_id():
+    identity = g.get('identity')
+    return identity.user_id if identity else None
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        replicas = current_app.extensions.get('db_replicas') if has_app_context() else None
+        if replicas:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif not self.info.get('wrote') and self._reads_from_replica():
+                return random.choice(replicas)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    @staticmethod
+    def _reads_from_replica():
+        if not has_request_context() or not g.get('replica_reads'):
+            return False
+        user_id = _current_user_id()
+        return user_id is None or recent_writers.get(user_id) is None
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_writer(session):
+    if session.info.get('wrote') and has_app_context() and has_request_context():
+        user_id = _current_user_id()
+        if user_id is not None:
+            note_write(user_id)
+
+
+def init_app(app, db):
+    recent_writers.ttl = app.config.get('DB_REPLICA_STICKY_SECONDS', recent_writers.ttl)
+    keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica'))
+    with app.app_context():
+        app.extensions['db_replicas'] = [db.engines[key] for key in keys]
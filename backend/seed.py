@@ -0,0 +1,320 @@
+"""Fill a database with a realistic synthetic dataset for performance work.
+
+    python seed.py --database-url sqlite:///seed.db --appointments 1000000
+    python seed.py --database-url mysql://root:@localhost/healthcare_bench --doctors 500 \\
+        --patients 200000 --appointments 5000000 --years 5 --method load-data
+
+Creates the schema through the migrations, then writes users, doctors,
+patients, appointments, prescriptions and the dashboard counter tables
+(patient_flow, disease_distribution, aggregated from the appointments so
+they agree with them). The data is skewed the way a real clinic's is:
+
+  * appointments per doctor follow a Zipf law (--doctor-zipf), and so do
+    visits per patient (--patient-zipf): a few regulars, a long tail
+  * diseases follow a seasonal mix (flu in winter, dengue in the monsoon,
+    allergies in spring) and drive symptoms, diagnoses and prescriptions
+  * --years of history up to today plus a month of bookings ahead, busier
+    on weekdays and mornings and growing year over year
+
+Rows are generated with NumPy in chunks and written with executemany
+inserts, or with LOAD DATA LOCAL INFILE on MySQL (--method load-data; the
+server needs local_infile=ON). Ids are assigned here, so no round trips are
+needed to link rows. Refuses to write into a database that already has
+users unless --reset is given, which deletes the seeded tables first.
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, delete, func, select, text
+
+from config import database_url
+from migrations import upgrade
+from models import (User, Doctor, Patient, Appointment, Prescription, PatientFlow, DiseaseDistribution,
+                    LabResult, PatientVitals, VitalsHourly, VitalsDaily)
+
+TIME_SLOTS = ['9 AM', '10 AM', '11 AM', '12 PM', '2 PM', '3 PM', '4 PM', '5 PM']
+SLOT_HOURS = np.array([9, 10, 11, 12, 14, 15, 16, 17])
+SLOT_WEIGHTS = np.array([12, 16, 15, 11, 10, 12, 9, 6], dtype=np.float64)
+# Mon..Sun
+WEEKDAY_WEIGHTS = np.array([1.2, 1.1, 1.0, 1.0, 1.0, 0.5, 0.1])
+YEARLY_GROWTH = 0.15
+
+# name, relative weight by month (Jan..Dec), symptoms, medications
+DISEASES = [
+    ('Cold & Flu', [9, 9, 6, 3, 2, 1, 1, 1, 2, 4, 6, 8], 'runny nose, sore throat, cough',
+     ['Paracetamol 500mg', 'Cetirizine 10mg']),
+    ('Fever', [4, 4, 3, 3, 3, 4, 6, 7, 6, 4, 3, 4], 'high temperature, body ache',
+     ['Paracetamol 650mg']),
+    ('Dengue', [0, 0, 0, 0, 0.5, 1, 4, 6, 6, 4, 1, 0], 'high fever, joint pain, rash',
+     ['Paracetamol 500mg', 'ORS']),
+    ('Allergies', [1, 2, 5, 7, 6, 3, 2, 1, 2, 2, 1, 1], 'sneezing, itchy eyes',
+     ['Levocetirizine 5mg', 'Fluticasone nasal spray']),
+    ('Heat Stroke', [0, 0, 1, 3, 5, 5, 3, 1, 0, 0, 0, 0], 'dizziness, headache, dehydration',
+     ['ORS']),
+    ('Gastroenteritis', [2, 2, 2, 3, 4, 5, 6, 6, 4, 3, 2, 2], 'diarrhea, vomiting, abdominal pain',
+     ['ORS', 'Ondansetron 4mg']),
+    ('Diabetes', [3] * 12, 'frequent urination, fatigue', ['Metformin 500mg']),
+    ('Blood Pressure', [3] * 12, 'headache, dizziness', ['Amlodipine 5mg']),
+    ('Back Pain', [2] * 12, 'lower back pain', ['Ibuprofen 400mg']),
+    ('Others', [3] * 12, 'general checkup', []),
+]
+
+MEDICATIONS = [json.dumps(medications) for _, _, _, medications in DISEASES]
+
+SPECIALIZATIONS = ['General Physician', 'Pediatrics', 'Cardiology', 'Dermatology', 'Orthopedics',
+                   'ENT', 'Endocrinology', 'Gynecology']
+BLOOD_GROUPS = ['O+', 'A+', 'B+', 'AB+', 'O-', 'A-', 'B-', 'AB-']
+BLOOD_GROUP_WEIGHTS = [0.37, 0.28, 0.2, 0.05, 0.04, 0.03, 0.02, 0.01]
+
+# Children of seeded tables first, so --reset can delete in this order
+SEEDED_TABLES = [VitalsDaily, VitalsHourly, PatientVitals, LabResult, Prescription, PatientFlow,
+                 DiseaseDistribution, Appointment, Patient, Doctor, User]
+
+
+def zipf_weights(n, s, rng):
+    # Rank r gets weight 1/r^s; ranks are shuffled so the busiest ids are
+    # not simply the lowest ones
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def day_weights(days, first):
+    # Weekday pattern times a steady yearly growth in volume
+    weekday = WEEKDAY_WEIGHTS[(np.arange(days) + first.weekday()) % 7]
+    growth = (1 + YEARLY_GROWTH) ** (np.arange(days) / 365.0)
+    weights = weekday * growth
+    return weights / weights.sum()
+
+
+def disease_cumulative():
+    # Per-month cumulative disease probabilities, for inverse-CDF sampling
+    monthly = np.array([weights for _, weights, _, _ in DISEASES], dtype=np.float64).T
+    monthly /= monthly.sum(axis=1, keepdims=True)
+    return monthly.cumsum(axis=1)
+
+
+def timestamps(values):
+    # datetime64 array -> the strings SQLAlchemy itself stores on SQLite
+    # (and MySQL accepts), formatted in one vectorized pass
+    return np.char.replace(np.datetime_as_string(values, unit='us'), 'T', ' ').tolist()
+
+
+class Writer:
+    # Bulk writes of tuples over one connection, straight to the driver:
+    # SQLAlchemy's per-row parameter processing would cost more than the
+    # inserts. executemany by default; LOAD DATA streams a CSV of each chunk
+    # to MySQL, skipping statement parsing altogether.
+    def __init__(self, conn, method):
+        self.conn = conn
+        self.method = method
+        self.rows = {}
+        self.quote = conn.dialect.identifier_preparer.quote
+        self.placeholder = '?' if conn.dialect.paramstyle == 'qmark' else '%s'
+
+    def write(self, model, columns, rows):
+        if not rows:
+            return
+        table = model.__table__.name
+        names = ', '.join(self.quote(c) for c in columns)
+        if self.method == 'load-data':
+            self._load_data(table, names, rows)
+        else:
+            values = ', '.join([self.placeholder] * len(columns))
+            self.conn.exec_driver_sql(f'INSERT INTO {self.quote(table)} ({names}) VALUES ({values})', rows)
+        self.rows[table] = self.rows.get(table, 0) + len(rows)
+
+    def _load_data(self, table, names, rows):
+        fd, path = tempfile.mkstemp(suffix='.csv', prefix=f'seed-{table}-')
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, lineterminator='\n', escapechar='\\', doublequote=False)
+                writer.writerows(['\\N' if value is None else value for value in row] for row in rows)
+            self.conn.exec_driver_sql(
+                f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {self.quote(table)} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                f"LINES TERMINATED BY '\\n' ({names})"
+            )
+        finally:
+            os.remove(path)
+
+    def commit(self):
+        self.conn.commit()
+
+
+USER_COLUMNS = ['id', 'username', 'email', 'password', 'role', 'created_at']
+DOCTOR_COLUMNS = ['id', 'user_id', 'specialization', 'qualification', 'experience_years', 'consultation_fee',
+                  'available_days', 'created_at', 'updated_at']
+PATIENT_COLUMNS = ['id', 'user_id', 'age', 'gender', 'blood_group', 'weight', 'height', 'medical_history',
+                   'allergies', 'emergency_contact', 'address', 'created_at', 'updated_at']
+APPOINTMENT_COLUMNS = ['id', 'patient_id', 'doctor_id', 'appointment_date', 'status', 'symptoms', 'diagnosis',
+                       'notes', 'created_at', 'updated_at']
+PRESCRIPTION_COLUMNS = ['id', 'appointment_id', 'patient_id', 'doctor_id', 'medications', 'dosage_instructions',
+                        'duration', 'additional_notes', 'created_at', 'updated_at']
+
+
+def seed_people(writer, rng, doctors, patients, chunk):
+    now = timestamps(np.array([datetime.utcnow()], dtype='datetime64[s]'))[0]
+    writer.write(User, USER_COLUMNS, [
+        (i, f'doctor{i}', f'doctor{i}@example.com', 'password', 'doctor', now) for i in range(1, doctors + 1)
+    ])
+    available = json.dumps(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'])
+    writer.write(Doctor, DOCTOR_COLUMNS, [
+        (i, i, SPECIALIZATIONS[int(rng.integers(len(SPECIALIZATIONS)))], 'MBBS, MD', int(rng.integers(1, 35)),
+         float(rng.choice([300, 500, 700, 1000, 1500])), available, now, now)
+        for i in range(1, doctors + 1)
+    ])
+    writer.commit()
+
+    for start in range(1, patients + 1, chunk):
+        ids = range(start, min(start + chunk, patients + 1))
+        ages = np.clip(rng.gamma(4.0, 9.0, len(ids)), 0, 99).astype(int).tolist()
+        genders = rng.choice(['male', 'female'], len(ids)).tolist()
+        groups = rng.choice(BLOOD_GROUPS, len(ids), p=BLOOD_GROUP_WEIGHTS).tolist()
+        heights = np.clip(rng.normal(165, 10, len(ids)), 50, 210).round(1).tolist()
+        weights = np.clip(rng.normal(68, 14, len(ids)), 3, 200).round(1).tolist()
+        writer.write(User, USER_COLUMNS, [
+            (doctors + i, f'patient{i}', f'patient{i}@example.com', 'password', 'patient', now) for i in ids
+        ])
+        writer.write(Patient, PATIENT_COLUMNS, [
+            (i, doctors + i, age, gender, group, weight, height, '', '', '', '', now, now)
+            for i, age, gender, group, weight, height in zip(ids, ages, genders, groups, heights, weights)
+        ])
+        writer.commit()
+
+
+def seed_visits(writer, rng, args):
+    today = datetime.utcnow().date()
+    first = today - timedelta(days=int(365.25 * args.years))
+    days = (today - first).days + 30
+    now = np.datetime64(today, 'us')
+    doctor_p = zipf_weights(args.doctors, args.doctor_zipf, rng)
+    patient_p = zipf_weights(args.patients, args.patient_zipf, rng)
+    cumulative = disease_cumulative()
+    slot_p = SLOT_WEIGHTS / SLOT_WEIGHTS.sum()
+
+    # Days for every appointment up front, sorted, so ids follow time like
+    # they would in production
+    day_index = np.sort(rng.choice(days, args.appointments, p=day_weights(days, first)))
+    flows = np.zeros(args.doctors * days * len(TIME_SLOTS), dtype=np.int64)
+    diseases = np.zeros(args.doctors * len(DISEASES), dtype=np.int64)
+    month_of_day = np.array([(first + timedelta(days=d)).month - 1 for d in range(days)])
+    prescription_id = 0
+
+    for offset in range(0, args.appointments, args.chunk):
+        day = day_index[offset:offset + args.chunk]
+        n = len(day)
+        ids = np.arange(offset + 1, offset + n + 1)
+        doctor = rng.choice(args.doctors, n, p=doctor_p)
+        patient = rng.choice(args.patients, n, p=patient_p)
+        slot = rng.choice(len(TIME_SLOTS), n, p=slot_p)
+        disease = (rng.random(n)[:, None] > cumulative[month_of_day[day]]).sum(axis=1)
+        disease = np.minimum(disease, len(DISEASES) - 1)
+        minutes = SLOT_HOURS[slot] * 60 + rng.integers(0, 4, n) * 15
+        when = (np.datetime64(first) + day.astype('timedelta64[D]')).astype('datetime64[m]') + minutes.astype('timedelta64[m]')
+        booked = when - rng.integers(60, 30 * 24 * 60, n).astype('timedelta64[m]')
+        past = when < now
+        roll = rng.random(n)
+        status = np.where(past, np.where(roll < 0.88, 'completed', 'cancelled'),
+                          np.where(roll < 0.6, 'confirmed', 'pending'))
+        completed = status == 'completed'
+        prescribed = completed & (rng.random(n) < 0.7)
+
+        np.add.at(flows, (doctor * days + day) * len(TIME_SLOTS) + slot, 1)
+        np.add.at(diseases, doctor[completed] * len(DISEASES) + disease[completed], 1)
+
+        when_s, booked_s = timestamps(when), timestamps(booked)
+        ids, patient, doctor, disease = ids.tolist(), (patient + 1).tolist(), (doctor + 1).tolist(), disease.tolist()
+        writer.write(Appointment, APPOINTMENT_COLUMNS, [
+            (i, p, d, w, s, DISEASES[k][2], DISEASES[k][0] if s == 'completed' else None, None,
+             b, w if s == 'completed' else b)
+            for i, p, d, w, b, s, k in zip(ids, patient, doctor, when_s, booked_s, status.tolist(), disease)
+        ])
+        writer.write(Prescription, PRESCRIPTION_COLUMNS, [
+            (rx_id, ids[j], patient[j], doctor[j], MEDICATIONS[disease[j]], 'After meals, twice a day',
+             f'{3 + disease[j] % 5} days', None, when_s[j], when_s[j])
+            for rx_id, j in enumerate(np.flatnonzero(prescribed).tolist(), start=prescription_id + 1)
+        ])
+        prescription_id += int(prescribed.sum())
+        writer.commit()
+        print(f'  appointments {offset + n:>10d}/{args.appointments}', end='\r', flush=True)
+    print()
+
+    # Counter tables, aggregated from what was written
+    nonzero = np.flatnonzero(flows)
+    for start in range(0, len(nonzero), args.chunk):
+        keys = nonzero[start:start + args.chunk]
+        doctor, rest = np.divmod(keys, days * len(TIME_SLOTS))
+        day, slot = np.divmod(rest, len(TIME_SLOTS))
+        dates = np.datetime_as_string(np.datetime64(first) + day.astype('timedelta64[D]')).tolist()
+        writer.write(PatientFlow, ['doctor_id', 'date', 'time_slot', 'patient_count'], [
+            (d + 1, dd, TIME_SLOTS[s], c)
+            for d, dd, s, c in zip(doctor.tolist(), dates, slot.tolist(), flows[keys].tolist())
+        ])
+        writer.commit()
+    updated = timestamps(np.array([now]))[0]
+    writer.write(DiseaseDistribution, ['doctor_id', 'disease_name', 'patient_count', 'last_updated'], [
+        (key // len(DISEASES) + 1, DISEASES[key % len(DISEASES)][0], int(diseases[key]), updated)
+        for key in np.flatnonzero(diseases).tolist()
+    ])
+    writer.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--database-url', default=database_url())
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--patients', type=int, default=50000)
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--doctor-zipf', type=float, default=1.1, help='skew of appointments per doctor')
+    parser.add_argument('--patient-zipf', type=float, default=0.6, help='skew of visits per patient')
+    parser.add_argument('--chunk', type=int, default=50000, help='rows generated and committed at a time')
+    parser.add_argument('--method', choices=['insert', 'load-data'], default='insert')
+    parser.add_argument('--reset', action='store_true', help='delete existing rows from the seeded tables')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    mysql = args.database_url.startswith('mysql')
+    if args.method == 'load-data' and not mysql:
+        parser.error('--method load-data needs a MySQL database')
+    engine = create_engine(args.database_url, connect_args={'local_infile': 1} if args.method == 'load-data' else {})
+    upgrade(engine, verbose=True)
+    rng = np.random.default_rng(args.seed)
+
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(User.__table__)).scalar():
+            if not args.reset:
+                parser.error('database already has users; pass --reset to replace them')
+            for model in SEEDED_TABLES:
+                conn.execute(delete(model.__table__))
+            conn.commit()
+        # Bulk-load settings for this connection only
+        if mysql:
+            conn.execute(text('SET unique_checks = 0, foreign_key_checks = 0'))
+        elif engine.dialect.name == 'sqlite':
+            conn.execute(text('PRAGMA synchronous = OFF'))
+        writer = Writer(conn, args.method)
+
+        started = time.perf_counter()
+        seed_people(writer, rng, args.doctors, args.patients, args.chunk)
+        seed_visits(writer, rng, args)
+        elapsed = time.perf_counter() - started
+        if mysql:
+            conn.execute(text('SET unique_checks = 1, foreign_key_checks = 1'))
+
+    total = sum(writer.rows.values())
+    for table, count in writer.rows.items():
+        print(f'{table:<22} {count:>10d} rows')
+    print(f'{total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
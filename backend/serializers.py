@@ -0,0 +1,124 @@
+import ast
+import json
+from collections import namedtuple
+from flask import Response
+
+# Response serializers for the model-backed views. Each one is compiled once,
+# at import, from a list of fields into a generated function whose body is a
+# single dict display with every field access inlined, so serializing a row
+# is one call with no per-field loop, getattr or dict building in the view.
+#
+#   APPOINTMENT = Serializer(Appointment, [
+#       Field('id'),
+#       Field('appointment_date', convert=minutes),
+#       Field('status'),
+#   ])
+#
+#   APPOINTMENT(apt)                    # ORM object, Row, anything with the attributes
+#   APPOINTMENT.many(objects)
+#   select(*APPOINTMENT.columns)        # plain columns, no ORM hydration ...
+#   APPOINTMENT.from_tuple(row)         # ... serialized by position
+#   APPOINTMENT.from_tuples(rows)
+#   APPOINTMENT.from_mapping(reading)   # dicts; missing keys count as None
+#   APPOINTMENT.defaults()              # the body for a row that does not exist
+#
+# Field(name, default, convert, source):
+#   default   replaces a falsy value, like `x or ""`; None leaves values as they are
+#   convert   applied to the value first, None included
+#   source    attributes passed to convert, when it needs more than one
+#
+# A field the model has no column for is always its default instead of an
+# error, e.g. a form field a migration has not added yet.
+#
+# json_response() encodes with dumps(): orjson when it is installed, several
+# times faster than the json module, which is the fallback.
+
+Field = namedtuple('Field', 'name default convert source', defaults=(None, None, None))
+
+
+def minutes(value):
+    # Same text as strftime('%Y-%m-%d %H:%M'), without the format parsing
+    return value.isoformat(' ', 'minutes') if value is not None else None
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def literal_list(value):
+    # Lists stored as their Python repr, e.g. Doctor.available_days
+    try:
+        parsed = ast.literal_eval(value) if value else []
+    except (ValueError, SyntaxError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+class Serializer:
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = list(fields)
+        stored = set(model.__table__.columns.keys())
+        self.sources = []
+        for field in self.fields:
+            for name in field.source or (field.name,):
+                if name in stored and name not in self.sources:
+                    self.sources.append(name)
+        self.columns = [getattr(model, name) for name in self.sources]
+        positions = {name: index for index, name in enumerate(self.sources)}
+
+        self.serialize = self._compile(lambda name: f'row.{name}', stored)
+        self.many = self._compile(lambda name: f'row.{name}', stored, many=True)
+        self.from_tuple = self._compile(lambda name: f'row[{positions[name]}]', stored)
+        self.from_tuples = self._compile(lambda name: f'row[{positions[name]}]', stored, many=True)
+        self.from_mapping = self._compile(lambda name: f'row.get({name!r})', stored)
+
+    def __call__(self, row):
+        return self.serialize(row)
+
+    def defaults(self):
+        return self.from_mapping({})
+
+    def _compile(self, access, stored, many=False):
+        namespace = {}
+        items = []
+        for index, field in enumerate(self.fields):
+            sources = [name for name in field.source or (field.name,) if name in stored]
+            if not sources and field.convert is None:
+                value = f'd{index}'
+            elif not sources:
+                value = f'c{index}(None)'
+            else:
+                value = ', '.join(access(name) for name in sources)
+                if field.convert is not None:
+                    value = f'c{index}({value})'
+            if field.default is not None and value != f'd{index}':
+                value = f'({value} or d{index})'
+            namespace[f'c{index}'] = field.convert
+            namespace[f'd{index}'] = field.default
+            items.append(f'{field.name!r}: {value}')
+        body = '{' + ', '.join(items) + '}'
+        if many:
+            source = f'def serialize(rows):\n    return [{body} for row in rows]\n'
+        else:
+            source = f'def serialize(row):\n    return {body}\n'
+        exec(compile(source, f'<serializer {self.model.__name__}>', 'exec'), namespace)
+        return namespace['serialize']
+
+
+_dumps = None
+
+
+def dumps(value):
+    global _dumps
+    if _dumps is None:
+        try:
+            import orjson
+            _dumps = orjson.dumps
+        except ImportError:
+            _dumps = lambda value: json.dumps(value, separators=(',', ':')).encode()
+    return _dumps(value)
+
+
+def json_response(body, status=200):
+    return Response(dumps(body), status=status, mimetype='application/json')
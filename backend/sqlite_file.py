@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import threading
+
+# Connections to a SQLite file shared by every worker on a host, for the
+# answer and lab report caches. sqlite3 connections are not shared across
+# threads or across a fork, so each thread of each process opens its own. The
+# file is opened on first use, in the worker, not when the app is built.
+#
+# WAL lets readers carry on while another worker writes, and a writer waits up
+# to BUSY_TIMEOUT seconds for the lock instead of failing. The schema runs in
+# one IMMEDIATE transaction, so workers opening a new file at once cannot
+# interleave their DDL, and no write lands between creating a trigger and
+# initialising the rows it maintains.
+
+BUSY_TIMEOUT = 10
+
+
+class SQLiteFile:
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript('BEGIN IMMEDIATE;' + self.schema + 'COMMIT;')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
@@ -0,0 +1,313 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from models import db, PatientVitals, VitalsHourly, VitalsDaily
+from counters import upsert
+from query_budget import allow_statements
+
+# Vitals storage: raw readings in patient_vitals, plus per-metric hourly and
+# daily rollups (count, sum, min, max) kept current by the same transaction
+# that inserts the readings. Rollups are upserted with atomic increments, so
+# concurrent writers and late or out-of-order readings aggregate correctly.
+#
+# Range queries read from the coarsest table that still gives enough points:
+# raw readings when there are few, otherwise hourly or daily buckets, merged
+# further if needed. A year of daily buckets is 365 rows per metric however
+# often the device reports.
+
+# Bulk uploads (ingest_readings) are parsed line by line from the request
+# stream and written in chunks of executemany inserts, one transaction per
+# chunk, so memory stays flat however large the upload is.
+
+# Rollup tables store the metric as its index here: append only
+METRICS = ('systolic', 'diastolic', 'heart_rate', 'temperature', 'respiratory_rate', 'blood_sugar')
+METRIC_CODES = {name: code for code, name in enumerate(METRICS)}
+
+# Plausible ranges; temperature allows Celsius or Fahrenheit
+METRIC_LIMITS = {
+    'systolic': (40, 300),
+    'diastolic': (20, 200),
+    'heart_rate': (20, 300),
+    'temperature': (25.0, 115.0),
+    'respiratory_rate': (1, 100),
+    'blood_sugar': (10, 2000),
+}
+
+RESOLUTIONS = [
+    ('hour', VitalsHourly, timedelta(hours=1)),
+    ('day', VitalsDaily, timedelta(days=1)),
+]
+
+
+def parse_blood_pressure(value):
+    # "120/80" -> (120, 80); empty -> (None, None)
+    if value is None or str(value).strip() == '':
+        return None, None
+    try:
+        systolic, diastolic = (int(float(part)) for part in str(value).split('/'))
+    except ValueError:
+        raise ValueError('blood_pressure must look like 120/80')
+    return systolic, diastolic
+
+
+def parse_timestamp(value):
+    # ISO 8601 from devices; aware times are stored as naive UTC like the rest
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def format_blood_pressure(systolic, diastolic):
+    return f'{systolic}/{diastolic}' if systolic is not None and diastolic is not None else ''
+
+
+def reading_from_json(data):
+    # Accepts the dashboard form (blood_pressure "120/80") or explicit
+    # systolic/diastolic. Zero and empty values mean "not measured".
+    systolic, diastolic = parse_blood_pressure(data.get('blood_pressure'))
+    reading = {'systolic': systolic, 'diastolic': diastolic}
+    for name in METRICS:
+        value = data.get(name)
+        if value not in (None, ''):
+            reading[name] = value
+    for name in METRICS:
+        value = reading.get(name)
+        if value in (None, '', 0, '0'):
+            reading[name] = None
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{name} must be a number')
+        low, high = METRIC_LIMITS[name]
+        if not low <= value <= high:
+            raise ValueError(f'{name} must be between {low} and {high}')
+        reading[name] = value if name == 'temperature' else int(round(value))
+    return reading
+
+
+def _bucket(moment, resolution):
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _rollup_update(table):
+    def update(new, dialect):
+        least = func.min if dialect == 'sqlite' else func.least
+        greatest = func.max if dialect == 'sqlite' else func.greatest
+        return {
+            'n': table.c.n + new.n,
+            'total': table.c.total + new.total,
+            'min_value': least(table.c.min_value, new.min_value),
+            'max_value': greatest(table.c.max_value, new.max_value),
+        }
+    return update
+
+
+def record_vitals(readings):
+    # readings: dicts with patient_id, recorded_at and any of METRICS.
+    # Inserts the raw rows and folds them into the rollups; the caller commits.
+    if not readings:
+        return 0
+    rows = [{'patient_id': r['patient_id'], 'recorded_at': r['recorded_at'],
+             **{name: r.get(name) for name in METRICS}} for r in readings]
+    db.session.execute(PatientVitals.__table__.insert(), rows)
+
+    for resolution, model, _ in RESOLUTIONS:
+        buckets = defaultdict(lambda: [0, 0.0, None, None])
+        for row in rows:
+            bucket = _bucket(row['recorded_at'], resolution)
+            for code, name in enumerate(METRICS):
+                value = row[name]
+                if value is None:
+                    continue
+                agg = buckets[(row['patient_id'], code, bucket)]
+                agg[0] += 1
+                agg[1] += value
+                agg[2] = value if agg[2] is None else min(agg[2], value)
+                agg[3] = value if agg[3] is None else max(agg[3], value)
+        if buckets:
+            table = model.__table__
+            # Sorted keys make concurrent writers take row locks in the same order
+            upsert(table, ['patient_id', 'metric', 'bucket'], [
+                {'patient_id': patient_id, 'metric': code, 'bucket': bucket,
+                 'n': n, 'total': total, 'min_value': low, 'max_value': high}
+                for (patient_id, code, bucket), (n, total, low, high) in sorted(buckets.items())
+            ], _rollup_update(table))
+    return len(rows)
+
+
+def latest_vitals(patient_id):
+    return PatientVitals.query.filter_by(
+        patient_id=patient_id
+    ).order_by(PatientVitals.recorded_at.desc(), PatientVitals.id.desc()).first()
+
+
+def _merge_points(points, target):
+    # Combine runs of consecutive buckets until at most target remain
+    if len(points) <= target:
+        return points
+    size = -(-len(points) // target)
+    merged = []
+    for start in range(0, len(points), size):
+        group = points[start:start + size]
+        n = sum(p['n'] for p in group)
+        merged.append({
+            't': group[0]['t'],
+            'n': n,
+            'avg': sum(p['avg'] * p['n'] for p in group) / n,
+            'min': min(p['min'] for p in group),
+            'max': max(p['max'] for p in group),
+        })
+    return merged
+
+
+def vitals_range(patient_id, metric, start, end, points=500):
+    # Series for one metric over [start, end), at most `points` entries of
+    # {t, n, avg, min, max}. Returns (resolution, series).
+    column = getattr(PatientVitals, metric)
+    in_range = (
+        PatientVitals.patient_id == patient_id,
+        PatientVitals.recorded_at >= start,
+        PatientVitals.recorded_at < end,
+        column.isnot(None),
+    )
+    span = end - start
+    # Raw rows only when the finest rollup would not even fill the chart
+    if span / RESOLUTIONS[0][2] <= points:
+        # LIMIT bounds the probe however dense the readings are
+        probe = db.session.execute(select(PatientVitals.id).where(*in_range).limit(points + 1)).all()
+        if len(probe) <= points:
+            rows = db.session.execute(
+                select(PatientVitals.recorded_at, column).where(*in_range).order_by(PatientVitals.recorded_at)
+            ).all()
+            return 'raw', [{'t': t, 'n': 1, 'avg': v, 'min': v, 'max': v} for t, v in rows]
+
+    # Finest rollup whose bucket count fits, else the coarsest one merged down
+    resolution, model, step = next(
+        ((name, model, step) for name, model, step in RESOLUTIONS if span / step <= points),
+        RESOLUTIONS[-1]
+    )
+    rows = db.session.execute(
+        select(model.bucket, model.n, model.total, model.min_value, model.max_value)
+        .where(model.patient_id == patient_id, model.metric == METRIC_CODES[metric],
+               model.bucket >= _bucket(start, resolution), model.bucket < end)
+        .order_by(model.bucket)
+    ).all()
+    series = [{'t': bucket, 'n': n, 'avg': total / n, 'min': low, 'max': high}
+              for bucket, n, total, low, high in rows]
+    return resolution, _merge_points(series, points)
+
+
+MAX_LINE_BYTES = 64 * 1024
+
+
+class IngestError(Exception):
+    # A chunk failed to commit; summary covers what was committed before it
+    def __init__(self, message, summary):
+        super().__init__(message)
+        self.summary = summary
+
+
+def _lines(stream):
+    # Yields (line number, bytes) without reading the whole body. The request
+    # stream is raw (readline pulls a byte at a time), so buffer it first.
+    stream = io.BufferedReader(stream, 64 * 1024)
+    number = 0
+    while True:
+        line = stream.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > MAX_LINE_BYTES and not line.endswith(b'\n'):
+            # Skip the rest of an oversized line
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(MAX_LINE_BYTES + 1)
+            yield number, None
+            continue
+        if line.strip():
+            yield number, line
+
+
+def parse_ndjson(stream):
+    # Yields (line number, dict or error message)
+    for number, line in _lines(stream):
+        if line is None:
+            yield number, f'line longer than {MAX_LINE_BYTES} bytes'
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, f'invalid JSON: {e}'
+            continue
+        yield number, record if isinstance(record, dict) else 'each line must be a JSON object'
+
+
+def parse_csv(stream):
+    # Header row names the columns (recorded_at plus any of the metrics or
+    # blood_pressure). Line numbers count the header as line 1.
+    reader = csv.DictReader(io.TextIOWrapper(io.BufferedReader(stream, 64 * 1024), encoding='utf-8', newline=''))
+    try:
+        for record in reader:
+            if None in record:
+                yield reader.line_num, 'more values than header columns'
+            else:
+                yield reader.line_num, record
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield reader.line_num, f'invalid CSV: {e}'
+
+
+def _validate(record, patient_id):
+    if not record.get('recorded_at'):
+        raise ValueError('recorded_at is required')
+    reading = reading_from_json(record)
+    if all(reading[name] is None for name in METRICS):
+        raise ValueError('no vitals in row')
+    reading['patient_id'] = patient_id
+    reading['recorded_at'] = parse_timestamp(record['recorded_at'])
+    return reading
+
+
+def ingest_readings(patient_id, records, chunk_size=1000, max_errors=100):
+    # records: (line number, dict or error) pairs from parse_ndjson/parse_csv.
+    # Valid rows are committed every chunk_size rows; a database failure
+    # rolls back the current chunk and stops, earlier chunks stay committed.
+    accepted, rejected, errors, chunk = 0, 0, [], []
+
+    def summary():
+        return {'accepted': accepted, 'rejected': rejected, 'errors': errors,
+                'errors_truncated': rejected > len(errors)}
+
+    def flush():
+        # One insert and two rollup upserts per chunk
+        allow_statements(3)
+        try:
+            record_vitals(chunk)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise IngestError(str(e), summary())
+
+    for number, record in records:
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            chunk.append(_validate(record, patient_id))
+        except (ValueError, TypeError) as e:
+            rejected += 1
+            if len(errors) < max_errors:
+                errors.append({'line': number, 'error': str(e)})
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+            accepted += len(chunk)
+            chunk = []
+    if chunk:
+        flush()
+        accepted += len(chunk)
+    return summary()